@@ -2,20 +2,43 @@
 
 BYOK-Modell: Der API-Key kommt pro Request mit (aus dem Browser/localStorage)
 und wird hier nur durchgereicht — nicht gespeichert, nicht geloggt.
+
+Alle Aufrufe laufen ueber eine ``requests.Session`` mit Keep-Alive-Pool
+(wie ``routing.py``): der TLS-Handshake zu api.deepseek.com faellt nur
+einmal pro Verbindung an, nicht pro Extraktion. ``call_deepseek`` wartet
+auf die komplette Antwort, ``stream_deepseek`` liest die SSE-Antwort
+(``stream=true``) stueckweise und meldet Fortschritt.
 """
 
 import json
+import os
 import re
-import urllib.error
-import urllib.request
+from collections.abc import Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
 
 DEEPSEEK_ENDPOINT = "https://api.deepseek.com/v1/chat/completions"
 DEEPSEEK_MODEL = "deepseek-chat"
 DEFAULT_TIMEOUT_SECONDS = 60
+CONNECT_TIMEOUT_SECONDS = 10
 MAX_FREITEXT_LEN = 50_000
+# Fortschritt beim Streamen hoechstens alle so viele Zeichen melden.
+STREAM_PROGRESS_STEP = 200
 
 _CODE_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*\n?([\s\S]*?)\n?```\s*$", re.MULTILINE)
 
+# Eine Session pro Prozess. Gleichzeitig offen sind hoechstens: jeder
+# gunicorn-Thread mit einer Batch-Extraktion (je CONCURRENCY Aufrufe, siehe
+# batch_extract.py) — darauf ist der Pool ausgelegt, sonst baut jeder
+# Aufruf ueber dem Limit eine neue TLS-Verbindung auf und wirft sie weg.
+# Der API-Key geht nur als Header pro Request mit, nie in die Session.
+POOL_MAXSIZE = int(os.environ.get("GUNICORN_THREADS", "4")) * int(
+    os.environ.get("DR_AUTOMATE_BATCH_EXTRACT_CONCURRENCY", "4")
+)
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max(8, POOL_MAXSIZE)))
+
 
 class AIExtractError(Exception):
     """Strukturierter Fehler mit HTTP-Status fürs Frontend."""
@@ -30,23 +53,7 @@ def _strip_code_fences(text: str) -> str:
     return m.group(1).strip() if m else text.strip()
 
 
-def call_deepseek(
-    freitext: str,
-    api_key: str,
-    system_prompt: str,
-    sonderwuensche: str = "",
-    *,
-    timeout: int = DEFAULT_TIMEOUT_SECONDS,
-) -> dict:
-    """Schickt Freitext an DeepSeek und gibt das geparste JSON zurück.
-
-    Wirft AIExtractError mit passendem Status-Code:
-      400  Eingaben fehlen/zu groß
-      401  ungültiger API-Key
-      429  Rate-Limit beim Provider
-      502  Provider-Fehler / Parse-Fehler
-      504  Timeout
-    """
+def _build_payload(freitext: str, api_key: str, system_prompt: str, sonderwuensche: str) -> dict:
     if not api_key or not api_key.strip():
         raise AIExtractError("API-Key fehlt", status_code=400)
     if not freitext or not freitext.strip():
@@ -58,7 +65,7 @@ def call_deepseek(
     if sonderwuensche and sonderwuensche.strip():
         user_content += "\n\n---\nZusätzliche Hinweise/Sonderwünsche:\n" + sonderwuensche.strip()
 
-    payload = {
+    return {
         "model": DEEPSEEK_MODEL,
         "messages": [
             {"role": "system", "content": system_prompt},
@@ -68,43 +75,112 @@ def call_deepseek(
         "response_format": {"type": "json_object"},
     }
 
-    req = urllib.request.Request(
-        DEEPSEEK_ENDPOINT,
-        data=json.dumps(payload).encode("utf-8"),
-        headers={
-            "Authorization": f"Bearer {api_key.strip()}",
-            "Content-Type": "application/json",
-        },
-        method="POST",
-    )
 
+def _post(payload: dict, api_key: str, timeout: int, stream: bool = False) -> requests.Response:
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:  # nosec B310 — hardcoded HTTPS endpoint
-            body = resp.read().decode("utf-8")
-    except urllib.error.HTTPError as e:
-        # DeepSeek liefert bei 401/429 strukturierte Fehler — leiten wir kategorisiert weiter.
-        if e.code == 401:
-            raise AIExtractError("API-Key ungültig oder abgelaufen", status_code=401) from None
-        if e.code == 429:
-            raise AIExtractError("Rate-Limit bei DeepSeek erreicht", status_code=429) from None
-        raise AIExtractError(f"DeepSeek-Fehler (HTTP {e.code})", status_code=502) from None
-    except urllib.error.URLError as e:
-        # TimeoutError ist eine Unterklasse von OSError, kommt hier als reason an.
-        if isinstance(e.reason, TimeoutError):
-            raise AIExtractError("DeepSeek-Anfrage hat zu lange gedauert", status_code=504) from None
-        raise AIExtractError("Verbindung zu DeepSeek fehlgeschlagen", status_code=502) from None
-    except TimeoutError:
+        resp = _session.post(
+            DEEPSEEK_ENDPOINT,
+            json=payload,
+            headers={"Authorization": f"Bearer {api_key.strip()}"},
+            timeout=(CONNECT_TIMEOUT_SECONDS, timeout),
+            stream=stream,
+        )
+    except requests.Timeout:
         raise AIExtractError("DeepSeek-Anfrage hat zu lange gedauert", status_code=504) from None
+    except requests.RequestException:
+        raise AIExtractError("Verbindung zu DeepSeek fehlgeschlagen", status_code=502) from None
+    if resp.status_code >= 400:
+        resp.close()
+        # DeepSeek liefert bei 401/429 strukturierte Fehler — leiten wir kategorisiert weiter.
+        if resp.status_code == 401:
+            raise AIExtractError("API-Key ungültig oder abgelaufen", status_code=401)
+        if resp.status_code == 429:
+            raise AIExtractError("Rate-Limit bei DeepSeek erreicht", status_code=429)
+        raise AIExtractError(f"DeepSeek-Fehler (HTTP {resp.status_code})", status_code=502)
+    return resp
 
-    try:
-        envelope = json.loads(body)
-        content = envelope["choices"][0]["message"]["content"]
-    except (json.JSONDecodeError, KeyError, IndexError, TypeError):
-        raise AIExtractError("Unerwartete Antwort von DeepSeek", status_code=502) from None
 
+def _parse_content(content: str) -> dict:
     cleaned = _strip_code_fences(content)
-
     try:
         return json.loads(cleaned)
     except json.JSONDecodeError:
         raise AIExtractError("DeepSeek hat kein valides JSON geliefert", status_code=502) from None
+
+
+def call_deepseek(
+    freitext: str,
+    api_key: str,
+    system_prompt: str,
+    sonderwuensche: str = "",
+    *,
+    timeout: int = DEFAULT_TIMEOUT_SECONDS,
+) -> dict:
+    """Schickt Freitext an DeepSeek und gibt das geparste JSON zurück.
+
+    Wirft AIExtractError mit passendem Status-Code:
+      400  Eingaben fehlen/zu groß
+      401  ungültiger API-Key
+      429  Rate-Limit beim Provider
+      502  Provider-Fehler / Parse-Fehler
+      504  Timeout
+    """
+    payload = _build_payload(freitext, api_key, system_prompt, sonderwuensche)
+    resp = _post(payload, api_key, timeout)
+    try:
+        envelope = json.loads(resp.content)
+        content = envelope["choices"][0]["message"]["content"]
+    except (json.JSONDecodeError, UnicodeDecodeError, KeyError, IndexError, TypeError):
+        raise AIExtractError("Unerwartete Antwort von DeepSeek", status_code=502) from None
+    return _parse_content(content)
+
+
+def stream_deepseek(
+    freitext: str,
+    api_key: str,
+    system_prompt: str,
+    sonderwuensche: str = "",
+    *,
+    timeout: int = DEFAULT_TIMEOUT_SECONDS,
+) -> Iterator[tuple[str, object]]:
+    """Wie ``call_deepseek``, aber mit ``stream=true``.
+
+    Eingaben, Verbindung und HTTP-Status werden sofort geprueft (dieselben
+    Status-Codes), erst danach kommt der Iterator zurueck. Er liefert
+    ``("progress", empfangene Zeichen)`` und zum Schluss ``("result", dict)``;
+    Fehler mitten im Stream kommen ebenfalls als AIExtractError. ``timeout``
+    gilt hier als Pause zwischen zwei Chunks, nicht fuer die Gesamtdauer.
+    """
+    payload = {**_build_payload(freitext, api_key, system_prompt, sonderwuensche), "stream": True}
+    return _iter_stream(_post(payload, api_key, timeout, stream=True))
+
+
+def _iter_stream(resp: requests.Response) -> Iterator[tuple[str, object]]:
+    parts: list[str] = []
+    received = reported = 0
+    with resp:
+        try:
+            # Selbst als UTF-8 dekodieren: text/event-stream ohne charset
+            # wuerde requests sonst als Latin-1 lesen.
+            for raw in resp.iter_lines():
+                line = raw.decode("utf-8")
+                if not line.startswith("data:"):
+                    continue  # Leerzeilen, ": keep-alive"-Kommentare
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    delta = json.loads(data)["choices"][0]["delta"].get("content") or ""
+                except (json.JSONDecodeError, KeyError, IndexError, TypeError, AttributeError):
+                    raise AIExtractError("Unerwartete Antwort von DeepSeek", status_code=502) from None
+                parts.append(delta)
+                received += len(delta)
+                if received - reported >= STREAM_PROGRESS_STEP:
+                    reported = received
+                    yield "progress", received
+        except requests.Timeout:
+            raise AIExtractError("DeepSeek-Anfrage hat zu lange gedauert", status_code=504) from None
+        except (requests.RequestException, UnicodeDecodeError):
+            # Lese-Timeouts mitten im Stream meldet requests als ConnectionError.
+            raise AIExtractError("Verbindung zu DeepSeek abgebrochen", status_code=502) from None
+    yield "result", _parse_content("".join(parts))
@@ -0,0 +1,34 @@
+"""rate_limits-tabelle fuer den prozessuebergreifenden limiter
+
+Revision ID: 008_rate_limits
+Revises: 007_amtsbezeichnung
+Create Date: 2026-10-17
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "008_rate_limits"
+down_revision: str | None = "007_amtsbezeichnung"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "rate_limits",
+        sa.Column("key", sa.String(length=255), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("expires_at", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_rate_limits_expires_at", "rate_limits", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_rate_limits_expires_at", table_name="rate_limits")
+    op.drop_table("rate_limits")
@@ -0,0 +1,36 @@
+"""geo_cache-tabelle fuer persistentes geocoding/routing
+
+Revision ID: 009_geo_cache
+Revises: 008_rate_limits
+Create Date: 2026-10-17
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "009_geo_cache"
+down_revision: str | None = "008_rate_limits"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "geo_cache",
+        sa.Column("key", sa.String(length=80), primary_key=True),
+        sa.Column("value", sa.String(length=1024), nullable=False),
+        sa.Column("expires_at", sa.Float(), nullable=False),
+        sa.Column("hits", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_geo_cache_expires_at", "geo_cache", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_geo_cache_expires_at", table_name="geo_cache")
+    op.drop_table("geo_cache")
@@ -0,0 +1,25 @@
+"""index (user_id, created_at) fuer die dashboard-keyset-pagination
+
+Revision ID: 010_dashboard_index
+Revises: 009_geo_cache
+Create Date: 2026-10-17
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from alembic import op
+
+revision: str = "010_dashboard_index"
+down_revision: str | None = "009_geo_cache"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_index("idx_dienstreisen_user_created", "dienstreisen", ["user_id", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_dienstreisen_user_created", table_name="dienstreisen")
@@ -0,0 +1,36 @@
+"""extract_cache-tabelle fuer wiederholte ki-extraktionen
+
+Revision ID: 011_extract_cache
+Revises: 010_dashboard_index
+Create Date: 2026-10-17
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "011_extract_cache"
+down_revision: str | None = "010_dashboard_index"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "extract_cache",
+        sa.Column("key", sa.String(length=80), primary_key=True),
+        sa.Column("value", sa.String(length=65536), nullable=False),
+        sa.Column("expires_at", sa.Float(), nullable=False),
+        sa.Column("hits", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_extract_cache_expires_at", "extract_cache", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_extract_cache_expires_at", table_name="extract_cache")
+    op.drop_table("extract_cache")
@@ -1,17 +1,16 @@
+import io
 import json
 import logging
 import os
 import re
 import secrets
 import shutil
-import tempfile
 from datetime import datetime
 from pathlib import Path
 
-import bleach
-import markdown as md
 from flask import (
     Flask,
+    Response,
     abort,
     after_this_request,
     flash,
@@ -21,26 +20,37 @@ from flask import (
     render_template,
     request,
     send_file,
+    session,
+    stream_with_context,
     url_for,
 )
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_mail import Mail, Message
 from flask_wtf import CSRFProtect
+from limits import parse as parse_limit
 from sqlalchemy import select
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 import ai_extract
 import auth
+import batch_pdf
+import compaction
+import crypto
+import docs_cache
 import generator
 import generator_abrechnung
 import nrkvo_rates
+import pdf_pool
+import profile_cache
 from models import (
     apply_profile_authoritative,
     find_placeholder,
+    strip_citations,
     validate_abrechnung,
     validate_reiseantrag,
 )
+from system_prompt import load_system_prompt, system_prompt_stats
 
 # --- KONFIGURATION ---
 PDF_TEMPLATE_PATH = os.environ.get("PDF_TEMPLATE_PATH", os.path.join("forms", "DR-Antrag_035_001Stand4-2025pdf.pdf"))
@@ -51,6 +61,9 @@ DEBUG_MODE = os.environ.get("FLASK_DEBUG", "false").lower() == "true"
 PORT = int(os.environ.get("PORT", 5001))
 HOST = os.environ.get("HOST", "0.0.0.0")  # nosec B104 — bind auf alle Interfaces ist für Container/Cloud-Deploys gewünscht
 RATE_LIMIT = os.environ.get("RATE_LIMIT", "10")
+# DeepSeek-Aufrufe pro Minute ueber /extract/batch; leer = max(RATE_LIMIT,
+# DR_AUTOMATE_MAX_BATCH_EXTRACT), damit ein voller Batch durchgeht.
+BATCH_EXTRACT_RATE_LIMIT = os.environ.get("DR_AUTOMATE_BATCH_EXTRACT_RATE_LIMIT", "").strip()
 # TRUST_REMOTE_USER_HEADER: nur in Produktion hinter Traefik auf `true` setzen.
 # Default `false` schuetzt vor Header-Spoofing in lokalem/Test-Setup.
 TRUST_REMOTE_USER_HEADER = os.environ.get("TRUST_REMOTE_USER_HEADER", "false").lower() == "true"
@@ -68,6 +81,8 @@ TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID", "").strip()
 # Upload-Limits fuer /extract-Endpunkt (PDF-Aufnahme).
 MAX_UPLOAD_BYTES = int(os.environ.get("DR_AUTOMATE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))  # 10 MiB
 MAX_PDF_PAGES = int(os.environ.get("DR_AUTOMATE_MAX_PDF_PAGES", "50"))
+# Reisen pro Dashboard-Seite (Keyset-Pagination ueber created_at).
+DASHBOARD_PAGE_SIZE = int(os.environ.get("DR_AUTOMATE_DASHBOARD_PAGE_SIZE", "50"))
 
 # --- LOGGING ---
 logging.basicConfig(
@@ -124,15 +139,21 @@ mail = Mail(app)
 # CSRF-Schutz
 csrf = CSRFProtect(app)
 
-# Rate Limiting
-limiter = Limiter(key_func=get_remote_address, app=app, default_limits=[], storage_uri="memory://")
+# Rate Limiting. ``memory://`` zaehlt pro Prozess (nur 1 gunicorn-Worker);
+# ``db://`` legt die Zaehler in die SQLite-DB und gilt fuer alle Worker.
+RATELIMIT_STORAGE_URI = os.environ.get("RATELIMIT_STORAGE_URI", "memory://")
+if RATELIMIT_STORAGE_URI.startswith("db://"):
+    import ratelimit_store  # noqa: F401 — registriert das Storage-Schema "db"
+limiter = Limiter(key_func=get_remote_address, app=app, default_limits=[], storage_uri=RATELIMIT_STORAGE_URI)
 
 # Prüfe ob Template existiert
 if not os.path.exists(PDF_TEMPLATE_PATH):
     logger.warning(f"Template file not found at {PDF_TEMPLATE_PATH}")
 
+# Optionaler Render-Pool: Worker parsen beide Vordrucke beim Start.
+pdf_pool.warm_templates([PDF_TEMPLATE_PATH, PDF_TEMPLATE_ABRECHNUNG_PATH])
+
 
-_CITATION_RE = re.compile(r"\s*\[cite:[^\]]+\]", re.IGNORECASE)
 _CITATION_RAW_RE = re.compile(r"\[cite_start\]|\[cite_end\]|\s*\[cite:[^\]]+\]", re.IGNORECASE)
 
 
@@ -141,17 +162,6 @@ def _strip_citations_raw(text: str) -> str:
     return _CITATION_RAW_RE.sub("", text)
 
 
-def _strip_citations(obj):
-    """Entfernt KI-Zitatmarker wie [cite: 1, 2] rekursiv aus allen String-Werten."""
-    if isinstance(obj, dict):
-        return {k: _strip_citations(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_strip_citations(i) for i in obj]
-    if isinstance(obj, str):
-        return _CITATION_RE.sub("", obj).strip()
-    return obj
-
-
 def _legal_urls():
     return {
         "impressum_url": os.environ.get("IMPRESSUM_URL", "#"),
@@ -172,41 +182,37 @@ def _build_wizard_profile_seed(user) -> dict | None:
     """
     if user is None:
         return None
-    from db import SessionLocal
-    from models_db import UserProfile
-
-    with SessionLocal() as s:
-        profile = s.query(UserProfile).filter(UserProfile.user_id == user.id).first()
-        if profile is None:
-            return {
-                "name": user.display_name or "",
-                "email": user.email or "",
-                "auto_save_dienstreisen": True,
-            }
-        full_name = " ".join(p for p in (profile.vorname, profile.nachname) if p).strip() or (user.display_name or "")
+    profile = profile_cache.get(user.id)
+    if profile is None:
         return {
-            "name": full_name,
-            "abteilung": profile.abteilung or "",
-            "amtsbezeichnung": profile.amtsbezeichnung or "",
-            "telefon": profile.telefon or "",
-            "adresse": profile.adresse_privat or "",
-            "mitreisender": profile.mitreisender_name_default or "",
-            "iban": profile.iban or "",
-            "bic": profile.bic or "",
-            # Profil-Email hat Vorrang, sonst Authelia-Email.
-            "email": (profile.email or user.email or ""),
-            "abrechnende_dienststelle": profile.abrechnende_dienststelle or "",
-            "anordnende_dienststelle": profile.anordnende_dienststelle or "",
-            "rkr_default": profile.rkr_default or "DR",
-            "standard_verkehrsmittel": profile.standard_verkehrsmittel or "",
-            # DeepSeek-Key wird BEWUSST NICHT ins Template geseedet — sonst
-            # liegt er als Klartext im HTML und ist bei DOM-XSS sofort
-            # exfiltrierbar. /extract holt ihn serverseitig aus user_profiles
-            # als Fallback, wenn der X-DeepSeek-Key-Header leer ist. Frontend
-            # bekommt nur den has_-Flag.
-            "has_deepseek_api_key": bool(profile.deepseek_api_key),
-            "auto_save_dienstreisen": bool(profile.auto_save_dienstreisen),
+            "name": user.display_name or "",
+            "email": user.email or "",
+            "auto_save_dienstreisen": True,
         }
+    full_name = " ".join(p for p in (profile.vorname, profile.nachname) if p).strip() or (user.display_name or "")
+    return {
+        "name": full_name,
+        "abteilung": profile.abteilung or "",
+        "amtsbezeichnung": profile.amtsbezeichnung or "",
+        "telefon": profile.telefon or "",
+        "adresse": profile.adresse_privat or "",
+        "mitreisender": profile.mitreisender_name_default or "",
+        "iban": profile.iban or "",
+        "bic": profile.bic or "",
+        # Profil-Email hat Vorrang, sonst Authelia-Email.
+        "email": (profile.email or user.email or ""),
+        "abrechnende_dienststelle": profile.abrechnende_dienststelle or "",
+        "anordnende_dienststelle": profile.anordnende_dienststelle or "",
+        "rkr_default": profile.rkr_default or "DR",
+        "standard_verkehrsmittel": profile.standard_verkehrsmittel or "",
+        # DeepSeek-Key wird BEWUSST NICHT ins Template geseedet — sonst
+        # liegt er als Klartext im HTML und ist bei DOM-XSS sofort
+        # exfiltrierbar. /extract holt ihn serverseitig aus user_profiles
+        # als Fallback, wenn der X-DeepSeek-Key-Header leer ist. Frontend
+        # bekommt nur den has_-Flag.
+        "has_deepseek_api_key": bool(profile.deepseek_api_key),
+        "auto_save_dienstreisen": bool(profile.auto_save_dienstreisen),
+    }
 
 
 def _common_template_ctx():
@@ -221,38 +227,6 @@ def _common_template_ctx():
     }
 
 
-# Profil-/Beförderungs-eigene Abschnitte stehen in system_prompt.md zwischen
-# diesen Markern (als Doku für Maintainer), werden zur Laufzeit aber entfernt:
-# Antragsteller, BahnCard/Großkundenrabatt und Beförderung kommen autoritativ
-# aus Profil bzw. Reise-Abfrage, nicht aus der KI-Ausgabe.
-_PROFIL_SECTION_RE = re.compile(
-    r"^\[\[PROFIL:START\]\].*?^\[\[PROFIL:END\]\]\n?",
-    re.DOTALL | re.MULTILINE,
-)
-
-
-def _strip_profile_sections(text: str) -> str:
-    """Entfernt die [[PROFIL:START]]…[[PROFIL:END]]-Blöcke und kollabiert
-    dabei entstehende Dreifach-Leerzeilen."""
-    stripped = _PROFIL_SECTION_RE.sub("", text)
-    return re.sub(r"\n{3,}", "\n\n", stripped)
-
-
-def _load_system_prompt() -> str:
-    """Lädt den Antrag-System-Prompt (lokal personalisierte Version bevorzugt).
-
-    Die profil-/beförderungs-eigenen Abschnitte werden immer entfernt — diese
-    Felder ergänzt das System autoritativ (Auth: serverseitig aus dem Profil,
-    Gast: clientseitig aus localStorage). Eine markerlose ``.local.md`` aus
-    Altbeständen bleibt unverändert (Strip ist dort ein No-op)."""
-    prompt_file = "system_prompt.local.md" if os.path.exists("system_prompt.local.md") else "system_prompt.md"
-    try:
-        with open(prompt_file, encoding="utf-8") as f:
-            return _strip_profile_sections(f.read())
-    except Exception as e:
-        return f"Error loading prompt file: {e}"
-
-
 def _profile_antrag_overrides(user) -> tuple[dict | None, dict | None]:
     """Profil-autoritative Antrag-Felder aus dem DB-Profil.
 
@@ -262,23 +236,19 @@ def _profile_antrag_overrides(user) -> tuple[dict | None, dict | None]:
     """
     if user is None:
         return None, None
-    from db import SessionLocal
-    from models_db import UserProfile
-
-    with SessionLocal() as s:
-        p = s.query(UserProfile).filter(UserProfile.user_id == user.id).first()
-        if p is None:
-            return None, None
-        name = " ".join(x for x in (p.vorname, p.nachname) if x).strip() or (user.display_name or "")
-        antragsteller = {
-            "name": name,
-            "abteilung": p.abteilung or "",
-            "amtsbezeichnung": p.amtsbezeichnung or "",
-            "telefon": p.telefon or "",
-            "adresse_privat": p.adresse_privat or "",
-            "mitreisender_name": p.mitreisender_name_default or "",
-        }
-        return antragsteller, (p.bahncards or {})
+    p = profile_cache.get(user.id)
+    if p is None:
+        return None, None
+    name = " ".join(x for x in (p.vorname, p.nachname) if x).strip() or (user.display_name or "")
+    antragsteller = {
+        "name": name,
+        "abteilung": p.abteilung or "",
+        "amtsbezeichnung": p.amtsbezeichnung or "",
+        "telefon": p.telefon or "",
+        "adresse_privat": p.adresse_privat or "",
+        "mitreisender_name": p.mitreisender_name_default or "",
+    }
+    return antragsteller, dict(p.bahncards or {})
 
 
 _VERKEHRSMITTEL_LABEL = {
@@ -329,14 +299,20 @@ def _format_reise_kontext(raw: str) -> str:
 
 @app.before_request
 def load_user():
+    crypto.begin_decrypt_cache()
     g.current_user = auth.load_current_user()
 
 
+@app.teardown_request
+def end_decrypt_cache(exc):
+    crypto.end_decrypt_cache()
+
+
 @app.route("/", methods=["GET"])
 def index():
     """Antrag-Wizard. Oeffentlich erreichbar (Gast-Modus). Bei Auth zeigt
     das Template ein "Diese Reise speichern"-Banner."""
-    return render_template("index.html", prompt_content=_load_system_prompt(), **_common_template_ctx())
+    return render_template("index.html", prompt_content=load_system_prompt(), **_common_template_ctx())
 
 
 @app.route("/landing", methods=["GET"])
@@ -351,26 +327,66 @@ def landing():
 # --- DASHBOARD (Auth-only) ---
 
 
+def _dashboard_page(session_db, user_id: int, nach: int | None, limit: int) -> tuple[list, int | None]:
+    """Eine Dashboard-Seite als Projektion: nur Klartext-Spalten, keine ORM-Objekte.
+
+    Die verschluesselten JSONs werden gar nicht erst selektiert. Sortiert
+    wird neueste zuerst nach (created_at, id); ``nach`` ist die id der
+    letzten Reise der vorigen Seite (Keyset statt OFFSET — Seite 20 kostet
+    so viel wie Seite 1). Liefert (Zeilen, Cursor fuer die naechste Seite).
+    """
+    from sqlalchemy import tuple_
+
+    from models_db import Abrechnung, Dienstreise
+
+    stmt = (
+        select(
+            Dienstreise.id,
+            Dienstreise.titel,
+            Dienstreise.zielort,
+            Dienstreise.status,
+            Dienstreise.start_datum,
+            Dienstreise.ende_datum,
+            Dienstreise.bezahlt_datum,
+            Dienstreise.genehmigung_datum,
+            Dienstreise.genehmigung_aktenzeichen,
+            Dienstreise.antrag_pdf_path,
+            Abrechnung.status.label("abrechnung_status"),
+            Abrechnung.abrechnung_pdf_path,
+            Abrechnung.generated_at,
+        )
+        .outerjoin(Abrechnung, Abrechnung.dienstreise_id == Dienstreise.id)
+        .where(Dienstreise.user_id == user_id)
+        .order_by(Dienstreise.created_at.desc(), Dienstreise.id.desc())
+        .limit(limit + 1)
+    )
+    if nach is not None:
+        # created_at des Cursors per Subquery: vergleicht den gespeicherten
+        # Wert mit sich selbst statt mit einem neu formatierten Datetime.
+        cursor_created = (
+            select(Dienstreise.created_at)
+            .where(Dienstreise.id == nach, Dienstreise.user_id == user_id)
+            .scalar_subquery()
+        )
+        stmt = stmt.where(tuple_(Dienstreise.created_at, Dienstreise.id) < tuple_(cursor_created, nach))
+    rows = session_db.execute(stmt).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+
 @app.route("/dashboard", methods=["GET"])
 @auth.login_required
 def dashboard():
-    """Reise-Uebersicht des eingeloggten Users."""
-    from sqlalchemy.orm import joinedload
-
+    """Reise-Uebersicht des eingeloggten Users (seitenweise, neueste zuerst)."""
     from db import SessionLocal
-    from models_db import Dienstreise
 
+    nach = request.args.get("nach", type=int)
     with SessionLocal() as session_db:
-        reisen = (
-            session_db.query(Dienstreise)
-            .options(joinedload(Dienstreise.abrechnung))
-            .filter(Dienstreise.user_id == g.current_user.id)
-            .order_by(Dienstreise.created_at.desc())
-            .all()
-        )
-        # Detach, damit kein lazy-load nach session-close
-        session_db.expunge_all()
-    return render_template("dashboard.html", reisen=reisen, **_common_template_ctx())
+        reisen, next_cursor = _dashboard_page(session_db, g.current_user.id, nach, DASHBOARD_PAGE_SIZE)
+    return render_template(
+        "dashboard.html", reisen=reisen, next_cursor=next_cursor, is_first_page=nach is None, **_common_template_ctx()
+    )
 
 
 # --- DIENSTREISE-CRUD (Auth-only) ---
@@ -410,75 +426,47 @@ def _parse_iso_date(value: str):
     return None
 
 
-def _persist_antrag(reise_id_str: str, data: dict, result, pdf_path: str | None) -> int:
+def _persist_antrag(reise_id_str: str, data: dict, result, pdf_bytes: bytes | None) -> int:
     """Erstellt oder aktualisiert eine Dienstreise. Gibt die ID zurueck.
 
     ``data`` ist das schon validierte und citation-bereinigte Antrag-JSON,
     ``result`` das Pydantic-Modell (fuer Plain-Felder wie Zielort/Datum).
     """
-    from datetime import datetime as _dt
-
     from db import SessionLocal
-    from models_db import Dienstreise, DienstreiseStatus
+    from models_db import Dienstreise, DienstreiseStatus, antrag_columns
 
     user = g.current_user
     reise_id = int(reise_id_str) if reise_id_str and reise_id_str.isdigit() else None
-
-    zielort = result.reise_details.zielort if hasattr(result, "reise_details") else None
-    zweck = result.reise_details.zweck if hasattr(result, "reise_details") else None
-    titel = (zweck or zielort or "Dienstreise")[:200]
-
-    start_d = _parse_iso_date(result.reise_details.start_datum) if hasattr(result, "reise_details") else None
-    if not start_d and hasattr(result, "reise_details"):
-        try:
-            start_d = _dt.strptime(result.reise_details.start_datum, "%d.%m.%Y").date()
-        except (ValueError, AttributeError):
-            start_d = None
-    end_d = None
-    if hasattr(result, "reise_details"):
-        try:
-            end_d = _dt.strptime(result.reise_details.ende_datum, "%d.%m.%Y").date()
-        except (ValueError, AttributeError):
-            end_d = None
-
-    persistent_pdf_path = None
-    if pdf_path:
-        target_dir = DATA_DIR / "pdfs" / str(user.id)
-        target_dir.mkdir(parents=True, exist_ok=True)
+    columns = antrag_columns(result.model_dump())
 
     with SessionLocal() as s:
         if reise_id is not None:
             reise = s.query(Dienstreise).filter(Dienstreise.id == reise_id, Dienstreise.user_id == user.id).first()
             if reise is None:
                 abort(404)
-            reise.titel = titel
-            reise.zielort = zielort
-            reise.start_datum = start_d
-            reise.ende_datum = end_d
+            for name, value in columns.items():
+                setattr(reise, name, value)
             reise.antrag_json = data
         else:
             reise = Dienstreise(
                 user_id=user.id,
-                titel=titel,
-                zielort=zielort,
-                start_datum=start_d,
-                ende_datum=end_d,
+                **columns,
                 antrag_json=data,
                 status=DienstreiseStatus.entwurf,
             )
             s.add(reise)
             s.flush()  # damit reise.id verfuegbar ist
 
-        if pdf_path:
-            persistent_pdf_path = _persist_pdf(pdf_path, user.id, reise.id, "antrag.pdf")
+        if pdf_bytes:
+            persistent_pdf_path = _persist_pdf(pdf_bytes, user.id, reise.id, "antrag.pdf")
             reise.antrag_pdf_path = str(persistent_pdf_path)
 
         s.commit()
         return reise.id
 
 
-def _persist_pdf(src_pdf: str, user_id: int, reise_id: int, filename: str) -> Path:
-    """Kopiert PDF in das User-/Reise-Verzeichnis mit restriktiven Perms (0700/0600)."""
+def _persist_pdf(pdf_bytes: bytes, user_id: int, reise_id: int, filename: str) -> Path:
+    """Schreibt das PDF ins User-/Reise-Verzeichnis mit restriktiven Perms (0700/0600)."""
     target_dir = DATA_DIR / "pdfs" / str(user_id) / str(reise_id)
     target_dir.mkdir(parents=True, exist_ok=True)
     # Permissions explizit setzen — umask 022 wuerde sonst 0755 daraus machen.
@@ -488,7 +476,10 @@ def _persist_pdf(src_pdf: str, user_id: int, reise_id: int, filename: str) -> Pa
     except OSError:
         pass
     target = target_dir / filename
-    shutil.copy2(src_pdf, target)
+    # Datei direkt mit 0600 anlegen statt erst mit umask-Default zu schreiben.
+    fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf_bytes)
     try:
         os.chmod(target, 0o600)
     except OSError:
@@ -496,7 +487,12 @@ def _persist_pdf(src_pdf: str, user_id: int, reise_id: int, filename: str) -> Pa
     return target
 
 
-def _persist_abrechnung(reise_id_str: str, data: dict, pdf_path: str | None) -> int | None:
+def _pdf_response(pdf_bytes: bytes, filename: str):
+    """Liefert ein im Speicher erzeugtes PDF als Download aus."""
+    return send_file(io.BytesIO(pdf_bytes), mimetype="application/pdf", as_attachment=True, download_name=filename)
+
+
+def _persist_abrechnung(reise_id_str: str, data: dict, pdf_bytes: bytes | None) -> int | None:
     """Persistiert die Abrechnung zu einer bestehenden Dienstreise."""
     from datetime import datetime as _dt
 
@@ -521,8 +517,8 @@ def _persist_abrechnung(reise_id_str: str, data: dict, pdf_path: str | None) ->
         abr.status = AbrechnungStatus.abgeschlossen
         abr.generated_at = _dt.utcnow()
 
-        if pdf_path:
-            persistent = _persist_pdf(pdf_path, user.id, reise.id, "abrechnung.pdf")
+        if pdf_bytes:
+            persistent = _persist_pdf(pdf_bytes, user.id, reise.id, "abrechnung.pdf")
             abr.abrechnung_pdf_path = str(persistent)
 
         # bezahlt-Reisen NICHT auf abgerechnet zurueckdrehen (User-Bestaetigung
@@ -620,9 +616,28 @@ def api_route():
     Datenquelle ist OpenStreetMap (Nominatim) + OSRM Public-Demo. Beide
     sind ohne Account nutzbar, Demo-Server hat aber keine SLA — als
     "Schaetzung" deklarieren, nicht als verbindlicher Wert.
+
+    Alternativ ``routes``: JSON-Liste ``[{"from": …, "to": …}, …]`` (max 4,
+    z.B. Hin- und Rueckreise) → ``{ routes: [{km, duration_min} | {error}], source }``.
+    Zaehlt als ein Request fuers Rate-Limit.
     """
     import routing as _routing
 
+    routes_raw = request.form.get("routes") or (request.get_json(silent=True) or {}).get("routes")
+    if routes_raw is not None:
+        try:
+            routes = json.loads(routes_raw) if isinstance(routes_raw, str) else routes_raw
+            pairs = [(str(r["from"]).strip(), str(r["to"]).strip()) for r in routes]
+        except (json.JSONDecodeError, TypeError, KeyError):
+            return jsonify({"error": "routes: Liste aus {from, to} erwartet"}), 400
+        if not pairs or len(pairs) > 4 or not all(a and b for a, b in pairs):
+            return jsonify({"error": "routes: 1–4 Strecken mit from/to erforderlich"}), 400
+        try:
+            return jsonify({"routes": _routing.route_many(pairs), "source": "OpenStreetMap / OSRM"})
+        except Exception:  # pragma: no cover
+            logger.exception("Routing-API unerwarteter Fehler")
+            return jsonify({"error": "Interner Fehler bei der Entfernungs-Abfrage"}), 500
+
     src = (request.form.get("from") or (request.get_json(silent=True) or {}).get("from") or "").strip()
     dst = (request.form.get("to") or (request.get_json(silent=True) or {}).get("to") or "").strip()
     if not src or not dst:
@@ -738,7 +753,7 @@ def _profile_to_dict(profile, include_secrets: bool = False) -> dict:
     fuer Anwendungsfaelle wie der Wizard, der den Key per Header weiterleiten will.
     """
     base = {f: getattr(profile, f, None) or "" for f in _PROFIL_FIELDS_TEXT}
-    base["bahncards"] = profile.bahncards if profile and profile.bahncards else {}
+    base["bahncards"] = dict(profile.bahncards) if profile and profile.bahncards else {}
     base["has_deepseek_api_key"] = bool(getattr(profile, "deepseek_api_key", None))
     base["auto_save_dienstreisen"] = bool(getattr(profile, "auto_save_dienstreisen", True))
     if include_secrets:
@@ -759,6 +774,7 @@ def profil_view():
             s.add(profile)
             s.commit()
             s.refresh(profile)
+            profile_cache.invalidate(g.current_user.id)
         s.expunge_all()
     return render_template("profil.html", profile=profile, **_common_template_ctx())
 
@@ -804,6 +820,7 @@ def profil_save():
         }
         profile.bahncards = bcs
         s.commit()
+    profile_cache.invalidate(g.current_user.id)
     flash("Profil gespeichert.", "success")
     return redirect(url_for("profil_view"))
 
@@ -819,15 +836,11 @@ def profil_json():
     auf dem der Klar-Key den Server verlaesst — und auch nur in eine
     authenticated Session des Owners.
     """
-    from db import SessionLocal
-    from models_db import UserProfile
-
     include_secrets = request.args.get("include_secrets") == "1"
-    with SessionLocal() as s:
-        profile = s.query(UserProfile).filter(UserProfile.user_id == g.current_user.id).first()
-        if profile is None:
-            return jsonify({})
-        return jsonify(_profile_to_dict(profile, include_secrets=include_secrets))
+    profile = profile_cache.get(g.current_user.id)
+    if profile is None:
+        return jsonify({})
+    return jsonify(_profile_to_dict(profile, include_secrets=include_secrets))
 
 
 @app.route("/dienstreisen/<int:reise_id>/delete", methods=["POST"])
@@ -1056,83 +1069,27 @@ def admin_account_request_delete(req_id: int):
 # --- DOCS (Public) ---
 
 
-_BLEACH_ALLOWED_TAGS = frozenset(
-    {
-        "h1",
-        "h2",
-        "h3",
-        "h4",
-        "h5",
-        "h6",
-        "p",
-        "br",
-        "hr",
-        "strong",
-        "em",
-        "code",
-        "pre",
-        "blockquote",
-        "ul",
-        "ol",
-        "li",
-        "a",
-        "table",
-        "thead",
-        "tbody",
-        "tr",
-        "th",
-        "td",
-        "div",
-        "span",
-    }
-)
-_BLEACH_ALLOWED_ATTRIBUTES = {
-    "a": ["href", "title", "rel", "target"],
-    "code": ["class"],  # fuer fenced_code language classes
-    "th": ["align"],
-    "td": ["align"],
-    "h1": ["id"],
-    "h2": ["id"],
-    "h3": ["id"],
-    "h4": ["id"],
-    "h5": ["id"],
-    "h6": ["id"],
-}
-_BLEACH_ALLOWED_PROTOCOLS = frozenset({"http", "https", "mailto"})
-
-
 @app.route("/docs/", defaults={"slug": "getting-started"}, methods=["GET"])
 @app.route("/docs/<slug>", methods=["GET"])
 def docs_view(slug: str):
     # Whitelist: nur Slugs ohne Pfad-Tricks.
     if not re.fullmatch(r"[a-z0-9_-]+", slug):
         abort(404)
-    path = DOCS_DIR / f"{slug}.md"
-    if not path.is_file():
+    rendered = docs_cache.render(DOCS_DIR / f"{slug}.md")
+    if rendered is None:
         abort(404)
-    text = path.read_text(encoding="utf-8")
-    # Markdown -> HTML mit Standard-Extensions (Tabellen, Fenced Code).
-    raw_html = md.markdown(text, extensions=["fenced_code", "tables", "toc", "sane_lists"])
-    # Defense-in-depth: Markdown-Quelle ist zwar Repo-Code (vertraut), aber wir
-    # sanitisieren trotzdem mit einer Allowlist, damit ein versehentlich
-    # eingeschmuggelter <script>-Tag in einer docs/*.md nicht direkt zu
-    # Stored-XSS wird. Ohne Bleach waere /docs/<slug> ein offener
-    # Vertrauensanker auf einer public-Route.
-    body = bleach.clean(
-        raw_html,
-        tags=_BLEACH_ALLOWED_TAGS,
-        attributes=_BLEACH_ALLOWED_ATTRIBUTES,
-        protocols=_BLEACH_ALLOWED_PROTOCOLS,
-        strip=True,
-    )
-    pages = sorted(p.stem for p in DOCS_DIR.glob("*.md")) if DOCS_DIR.is_dir() else []
-    return render_template(
-        "docs.html",
-        body=body,
-        slug=slug,
-        pages=pages,
-        **_common_template_ctx(),
-    )
+    body_version, body = rendered
+    index_version, pages = docs_cache.page_index(DOCS_DIR)
+
+    def render_page() -> str:
+        return render_template("docs.html", body=body, slug=slug, pages=pages, **_common_template_ctx())
+
+    # Gaeste (ohne Flash-Meldungen) sehen alle dieselbe Seite → vorkomprimiert
+    # aus dem Cache. Eingeloggte bekommen Nav/Name, dort nur Body + Index gecacht.
+    if g.get("current_user") is not None or "_flashes" in session or app.debug:
+        return render_page()
+    page = docs_cache.page(slug, (str(DOCS_DIR), body_version, index_version), render_page)
+    return docs_cache.response(page, request)
 
 
 @app.route("/example", methods=["GET"])
@@ -1149,6 +1106,42 @@ def get_example():
         return jsonify({"error": "Interner Fehler beim Laden des Beispiels."}), 500
 
 
+def _prepare_antrag(data: dict):
+    """Bereinigt, merged und validiert ein Antrag-JSON wie ``/generate``.
+
+    Returns:
+        (data, result): bereinigtes JSON und das validierte Pydantic-Modell
+
+    Raises:
+        ValueError: Mit nutzerlesbarer Meldung (Platzhalter, Validierung)
+    """
+    # KI-Zitatmarker aus String-Werten entfernen (Restbereinigung)
+    data = strip_citations(data)
+
+    # Profil-autoritativer Merge: bei eingeloggten Usern überschreiben die
+    # Profildaten (Antragsteller, BahnCard/Großkundenrabatt) die von KI
+    # oder Client gelieferten Werte — manipulationssicher. Gäste haben
+    # kein Server-Profil; ihre clientseitig (localStorage) gemergten Daten
+    # bleiben unverändert. ``befoerderung`` bleibt immer Nutzer-Wahl.
+    if auth.is_authenticated():
+        antragsteller, bahncards = _profile_antrag_overrides(g.current_user)
+        data = apply_profile_authoritative(data, antragsteller=antragsteller, bahncards=bahncards)
+
+    # Defense-in-depth: zurückgebliebene Prompt-Platzhalter ([DEIN NAME]
+    # o.ä.) dürfen nie ins PDF — eindeutige Fehlermeldung statt Müll.
+    platzhalter = find_placeholder(data)
+    if platzhalter:
+        logger.warning("Platzhalter im Antrag-JSON abgewiesen: %s", platzhalter)
+        raise ValueError(f"Profil unvollständig: Platzhalter '{platzhalter}' im Antrag. Bitte Profil ausfüllen.")
+
+    # Strikte Validierung mit Pydantic
+    is_valid, result = validate_reiseantrag(data)
+    if not is_valid:
+        logger.warning(f"Ungültige JSON-Struktur: {result}")
+        raise ValueError(f"Validierungsfehler: {result}")
+    return data, result
+
+
 @app.route("/generate", methods=["POST"])
 @limiter.limit(f"{RATE_LIMIT} per minute")
 def generate():
@@ -1165,72 +1158,33 @@ def generate():
         # JSON parsen
         data = json.loads(json_text)
 
-        # KI-Zitatmarker aus String-Werten entfernen (Restbereinigung)
-        data = _strip_citations(data)
-
-        # Profil-autoritativer Merge: bei eingeloggten Usern überschreiben die
-        # Profildaten (Antragsteller, BahnCard/Großkundenrabatt) die von KI
-        # oder Client gelieferten Werte — manipulationssicher. Gäste haben
-        # kein Server-Profil; ihre clientseitig (localStorage) gemergten Daten
-        # bleiben unverändert. ``befoerderung`` bleibt immer Nutzer-Wahl.
-        if auth.is_authenticated():
-            antragsteller, bahncards = _profile_antrag_overrides(g.current_user)
-            data = apply_profile_authoritative(data, antragsteller=antragsteller, bahncards=bahncards)
-
-        # Defense-in-depth: zurückgebliebene Prompt-Platzhalter ([DEIN NAME]
-        # o.ä.) dürfen nie ins PDF — eindeutige Fehlermeldung statt Müll.
-        platzhalter = find_placeholder(data)
-        if platzhalter:
-            logger.warning("Platzhalter im Antrag-JSON abgewiesen: %s", platzhalter)
-            return jsonify(
-                {"error": f"Profil unvollständig: Platzhalter '{platzhalter}' im Antrag. Bitte Profil ausfüllen."}
-            ), 400
-
-        # Strikte Validierung mit Pydantic
-        is_valid, result = validate_reiseantrag(data)
-        if not is_valid:
-            logger.warning(f"Ungültige JSON-Struktur: {result}")
-            return jsonify({"error": f"Validierungsfehler: {result}"}), 400
-
-        # Create temporary directory for output
-        temp_dir = tempfile.mkdtemp()
-
-        # Generate PDF mit dem validierten Modell (inkl. Pydantic-Defaults)
         try:
-            output_path = generator.fill_pdf(result.model_dump(), PDF_TEMPLATE_PATH, temp_dir)
-            filename = os.path.basename(output_path)
-
-            # Optional persistieren: nur fuer eingeloggte User und nur wenn das
-            # Frontend ``save_to_account=1`` mitschickt. Header ``X-Dienstreise-Id``
-            # in der Response laesst das Frontend wissen, welche Reise verknuepft wurde.
-            response_headers = {}
-            if auth.is_authenticated() and request.form.get("save_to_account") == "1":
-                try:
-                    reise_id = _persist_antrag(request.form.get("dienstreise_id", ""), data, result, output_path)
-                    response_headers["X-Dienstreise-Id"] = str(reise_id)
-                    logger.info("Antrag in DB persistiert: reise_id=%s user=%s", reise_id, g.current_user.id)
-                except Exception:
-                    logger.exception("Persistenz fehlgeschlagen — PDF wird trotzdem ausgeliefert")
-
-            # Send file to user
-            # We use after_this_request to cleanup the temp dir
-            @after_this_request
-            def remove_temp_file(response):
-                try:
-                    shutil.rmtree(temp_dir)
-                except Exception as e:
-                    app.logger.error(f"Error removing temp dir: {e}")
-                return response
-
-            logger.info(f"PDF erfolgreich generiert: {filename}")
-            resp = send_file(output_path, as_attachment=True, download_name=filename)
-            for k, v in response_headers.items():
-                resp.headers[k] = v
-            return resp
-
-        except Exception as e:
-            shutil.rmtree(temp_dir)
-            raise e
+            data, result = _prepare_antrag(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # PDF im Speicher erzeugen (validiertes Modell inkl. Pydantic-Defaults) —
+        # kein Temp-Verzeichnis; auf Platte landet es nur beim Persistieren.
+        # Mit aktivem Render-Pool (DR_AUTOMATE_PDF_POOL_WORKERS) in einem Worker-Prozess.
+        filename, pdf_bytes = pdf_pool.run(generator.render_pdf, result.model_dump(), PDF_TEMPLATE_PATH)
+
+        # Optional persistieren: nur fuer eingeloggte User und nur wenn das
+        # Frontend ``save_to_account=1`` mitschickt. Header ``X-Dienstreise-Id``
+        # in der Response laesst das Frontend wissen, welche Reise verknuepft wurde.
+        response_headers = {}
+        if auth.is_authenticated() and request.form.get("save_to_account") == "1":
+            try:
+                reise_id = _persist_antrag(request.form.get("dienstreise_id", ""), data, result, pdf_bytes)
+                response_headers["X-Dienstreise-Id"] = str(reise_id)
+                logger.info("Antrag in DB persistiert: reise_id=%s user=%s", reise_id, g.current_user.id)
+            except Exception:
+                logger.exception("Persistenz fehlgeschlagen — PDF wird trotzdem ausgeliefert")
+
+        logger.info(f"PDF erfolgreich generiert: {filename}")
+        resp = _pdf_response(pdf_bytes, filename)
+        for k, v in response_headers.items():
+            resp.headers[k] = v
+        return resp
 
     except json.JSONDecodeError as e:
         logger.error(f"JSON-Parsing-Fehler: {e}")
@@ -1245,6 +1199,11 @@ def generate():
 def extract():
     """Extrahiert aus Freitext via DeepSeek das Antrag-JSON (BYOK).
 
+    Ohne API-Key beantwortet der Regel-Schnellpfad (rule_extract.py)
+    beschriftete Standardvorlagen ("Ort:", "Datum:", "Uhrzeit:"). Mit Key
+    fragt es immer DeepSeek — nur das schaetzt die Reisezeiten aus Strecke
+    und gewaehlter Befoerderung statt mit festem Puffer.
+
     Erwartet:
       Header 'X-DeepSeek-Key': vom User bereitgestellter API-Key (nie geloggt, nie persistiert).
       Form 'freitext':         Ausschreibung/E-Mail/Notiz.
@@ -1254,13 +1213,9 @@ def extract():
     # Fallback: wenn der Header leer ist UND der User authentifiziert ist,
     # holen wir den Key aus dem verschluesselten Server-Profil.
     if not api_key and auth.is_authenticated():
-        from db import SessionLocal
-        from models_db import UserProfile
-
-        with SessionLocal() as s:
-            profile = s.query(UserProfile).filter(UserProfile.user_id == g.current_user.id).first()
-            if profile and profile.deepseek_api_key:
-                api_key = profile.deepseek_api_key
+        profile = profile_cache.get(g.current_user.id)
+        if profile and profile.deepseek_api_key:
+            api_key = profile.deepseek_api_key
     freitext = request.form.get("freitext", "")
     sonderwuensche = request.form.get("sonderwuensche", "")
 
@@ -1295,6 +1250,35 @@ def extract():
     if not freitext.strip():
         return jsonify({"error": "Bitte Freitext oder PDF angeben."}), 400
 
+    # Mail-/HTML-Ballast entfernen (compaction.py) — spart Prompt-Tokens und Latenz.
+    compacted = compaction.compact(freitext)
+    freitext = compacted.text
+    if compacted.removed_chars:
+        logger.info(
+            "Freitext kompaktiert: -%d Zeichen (~%d Tokens)", compacted.removed_chars, compacted.removed_tokens_estimate
+        )
+
+        @after_this_request
+        def _report_compaction(response):
+            response.headers["X-Freitext-Removed-Chars"] = str(compacted.removed_chars)
+            return response
+
+    stream = request.accept_mimetypes.best == "text/event-stream"
+
+    # Regel-Schnellpfad: nur ohne Key (mit Key liefert DeepSeek die besseren
+    # Reisezeiten) und ohne Sonderwuensche, die kann nur das LLM umsetzen.
+    if not api_key.strip() and not sonderwuensche.strip():
+        import rule_extract
+
+        heimatort = ""
+        if auth.is_authenticated():
+            profile = profile_cache.get(g.current_user.id)
+            heimatort = rule_extract.home_city(profile.adresse_privat) if profile else ""
+        fast = rule_extract.extract(freitext, heimatort)
+        if fast.confident:
+            logger.info("Extraktion per Regel-Schnellpfad (Konfidenz %.2f)", fast.confidence)
+            return _sse_response(iter([_sse("result", fast.data)])) if stream else jsonify(fast.data)
+
     # Reise-Abfrage (Verkehrsmittel Hin/Rück) als Kontext anhängen — die KI
     # nutzt es nur, um realistische Reisezeiten zu schätzen, und gibt die
     # Beförderung selbst nicht aus (system_prompt.md, Abschnitt 3).
@@ -1305,16 +1289,33 @@ def extract():
             f"(nur für Zeitschätzung, NICHT ausgeben) ---\n{reise_kontext}"
         )
 
+    import extract_cache
+
+    system_prompt = load_system_prompt()
+    # Opt-in-Cache (extract_cache.py); ohne Key gibt es wie bisher ein 400.
+    cache_key = None
+    if extract_cache.enabled() and api_key.strip():
+        cache_key = extract_cache.make_key(system_prompt, freitext, sonderwuensche, ai_extract.DEEPSEEK_MODEL)
+        cached = extract_cache.get(cache_key)
+        if cached is not None:
+            logger.info("AI-Extraktion aus dem Cache")
+            return _sse_response(iter([_sse("result", cached)])) if stream else jsonify(cached)
+
+    if stream:
+        return _extract_stream(freitext, api_key, system_prompt, sonderwuensche, cache_key)
+
     try:
         result = ai_extract.call_deepseek(
             freitext=freitext,
             api_key=api_key,
-            system_prompt=_load_system_prompt(),
+            system_prompt=system_prompt,
             sonderwuensche=sonderwuensche,
         )
         # Citation-Marker bereinigen (manche LLMs lassen sich davon nicht abhalten).
-        result = _strip_citations(result)
+        result = strip_citations(result)
         logger.info("AI-Extraktion erfolgreich")
+        if cache_key is not None:
+            extract_cache.put(cache_key, result)
         return jsonify(result)
     except ai_extract.AIExtractError as e:
         # Bewusst kein Logging von freitext/api_key — nur Statusmeldung.
@@ -1325,6 +1326,142 @@ def extract():
         return jsonify({"error": "Interner Fehler bei der AI-Extraktion"}), 500
 
 
+def _batch_extract_charge():
+    """Bucht DeepSeek-Aufrufe aus /extract/batch gegen ``BATCH_EXTRACT_RATE_LIMIT``.
+
+    Der Schluessel wird hier im Request-Kontext bestimmt, gebucht wird aus
+    den Worker-Threads von batch_extract.
+    """
+    import batch_extract
+
+    per_minute = BATCH_EXTRACT_RATE_LIMIT or str(max(int(RATE_LIMIT), batch_extract.MAX_BATCH_DOCUMENTS))
+    item = parse_limit(f"{per_minute} per minute")
+    key = get_remote_address()
+    return lambda: limiter.limiter.hit(item, "extract_batch", key)
+
+
+@app.route("/extract/batch", methods=["POST"])
+@auth.login_required
+@limiter.limit(f"{RATE_LIMIT} per minute")
+def extract_batch():
+    """Extrahiert viele Ausschreibungen in einem Request (batch_extract.py).
+
+    Erwartet JSON ``{"dokumente": [{"freitext": "...", "label": "...",
+    "sonderwuensche": "..."}], "befoerderung": {...}, "entwuerfe": true}``;
+    ``befoerderung`` (optional) gilt fuer alle Dokumente, ``entwuerfe`` legt
+    gueltige Ergebnisse als Entwurfs-Dienstreisen an. Key wie bei /extract
+    (Header oder Server-Profil). Antwort: ``{"ergebnisse": [...]}`` in
+    Eingabe-Reihenfolge, Fehler pro Dokument statt Abbruch.
+
+    Der Request selbst zaehlt gegen ``RATE_LIMIT``, jeder tatsaechliche
+    DeepSeek-Aufruf gegen ``BATCH_EXTRACT_RATE_LIMIT`` (Schnellpfad und
+    Cache kosten nichts). Ist das ausgeschoepft, bekommen die restlichen
+    Dokumente einen Fehler mit Status 429.
+    """
+    import batch_extract
+    import rule_extract
+
+    body = request.get_json(silent=True)
+    dokumente = body.get("dokumente") if isinstance(body, dict) else None
+    if not isinstance(dokumente, list) or not dokumente:
+        return jsonify({"error": "'dokumente' muss eine nicht-leere Liste sein."}), 400
+    if len(dokumente) > batch_extract.MAX_BATCH_DOCUMENTS:
+        return jsonify({"error": f"Zu viele Dokumente (max {batch_extract.MAX_BATCH_DOCUMENTS})."}), 400
+
+    profile = profile_cache.get(g.current_user.id)
+    api_key = request.headers.get("X-DeepSeek-Key", "") or (profile.deepseek_api_key if profile else "") or ""
+    jobs = []
+    for idx, doc in enumerate(dokumente, start=1):
+        doc = doc if isinstance(doc, dict) else {}
+        jobs.append(
+            batch_extract.ExtractJob(
+                label=str(doc.get("label") or f"dokument-{idx}"),
+                freitext=str(doc.get("freitext") or ""),
+                sonderwuensche=str(doc.get("sonderwuensche") or ""),
+            )
+        )
+    antragsteller, bahncards = _profile_antrag_overrides(g.current_user)
+    befoerderung = body.get("befoerderung")
+    ctx = batch_extract.BatchContext(
+        api_key=api_key,
+        system_prompt=load_system_prompt(),
+        basis={"befoerderung": befoerderung} if isinstance(befoerderung, dict) else {},
+        antragsteller=antragsteller,
+        bahncards=bahncards,
+        heimatort=rule_extract.home_city(profile.adresse_privat) if profile else "",
+        charge=_batch_extract_charge(),
+    )
+    results = batch_extract.extract_batch(jobs, ctx)
+
+    if body.get("entwuerfe") is True:
+        from db import SessionLocal
+
+        with SessionLocal() as s:
+            n = batch_extract.create_drafts(s, g.current_user.id, results)
+        logger.info("Batch-Extraktion: %d Entwuerfe fuer user=%s", n, g.current_user.id)
+    logger.info(
+        "Batch-Extraktion: %d Dokumente, %d fehlgeschlagen, user=%s",
+        len(results),
+        sum(res.error is not None for res in results),
+        g.current_user.id,
+    )
+    return jsonify({"ergebnisse": [res.report() for res in results]})
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sse_response(events) -> Response:
+    # X-Accel-Buffering: nginx/Traefik sollen die Events nicht puffern.
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _extract_stream(freitext: str, api_key: str, system_prompt: str, sonderwuensche: str, cache_key: str | None):
+    """/extract als Server-Sent Events (``Accept: text/event-stream``).
+
+    Fehler vor dem ersten Byte (Key, Eingaben, HTTP-Status von DeepSeek)
+    kommen wie beim JSON-Pfad als Status-Code; danach als ``error``-Event.
+    Events: ``progress`` ({"zeichen": n}), ``result`` (Antrag-JSON), ``error``.
+    """
+    import extract_cache
+
+    try:
+        events = ai_extract.stream_deepseek(
+            freitext=freitext,
+            api_key=api_key,
+            system_prompt=system_prompt,
+            sonderwuensche=sonderwuensche,
+        )
+    except ai_extract.AIExtractError as e:
+        logger.warning(f"AI-Extraktion fehlgeschlagen: HTTP {e.status_code} — {e}")
+        return jsonify({"error": str(e)}), e.status_code
+
+    def generate():
+        try:
+            for kind, value in events:
+                if kind == "progress":
+                    yield _sse("progress", {"zeichen": value})
+                    continue
+                result = strip_citations(value)
+                logger.info("AI-Extraktion erfolgreich (Stream)")
+                if cache_key is not None:
+                    extract_cache.put(cache_key, result)
+                yield _sse("result", result)
+        except ai_extract.AIExtractError as e:
+            logger.warning(f"AI-Extraktion fehlgeschlagen: HTTP {e.status_code} — {e}")
+            yield _sse("error", {"error": str(e), "status": e.status_code})
+        except Exception as e:
+            logger.exception(f"AI-Extraktion unerwarteter Fehler: {type(e).__name__}")
+            yield _sse("error", {"error": "Interner Fehler bei der AI-Extraktion", "status": 500})
+
+    return _sse_response(generate())
+
+
 @app.route("/abrechnung", methods=["GET"])
 def abrechnung_index():
     """Wizard-UI für die Reisekostenabrechnung."""
@@ -1355,37 +1492,23 @@ def abrechnung_generate():
 
         result.berechnet = berechnung(result)
 
-        temp_dir = tempfile.mkdtemp()
-        try:
-            output_path = generator_abrechnung.fill_pdf(result, PDF_TEMPLATE_ABRECHNUNG_PATH, temp_dir)
-            filename = os.path.basename(output_path)
-
-            response_headers = {}
-            if auth.is_authenticated() and request.form.get("save_to_account") == "1":
-                try:
-                    abr_id = _persist_abrechnung(request.form.get("dienstreise_id", ""), data, output_path)
-                    if abr_id is not None:
-                        response_headers["X-Abrechnung-Id"] = str(abr_id)
-                        logger.info("Abrechnung in DB persistiert: abr_id=%s user=%s", abr_id, g.current_user.id)
-                except Exception:
-                    logger.exception("Abrechnung-Persistenz fehlgeschlagen — PDF wird trotzdem ausgeliefert")
-
-            @after_this_request
-            def remove_temp_file(response):
-                try:
-                    shutil.rmtree(temp_dir)
-                except Exception as e:
-                    app.logger.error(f"Error removing temp dir: {e}")
-                return response
-
-            logger.info(f"Abrechnungs-PDF erfolgreich generiert: {filename}")
-            resp = send_file(output_path, as_attachment=True, download_name=filename)
-            for k, v in response_headers.items():
-                resp.headers[k] = v
-            return resp
-        except Exception as e:
-            shutil.rmtree(temp_dir)
-            raise e
+        filename, pdf_bytes = pdf_pool.run(generator_abrechnung.render_pdf, result, PDF_TEMPLATE_ABRECHNUNG_PATH)
+
+        response_headers = {}
+        if auth.is_authenticated() and request.form.get("save_to_account") == "1":
+            try:
+                abr_id = _persist_abrechnung(request.form.get("dienstreise_id", ""), data, pdf_bytes)
+                if abr_id is not None:
+                    response_headers["X-Abrechnung-Id"] = str(abr_id)
+                    logger.info("Abrechnung in DB persistiert: abr_id=%s user=%s", abr_id, g.current_user.id)
+            except Exception:
+                logger.exception("Abrechnung-Persistenz fehlgeschlagen — PDF wird trotzdem ausgeliefert")
+
+        logger.info(f"Abrechnungs-PDF erfolgreich generiert: {filename}")
+        resp = _pdf_response(pdf_bytes, filename)
+        for k, v in response_headers.items():
+            resp.headers[k] = v
+        return resp
 
     except json.JSONDecodeError as e:
         logger.error(f"Abrechnung: JSON-Parsing-Fehler: {e}")
@@ -1420,11 +1543,84 @@ def abrechnung_calc():
         return jsonify({"error": "Interner Fehler bei der Berechnung."}), 500
 
 
+@app.route("/batch/generate", methods=["POST"])
+@auth.login_required
+@limiter.limit(f"{RATE_LIMIT} per minute")
+def batch_generate():
+    """Erzeugt viele Anträge/Abrechnungen in einem Request als ZIP.
+
+    Erwartet ``{"items": [...]}`` (JSON-Body oder Form-Feld ``json_data``),
+    pro Eintrag entweder ``{"art": "antrag"|"abrechnung", "dienstreise_id": 12}``
+    (gespeicherte Reise des Users) oder ``{"art": ..., "json": {...}}``.
+    Fehler einzelner Einträge stehen in ``bericht.json`` im ZIP; der Batch
+    als Ganzes scheitert nur an kaputtem Request-Format.
+    """
+    from db import SessionLocal
+
+    try:
+        json_text = request.form.get("json_data") or request.get_data(as_text=True)
+        items = json.loads(json_text).get("items")
+    except (json.JSONDecodeError, AttributeError):
+        return jsonify({"error": "Invalid JSON format"}), 400
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "'items' muss eine nicht-leere Liste sein."}), 400
+    if len(items) > batch_pdf.MAX_BATCH_ITEMS:
+        return jsonify({"error": f"Zu viele Einträge (max {batch_pdf.MAX_BATCH_ITEMS})."}), 400
+
+    # Nicht-Dict-Eintraege wie leere Dicts behandeln → landen als Fehler im Bericht.
+    items = [item if isinstance(item, dict) else {} for item in items]
+    # Gespeicherte Reisen in einem Query laden (nur eigene, IDOR-Schutz),
+    # Payloads durchlaufen dieselbe Bereinigung wie /generate.
+    reise_ids = [int(rid) if str(rid := item.get("dienstreise_id", "")).isdigit() else None for item in items]
+    wanted = [(rid, str(item.get("art", ""))) for rid, item in zip(reise_ids, items, strict=True) if rid is not None]
+    with SessionLocal() as s:
+        stored = iter(batch_pdf.jobs_for_dienstreisen(s, wanted, user_id=g.current_user.id))
+
+    jobs = []
+    for idx, (rid, item) in enumerate(zip(reise_ids, items, strict=True), start=1):
+        if rid is not None:
+            jobs.append(next(stored))
+            continue
+        job = batch_pdf.BatchJob(label=f"eintrag-{idx}", art=str(item.get("art", "")))
+        payload = item.get("json")
+        if job.art not in batch_pdf.ARTEN:
+            job.error = f"Unbekannte Art '{job.art}' (erlaubt: {', '.join(batch_pdf.ARTEN)})"
+        elif not isinstance(payload, dict):
+            job.error = "Eintrag braucht 'dienstreise_id' oder 'json'."
+        elif job.art == batch_pdf.ANTRAG:
+            try:
+                job.data, _ = _prepare_antrag(payload)
+            except ValueError as e:
+                job.error = str(e)
+        else:
+            job.data = payload
+        jobs.append(job)
+
+    templates = {batch_pdf.ANTRAG: PDF_TEMPLATE_PATH, batch_pdf.ABRECHNUNG: PDF_TEMPLATE_ABRECHNUNG_PATH}
+    logger.info("Batch-PDF: %d Einträge fuer user=%s", len(jobs), g.current_user.id)
+    filename = f"{datetime.now().strftime('%Y%m%d')}_DR-Batch.zip"
+    return Response(
+        batch_pdf.iter_zip(batch_pdf.render_batch(jobs, templates)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @app.route("/health", methods=["GET"])
 @csrf.exempt
 def health_check():
     """Health-Check Endpoint für Container/Monitoring."""
-    return jsonify({"status": "healthy", "template_exists": os.path.exists(PDF_TEMPLATE_PATH), "version": "0.1.0"}), 200
+    return (
+        jsonify(
+            {
+                "status": "healthy",
+                "template_exists": os.path.exists(PDF_TEMPLATE_PATH),
+                "version": "0.1.0",
+                "system_prompt": system_prompt_stats(),
+            }
+        ),
+        200,
+    )
 
 
 @app.after_request
@@ -17,22 +17,47 @@ fremde Identitaeten annehmen.
 In Produktion garantiert Traefik, dass externe Clients diese Header
 NICHT senden koennen — sie werden von der ForwardAuth-Middleware ueber-
 schrieben.
+
+Aufgeloeste User werden pro Header-Kombination fuer
+``DR_AUTOMATE_USER_CACHE_TTL`` Sekunden im Prozess gecacht — Lese-Requests
+kosten dann keine DB-Abfrage. Mit ``DR_AUTOMATE_PROCESS_LOCAL_CACHES=0``
+(mehrere gunicorn-Worker) ist dieser Cache aus: ``clear_user_cache`` wirkt
+nur im eigenen Prozess, andere Worker saehen einen geaenderten oder
+geloeschten User sonst bis zum Ablauf der TTL. ``last_login_at`` wird pro User hoechstens
+alle ``DR_AUTOMATE_LAST_LOGIN_INTERVAL`` Sekunden geschrieben, gesammelt
+als ein Job fuer ``db.write_behind`` (``flush_logins``), statt bei jedem
+Request zu committen.
 """
 
 from __future__ import annotations
 
+import atexit
 import logging
+import os
+import threading
+import time
 from datetime import datetime
 from functools import wraps
 
 from flask import abort, current_app, g, redirect, request, url_for
-from sqlalchemy import select
+from sqlalchemy import bindparam, select, update
 
-from db import SessionLocal
+from db import SessionLocal, write_behind
 from models_db import User, UserProfile
 
 logger = logging.getLogger(__name__)
 
+# Mehrere Worker: kein Cache, siehe Modul-Docstring.
+USER_CACHE_TTL = (
+    float(os.environ.get("DR_AUTOMATE_USER_CACHE_TTL", "60"))
+    if os.environ.get("DR_AUTOMATE_PROCESS_LOCAL_CACHES", "1") != "0"
+    else 0.0
+)
+LAST_LOGIN_INTERVAL = float(os.environ.get("DR_AUTOMATE_LAST_LOGIN_INTERVAL", "300"))
+# Faellige last_login_at-Zeitstempel so lange sammeln, dann gemeinsam schreiben.
+LOGIN_FLUSH_DELAY = 5.0
+USER_CACHE_MAX = 1024
+
 
 GUEST_FRIENDLY_ENDPOINTS = {
     "index",
@@ -55,8 +80,114 @@ def _trust_header() -> bool:
     return current_app.config.get("TRUST_REMOTE_USER_HEADER", False)
 
 
+class _UserCache:
+    """Header-Tupel → detachter User (TTL) plus gesammelte last_login_at-Writes.
+
+    Die gecachten User-Objekte werden von mehreren Requests geteilt und sind
+    nur zum Lesen da (so nutzt die App ``g.current_user`` ohnehin).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[tuple, tuple[float, User]] = {}
+        self._pending: dict[int, datetime] = {}  # user_id → noch nicht geschriebenes last_login_at
+        self._written: dict[int, float] = {}  # user_id → monotonic des letzten Writes
+        self._flush_at: float | None = None
+
+    def get(self, key: tuple) -> User | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def put(self, key: tuple, user: User) -> None:
+        with self._lock:
+            if len(self._entries) >= USER_CACHE_MAX:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+                if len(self._entries) >= USER_CACHE_MAX:
+                    self._entries.clear()
+            self._entries[key] = (time.monotonic() + USER_CACHE_TTL, user)
+
+    def logged_in(self, user_id: int, written: bool = False) -> None:
+        """Login vermerken; faellig wird ein Write erst nach ``LAST_LOGIN_INTERVAL``."""
+        now = time.monotonic()
+        with self._lock:
+            if written:
+                self._written[user_id] = now
+                self._pending.pop(user_id, None)
+                return
+            last = self._written.get(user_id)
+            if last is not None and now - last < LAST_LOGIN_INTERVAL:
+                return
+            self._pending[user_id] = datetime.utcnow()
+            if self._flush_at is None:
+                self._flush_at = now + LOGIN_FLUSH_DELAY
+
+    def take_due(self, force: bool = False) -> dict[int, datetime]:
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending or (not force and (self._flush_at is None or now < self._flush_at)):
+                return {}
+            due, self._pending, self._flush_at = self._pending, {}, None
+            return due
+
+    def written(self, due: dict[int, datetime]) -> None:
+        """Nach erfolgreichem Write: bis ``LAST_LOGIN_INTERVAL`` nicht erneut schreiben."""
+        now = time.monotonic()
+        with self._lock:
+            for user_id in due:
+                self._written[user_id] = now
+
+    def requeue(self, due: dict[int, datetime]) -> None:
+        """Nach fehlgeschlagenem Write: beim naechsten Flush erneut versuchen
+        (neuere Logins aus der Zwischenzeit gewinnen)."""
+        with self._lock:
+            for user_id, ts in due.items():
+                self._pending.setdefault(user_id, ts)
+            if self._pending and self._flush_at is None:
+                self._flush_at = time.monotonic() + LOGIN_FLUSH_DELAY
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+            self._written.clear()
+            self._flush_at = None
+
+
+_user_cache = _UserCache()
+
+
+def flush_logins(force: bool = False) -> int:
+    """Reicht alle faelligen last_login_at als einen Write-Behind-Job ein. Gibt die Anzahl zurueck."""
+    due = _user_cache.take_due(force)
+    if not due:
+        return 0
+    stmt = update(User.__table__).where(User.__table__.c.id == bindparam("uid")).values(last_login_at=bindparam("ts"))
+    params = [{"uid": uid, "ts": ts} for uid, ts in due.items()]
+    # Erst nach dem Commit als geschrieben vermerken; ein Fehlschlag (vom
+    # Write-Behind geloggt) wird beim naechsten Flush wiederholt.
+    future = write_behind.submit(lambda s: s.execute(stmt, params))
+    future.add_done_callback(lambda f: _user_cache.written(due) if f.exception() is None else _user_cache.requeue(due))
+    return len(due)
+
+
+atexit.register(flush_logins, True)
+
+
+def clear_user_cache() -> None:
+    """Cache leeren (Tests, nach manuellen User-Aenderungen in der DB)."""
+    _user_cache.clear()
+
+
 def _upsert_user(remote_user: str, email: str | None, display_name: str | None) -> User:
-    """Idempotent: legt User an oder updated last_login_at + optional email/name."""
+    """Idempotent: legt User an oder uebernimmt geaenderte email/name.
+
+    Committet nur, wenn sich etwas geaendert hat; ``last_login_at`` sammelt
+    der Cache (siehe ``flush_logins``).
+    """
     with SessionLocal() as session:
         user = session.execute(select(User).where(User.remote_user == remote_user)).scalar_one_or_none()
         now = datetime.utcnow()
@@ -72,6 +203,7 @@ def _upsert_user(remote_user: str, email: str | None, display_name: str | None)
             # leeres Profil anlegen, damit /profil nie 404'd
             session.add(UserProfile(user_id=user.id))
             session.commit()
+            _user_cache.logged_in(user.id, written=True)
             logger.info("Neuer User angelegt: remote_user=%s", remote_user)
         else:
             # Header-Updates uebernehmen (Authelia hat ggf. Display-Name geaendert)
@@ -82,10 +214,10 @@ def _upsert_user(remote_user: str, email: str | None, display_name: str | None)
             if display_name and user.display_name != display_name:
                 user.display_name = display_name
                 changed = True
-            user.last_login_at = now
-            session.commit()
             if changed:
+                session.commit()
                 logger.info("User aktualisiert: remote_user=%s", remote_user)
+            _user_cache.logged_in(user.id)
         session.refresh(user)
         # Detach: g.current_user soll keine offene Session halten
         session.expunge(user)
@@ -103,11 +235,19 @@ def load_current_user() -> User | None:
     remote_user = remote_user[:128]
     email = (request.headers.get("Remote-Email", "") or "").strip()[:254] or None
     display_name = (request.headers.get("Remote-Name", "") or "").strip()[:200] or None
-    try:
-        return _upsert_user(remote_user, email, display_name)
-    except Exception:  # pragma: no cover
-        logger.exception("User-Upsert fehlgeschlagen fuer remote_user=%s", remote_user)
-        return None
+    key = (remote_user, email, display_name)
+    user = _user_cache.get(key)
+    if user is not None:
+        _user_cache.logged_in(user.id)
+    else:
+        try:
+            user = _upsert_user(remote_user, email, display_name)
+        except Exception:  # pragma: no cover
+            logger.exception("User-Upsert fehlgeschlagen fuer remote_user=%s", remote_user)
+            return None
+        _user_cache.put(key, user)
+    flush_logins()
+    return user
 
 
 def login_required(view):
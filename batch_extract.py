@@ -0,0 +1,346 @@
+"""Batch-Extraktion: viele Ausschreibungen auf einmal in Antrag-JSON.
+
+Zum Halbjahr kommen die Fortbildungs-Einladungen im Sekretariat gesammelt
+an — bisher ein ``/extract``-Aufruf (und 10–30 s Warten) pro Dokument.
+Hier laufen die Dokumente parallel in Threads (DeepSeek-Aufrufe sind reines
+Netz-I/O), jedes durchlaeuft dieselbe Kette wie ``/extract``:
+
+    Kompaktierung → Regel-Schnellpfad (nur ohne Key) → Extract-Cache → DeepSeek
+
+``Throttle`` begrenzt die gleichzeitigen DeepSeek-Aufrufe und bremst bei
+429 alle Threads gemeinsam aus. Jedes Ergebnis wird mit
+``validate_reiseantrag`` geprueft; was das LLM nicht liefert (Antragsteller,
+Befoerderung), kommt aus ``basis`` bzw. dem Profil. Fehler einzelner
+Dokumente landen im Bericht, statt den Batch abzubrechen. Gueltige
+Ergebnisse koennen als Entwurfs-Dienstreisen angelegt werden
+(``create_drafts``, eine Transaktion).
+
+CLI (z.B. im Container, Key aus ``DEEPSEEK_API_KEY``)::
+
+    python batch_extract.py einladungen/*.txt --basis basis.json -o halbjahr.json
+    python batch_extract.py einladungen/*.txt --entwuerfe-fuer mmustermann
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import ai_extract
+import compaction
+import rule_extract
+from models import apply_profile_authoritative, find_placeholder, strip_citations, validate_reiseantrag
+from system_prompt import load_system_prompt
+
+logger = logging.getLogger(__name__)
+
+# Obergrenze pro Batch-Request (ein Request blockiert einen gunicorn-Thread).
+MAX_BATCH_DOCUMENTS = int(os.environ.get("DR_AUTOMATE_MAX_BATCH_EXTRACT", "25"))
+# Gleichzeitige DeepSeek-Aufrufe pro Batch.
+CONCURRENCY = int(os.environ.get("DR_AUTOMATE_BATCH_EXTRACT_CONCURRENCY", "4"))
+# Wiederholungen pro Dokument nach einem 429, Pause verdoppelt sich je 429.
+MAX_RETRIES = 4
+BACKOFF_INITIAL = 2.0
+BACKOFF_MAX = 60.0
+
+INTERNAL_ERROR = "Interner Fehler bei der AI-Extraktion"
+
+REGELN = "regeln"
+CACHE = "cache"
+DEEPSEEK = "deepseek"
+
+
+@dataclass
+class ExtractJob:
+    label: str
+    freitext: str
+    sonderwuensche: str = ""
+
+
+@dataclass
+class ExtractResult:
+    label: str
+    data: dict | None = None
+    quelle: str | None = None  # REGELN, CACHE oder DEEPSEEK
+    gueltig: bool = False
+    validierung: str | None = None
+    error: str | None = None
+    status_code: int | None = None
+    entwurf_id: int | None = None
+
+    def report(self) -> dict:
+        """Eintrag fuer die JSON-Antwort (Schluessel wie ``bericht.json`` in batch_pdf)."""
+        entry = {"label": self.label, "ok": self.error is None}
+        if self.error is not None:
+            entry["fehler"] = self.error
+            entry["status"] = self.status_code
+            return entry
+        entry.update(quelle=self.quelle, gueltig=self.gueltig, daten=self.data)
+        if self.validierung:
+            entry["validierung"] = self.validierung
+        if self.entwurf_id is not None:
+            entry["dienstreise_id"] = self.entwurf_id
+        return entry
+
+
+@dataclass(frozen=True)
+class BatchContext:
+    """Was fuer alle Dokumente eines Batches gleich ist.
+
+    ``basis`` ergaenzt fehlende Abschnitte (typisch ``antragsteller`` und
+    ``befoerderung``), ``antragsteller``/``bahncards`` sind die
+    profil-autoritativen Werte wie in ``_prepare_antrag``.
+    ``charge`` (optional) bucht einen DeepSeek-Aufruf gegen ein Rate-Limit
+    und liefert False, wenn es ausgeschoepft ist — Schnellpfad- und
+    Cache-Treffer kosten nichts.
+    """
+
+    api_key: str
+    system_prompt: str
+    basis: dict = field(default_factory=dict)
+    antragsteller: dict | None = None
+    bahncards: dict | None = None
+    heimatort: str = ""
+    charge: Callable[[], bool] | None = None
+
+
+class Throttle:
+    """Gemeinsame Drossel aller Threads eines Batches.
+
+    Eine ``BoundedSemaphore`` begrenzt die gleichzeitigen DeepSeek-Aufrufe.
+    Meldet DeepSeek 429, pausieren alle Threads (das Limit gilt pro Key,
+    nicht pro Thread); jedes weitere 429 verdoppelt die Pause bis
+    ``BACKOFF_MAX``, jeder Erfolg halbiert sie wieder. Nach einem 401 bricht
+    der Rest sofort ab — mit ungueltigem Key scheitern ohnehin alle.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = CONCURRENCY,
+        *,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._slots = threading.BoundedSemaphore(max(1, concurrency))
+        self._lock = threading.Lock()
+        self._sleep = sleep
+        self._clock = clock
+        self._delay = 0.0
+        self._resume_at = 0.0
+        self.fatal: ai_extract.AIExtractError | None = None
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        with self._slots:
+            while (wait := self._resume_at - self._clock()) > 0:
+                self._sleep(wait)
+            yield
+
+    def rate_limited(self) -> float:
+        """Nach einem 429: Pause fuer alle verlaengern. Gibt die Pause zurueck."""
+        with self._lock:
+            self._delay = min(BACKOFF_MAX, self._delay * 2 if self._delay else BACKOFF_INITIAL)
+            self._resume_at = max(self._resume_at, self._clock() + self._delay)
+            return self._delay
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self._delay = self._delay / 2 if self._delay > BACKOFF_INITIAL else 0.0
+
+
+def _call_deepseek(freitext: str, sonderwuensche: str, ctx: BatchContext, throttle: Throttle) -> dict:
+    # Ohne Key lehnt call_deepseek lokal ab, das kostet nichts.
+    if ctx.charge is not None and ctx.api_key.strip() and not ctx.charge():
+        raise ai_extract.AIExtractError("Rate-Limit erreicht, bitte spaeter erneut versuchen.", status_code=429)
+    attempt = 0
+    while True:
+        if throttle.fatal is not None:
+            raise ai_extract.AIExtractError(str(throttle.fatal), status_code=throttle.fatal.status_code)
+        with throttle.slot():
+            try:
+                result = ai_extract.call_deepseek(
+                    freitext=freitext,
+                    api_key=ctx.api_key,
+                    system_prompt=ctx.system_prompt,
+                    sonderwuensche=sonderwuensche,
+                )
+            except ai_extract.AIExtractError as e:
+                if e.status_code == 429 and attempt < MAX_RETRIES:
+                    attempt += 1
+                    logger.info("Batch-Extraktion: 429 von DeepSeek, Pause %.0f s", throttle.rate_limited())
+                    continue
+                if e.status_code == 401:
+                    throttle.fatal = e
+                raise
+        throttle.succeeded()
+        return strip_citations(result)
+
+
+def _extract_data(job: ExtractJob, ctx: BatchContext, throttle: Throttle) -> tuple[dict, str]:
+    freitext = compaction.compact(job.freitext).text
+    # Schnellpfad wie in /extract: nur ohne Key und ohne Sonderwuensche.
+    if not ctx.api_key.strip() and not job.sonderwuensche.strip():
+        fast = rule_extract.extract(freitext, ctx.heimatort)
+        if fast.confident:
+            return fast.data, REGELN
+
+    import extract_cache
+
+    cache_key = None
+    if extract_cache.enabled() and ctx.api_key.strip():
+        cache_key = extract_cache.make_key(ctx.system_prompt, freitext, job.sonderwuensche, ai_extract.DEEPSEEK_MODEL)
+        cached = extract_cache.get(cache_key)
+        if cached is not None:
+            return cached, CACHE
+    data = _call_deepseek(freitext, job.sonderwuensche, ctx, throttle)
+    if cache_key is not None:
+        extract_cache.put(cache_key, data)
+    return data, DEEPSEEK
+
+
+def _merge_basis(data: dict, basis: dict) -> dict:
+    """Abschnittsweise: Extrahiertes gewinnt, ``basis`` fuellt Luecken."""
+    merged = dict(data)
+    for key, value in basis.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = {**value, **merged[key]}
+        else:
+            merged.setdefault(key, value)
+    return merged
+
+
+def extract_one(job: ExtractJob, ctx: BatchContext, throttle: Throttle) -> ExtractResult:
+    res = ExtractResult(label=job.label)
+    if not job.freitext.strip():
+        res.error, res.status_code = "Freitext fehlt", 400
+        return res
+    try:
+        data, res.quelle = _extract_data(job, ctx, throttle)
+    except ai_extract.AIExtractError as e:
+        res.error, res.status_code = str(e), e.status_code
+        return res
+    except Exception:
+        # Details nur ins Log — der Bericht geht an den Client.
+        logger.exception("Batch-Extraktion: Fehler bei %s", job.label)
+        res.error, res.status_code = INTERNAL_ERROR, 500
+        return res
+
+    data = _merge_basis(data, ctx.basis)
+    res.data = apply_profile_authoritative(data, antragsteller=ctx.antragsteller, bahncards=ctx.bahncards)
+    platzhalter = find_placeholder(res.data)
+    if platzhalter:
+        res.validierung = f"Profil unvollständig: Platzhalter '{platzhalter}' im Antrag."
+        return res
+    res.gueltig, result = validate_reiseantrag(res.data)
+    if not res.gueltig:
+        res.validierung = f"Validierungsfehler: {result}"
+    return res
+
+
+def extract_batch(
+    jobs: Sequence[ExtractJob],
+    ctx: BatchContext,
+    concurrency: int | None = None,
+) -> list[ExtractResult]:
+    """Extrahiert alle Dokumente, Ergebnisse in Job-Reihenfolge."""
+    n = max(1, min(concurrency or CONCURRENCY, len(jobs)))
+    throttle = Throttle(n)
+    if n == 1:
+        return [extract_one(job, ctx, throttle) for job in jobs]
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="batch-extract") as pool:
+        return list(pool.map(lambda job: extract_one(job, ctx, throttle), jobs))
+
+
+def create_drafts(session, user_id: int, results: Sequence[ExtractResult]) -> int:
+    """Legt fuer jedes gueltige Ergebnis eine Dienstreise im Status ``entwurf``
+    an — alle in einer Transaktion. Setzt ``entwurf_id``, gibt die Anzahl zurueck."""
+    from models_db import Dienstreise, DienstreiseStatus, antrag_columns
+
+    created = []
+    for res in results:
+        if not res.gueltig:
+            continue
+        reise = Dienstreise(
+            user_id=user_id,
+            **antrag_columns(res.data),
+            antrag_json=res.data,
+            status=DienstreiseStatus.entwurf,
+        )
+        session.add(reise)
+        created.append((res, reise))
+    session.flush()
+    for res, reise in created:
+        res.entwurf_id = reise.id
+    session.commit()
+    return len(created)
+
+
+def _parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Viele Ausschreibungen auf einmal in Antrag-JSON extrahieren.")
+    parser.add_argument("files", nargs="+", help="Textdateien (eine Ausschreibung/E-Mail pro Datei)")
+    parser.add_argument("--basis", help="JSON mit festen Abschnitten (antragsteller, befoerderung, …)")
+    parser.add_argument("--sonderwuensche", default="", help="Hinweise fuer alle Dokumente")
+    parser.add_argument("--entwuerfe-fuer", metavar="REMOTE_USER", help="Gueltige Ergebnisse als Entwuerfe anlegen")
+    parser.add_argument(
+        "-j", "--parallel", type=int, default=None, help=f"Gleichzeitige Aufrufe (Default: {CONCURRENCY})"
+    )
+    parser.add_argument("-o", "--output", help="Ziel-JSON (Default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = _parse_args(argv)
+
+    basis: dict = {}
+    if args.basis:
+        with open(args.basis, encoding="utf-8") as f:
+            basis = json.load(f)
+    jobs = []
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            jobs.append(ExtractJob(label=os.path.basename(path), freitext=f.read(), sonderwuensche=args.sonderwuensche))
+    ctx = BatchContext(
+        api_key=os.environ.get("DEEPSEEK_API_KEY", ""),
+        system_prompt=load_system_prompt(),
+        basis=basis,
+        heimatort=rule_extract.home_city((basis.get("antragsteller") or {}).get("adresse_privat", "")),
+    )
+    results = extract_batch(jobs, ctx, concurrency=args.parallel)
+
+    if args.entwuerfe_fuer:
+        from db import SessionLocal
+        from models_db import User
+
+        with SessionLocal() as s:
+            user = s.query(User).filter(User.remote_user == args.entwuerfe_fuer).first()
+            if user is None:
+                print(f"Unbekannter User: {args.entwuerfe_fuer}", file=sys.stderr)
+                return 2
+            n = create_drafts(s, user.id, results)
+        print(f"{n} Entwuerfe angelegt", file=sys.stderr)
+
+    report = json.dumps([res.report() for res in results], ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+    else:
+        print(report)
+    failed = [res for res in results if res.error is not None or not res.gueltig]
+    for res in failed:
+        print(f"FEHLER {res.label}: {res.error or res.validierung}", file=sys.stderr)
+    print(f"{len(results) - len(failed)}/{len(results)} gueltig", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
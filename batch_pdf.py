@@ -0,0 +1,417 @@
+"""Batch-Erzeugung vieler Antrags- und Abrechnungs-PDFs auf einmal.
+
+Zum Monatsende werden dutzende Anträge/Abrechnungen neu erzeugt — bisher
+ein Round-Trip (und ein Rate-Limit-Hit) pro Reise. Hier laufen alle Jobs
+über einen Prozess-Pool; jeder Worker parst die Vordrucke beim Start
+einmal (``pdf_templates``) und befüllt danach nur noch Klone.
+
+Das Ergebnis ist ein ZIP, das beim Erzeugen gestreamt wird: jedes fertige
+PDF wird sofort als Eintrag geschrieben, am Ende folgt ``bericht.json`` mit
+dem Status pro Eintrag. Fehler einzelner Jobs (Validierung, fehlende
+Daten) landen im Bericht, statt den ganzen Batch abzubrechen.
+
+CLI (z.B. im Container)::
+
+    python batch_pdf.py --ids 12 13 14 --art beide -o monatsende.zip
+    python batch_pdf.py --art abrechnung a.json b.json -o abrechnungen.zip
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import zipfile
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+import generator
+import generator_abrechnung
+import pdf_pool
+import pdf_templates
+from models import validate_abrechnung, validate_reiseantrag
+
+logger = logging.getLogger(__name__)
+
+ANTRAG = "antrag"
+ABRECHNUNG = "abrechnung"
+ARTEN = (ANTRAG, ABRECHNUNG)
+
+# Obergrenze pro Batch-Request (schuetzt den einen gunicorn-Worker).
+MAX_BATCH_ITEMS = int(os.environ.get("DR_AUTOMATE_MAX_BATCH_ITEMS", "100"))
+# 0 = os.cpu_count(). 1 = ohne Pool im aufrufenden Prozess rendern.
+BATCH_WORKERS = int(os.environ.get("DR_AUTOMATE_BATCH_WORKERS", "0"))
+# Kleinere Batches rendern im eigenen Prozess — ein Prozessstart lohnt dort nicht.
+MIN_POOL_JOBS = 4
+
+DEFAULT_TEMPLATES = {
+    ANTRAG: os.environ.get("PDF_TEMPLATE_PATH", os.path.join("forms", "DR-Antrag_035_001Stand4-2025pdf.pdf")),
+    ABRECHNUNG: os.environ.get("PDF_TEMPLATE_ABRECHNUNG_PATH", os.path.join("forms", "Reisekostenvordruck.pdf")),
+}
+
+REPORT_NAME = "bericht.json"
+INTERNAL_ERROR = "Interner Fehler bei der PDF-Generierung."
+
+_executor: tuple[tuple, ProcessPoolExecutor] | None = None  # (Groesse + Vordrucke, Pool)
+_executor_lock = threading.Lock()
+
+
+@dataclass
+class BatchJob:
+    """Ein zu erzeugendes PDF. ``error`` ist gesetzt, wenn der Job schon bei
+    der Vorbereitung gescheitert ist (z.B. Reise nicht gefunden)."""
+
+    label: str
+    art: str
+    data: dict | None = None
+    error: str | None = None
+
+
+@dataclass
+class BatchResult:
+    label: str
+    art: str
+    filename: str | None = None
+    pdf: bytes | None = None
+    error: str | None = None
+
+
+def render_job(art: str, data: dict, templates: dict[str, str]) -> tuple[str, bytes]:
+    """Validiert und rendert einen einzelnen Job → (Dateiname, PDF-Bytes).
+
+    Läuft im Worker-Prozess, daher nur picklebare Argumente.
+
+    Raises:
+        ValueError: Bei unbekannter Art oder ungültigen Daten
+    """
+    if art == ANTRAG:
+        is_valid, result = validate_reiseantrag(data)
+        if not is_valid:
+            raise ValueError(f"Validierungsfehler: {result}")
+        return generator.render_pdf(result.model_dump(), templates[ANTRAG])
+    if art == ABRECHNUNG:
+        is_valid, result = validate_abrechnung(data)
+        if not is_valid:
+            raise ValueError(f"Validierungsfehler: {result}")
+        return generator_abrechnung.render_pdf(result, templates[ABRECHNUNG])
+    raise ValueError(f"Unbekannte Art '{art}' (erlaubt: {', '.join(ARTEN)})")
+
+
+def _render_safe(job: BatchJob, templates: dict[str, str]) -> BatchResult:
+    res = BatchResult(label=job.label, art=job.art)
+    if job.error is not None:
+        res.error = job.error
+        return res
+    try:
+        res.filename, res.pdf = render_job(job.art, job.data or {}, templates)
+    except ValueError as e:
+        res.error = str(e)
+    except Exception:
+        # Details nur ins Log — der Bericht geht an den Client.
+        logger.exception("Batch: Fehler bei %s (%s)", job.label, job.art)
+        res.error = INTERNAL_ERROR
+    return res
+
+
+def _worker_count(n_jobs: int, workers: int | None) -> int:
+    if workers is None:
+        workers = BATCH_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, n_jobs))
+
+
+def render_batch(
+    jobs: Sequence[BatchJob],
+    templates: dict[str, str] | None = None,
+    workers: int | None = None,
+) -> Iterator[BatchResult]:
+    """Rendert alle Jobs und liefert die Ergebnisse in Job-Reihenfolge.
+
+    Ein Generator: Ergebnisse stehen zur Verfügung, sobald der jeweilige Job
+    fertig ist — der Aufrufer kann sie direkt weiterstreamen. Unter
+    ``MIN_POOL_JOBS`` Jobs oder mit ``workers=1`` wird ohne Pool im eigenen
+    Prozess gerendert (die Templates sind dort meist schon warm). Ist der
+    Render-Pool der App aktiv (``pdf_pool``) und ``workers`` nicht gesetzt,
+    laufen die Jobs dort — aber nie mehr als ``POOL_WORKERS - 1`` zugleich,
+    damit interaktive ``/generate``-Aufrufe nicht hinter dem Batch warten.
+    Hat der Pool nur einen Worker, bleibt der fuer ``/generate`` frei und der
+    Batch rendert im eigenen Prozess. Sonst rendert ein Batch-Pool, der ueber
+    Batches hinweg weiterlebt.
+    """
+    templates = templates or DEFAULT_TEMPLATES
+    pending = [job for job in jobs if job.error is None]
+
+    if workers is None and pdf_pool.enabled():
+        if pdf_pool.POOL_WORKERS < 2 or len(pending) < 2:
+            for job in jobs:
+                yield _render_safe(job, templates)
+            return
+        # Laufender Render-Pool der App: Worker sind schon warm, kein Prozessstart.
+        window = pdf_pool.POOL_WORKERS - 1
+        pool = pdf_pool.get_pool()
+        yield from _collect(jobs, pool, templates, window, on_broken=lambda: pdf_pool.discard(pool))
+        return
+
+    n = _worker_count(MAX_BATCH_ITEMS, workers)
+    if n == 1 or len(pending) < MIN_POOL_JOBS:
+        for job in jobs:
+            yield _render_safe(job, templates)
+        return
+
+    pool = _batch_pool(n, templates)
+    yield from _collect(jobs, pool, templates, n, on_broken=lambda: _discard_batch_pool(pool))
+
+
+def _batch_pool(n: int, templates: dict[str, str]) -> ProcessPoolExecutor:
+    """Ein Batch-Pool pro Prozess; neu nur bei anderer Groesse oder anderen
+    Vordrucken. Prozesse startet der Executor erst bei Bedarf."""
+    global _executor
+    key = (n, tuple(sorted(templates.items())))
+    with _executor_lock:
+        if _executor is not None and _executor[0] == key:
+            return _executor[1]
+        if _executor is not None:
+            _executor[1].shutdown(wait=False)
+        # forkserver statt fork: der aufrufende gunicorn-Prozess hat Threads,
+        # ein fork() mitten in fremden Locks kann Worker haengen lassen.
+        # Der Forkserver importiert pypdf/pydantic & Co. einmal vor, die Worker
+        # starten dann per fork aus diesem (thread-freien) Prozess.
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        pool = ProcessPoolExecutor(
+            max_workers=n, mp_context=ctx, initializer=pdf_templates.warm, initargs=(tuple(templates.values()),)
+        )
+        _executor = (key, pool)
+        return pool
+
+
+def _discard_batch_pool(pool: ProcessPoolExecutor) -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor[1] is pool:
+            _executor = None
+    pdf_pool.terminate(pool)
+
+
+def shutdown() -> None:
+    """Beendet den Batch-Pool (Tests, Prozessende)."""
+    global _executor
+    with _executor_lock:
+        entry, _executor = _executor, None
+    if entry is not None:
+        entry[1].shutdown(wait=True)
+
+
+def _collect(
+    jobs: Sequence[BatchJob],
+    pool: ProcessPoolExecutor,
+    templates: dict[str, str],
+    window: int,
+    on_broken: Callable[[], None] | None = None,
+) -> Iterator[BatchResult]:
+    """Reicht Jobs an ``pool`` weiter, hoechstens ``window`` gleichzeitig, und
+    liefert die Ergebnisse in Job-Reihenfolge.
+
+    Stirbt ein Worker oder haengt ein Job laenger als ``POOL_TIMEOUT``, wird
+    ``on_broken`` einmal aufgerufen (Pool verwerfen) und alle noch offenen
+    Jobs rendern im eigenen Prozess — wie ``pdf_pool.run`` fuer
+    ``/generate``. Der Batch liefert trotzdem ein Ergebnis pro Job, statt
+    den ZIP-Stream abzubrechen oder den gunicorn-Thread zu blockieren.
+    """
+    queue: deque[tuple[BatchJob, Future | None]] = deque()
+    remaining = iter(jobs)
+    in_flight = 0
+    broken = False
+
+    def pool_broke() -> None:
+        nonlocal broken
+        if not broken:
+            broken = True
+            if on_broken is not None:
+                on_broken()
+
+    while True:
+        while (broken or in_flight < window) and (job := next(remaining, None)) is not None:
+            future = None
+            if job.error is None and not broken:
+                try:
+                    future = pool.submit(_render_safe, job, templates)
+                except (BrokenProcessPool, RuntimeError):
+                    # RuntimeError: Pool ist nach einem Absturz schon heruntergefahren.
+                    logger.exception("Batch: Render-Pool defekt, rendere lokal weiter")
+                    pool_broke()
+            in_flight += future is not None
+            queue.append((job, future))
+        if not queue:
+            return
+        job, future = queue.popleft()
+        if future is None:
+            yield _render_safe(job, templates)
+            continue
+        in_flight -= 1
+        try:
+            result = future.result(timeout=pdf_pool.POOL_TIMEOUT)
+        except BrokenProcessPool:
+            logger.exception("Batch: Worker-Prozess abgestuerzt bei %s, rendere lokal", job.label)
+            pool_broke()
+            result = _render_safe(job, templates)
+        except TimeoutError:
+            logger.error("Batch: Worker haengt bei %s (> %ss), rendere lokal", job.label, pdf_pool.POOL_TIMEOUT)
+            future.cancel()
+            pool_broke()
+            result = _render_safe(job, templates)
+        yield result
+
+
+class _ChunkWriter:
+    """Minimaler, nicht-seekbarer Ziel-Stream fuer ``zipfile`` — sammelt die
+    geschriebenen Bytes, bis der Streaming-Generator sie abholt."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(results: Iterable[BatchResult]) -> Iterator[bytes]:
+    """Schreibt die Ergebnisse als ZIP und liefert es stückweise aus.
+
+    Eintragsnamen bekommen eine laufende Nummer, damit gleichnamige PDFs
+    (gleiches Datum/Ziel) sich nicht ueberschreiben. ``bericht.json`` listet
+    jeden Job mit Datei oder Fehlermeldung.
+    """
+    out = _ChunkWriter()
+    report = []
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for idx, res in enumerate(results, start=1):
+            entry = {"label": res.label, "art": res.art, "ok": res.error is None}
+            if res.error is None:
+                name = f"{idx:03d}_{res.filename}"
+                zf.writestr(name, res.pdf)
+                entry["datei"] = name
+            else:
+                entry["fehler"] = res.error
+            report.append(entry)
+            chunk = out.drain()
+            if chunk:
+                yield chunk
+        zf.writestr(REPORT_NAME, json.dumps(report, ensure_ascii=False, indent=2))
+    yield out.drain()
+
+
+def jobs_for_dienstreisen(session, wanted: Sequence[tuple[int, str]], user_id: int | None = None) -> list[BatchJob]:
+    """Baut Jobs aus gespeicherten Reisen (``antrag_json``/``abrechnung_json``).
+
+    ``wanted`` ist eine Liste aus (Reise-ID, Art). Mit ``user_id`` werden nur
+    eigene Reisen geladen (IDOR-Schutz im Web); fremde oder unbekannte IDs
+    werden zu Fehler-Jobs, nicht zu einem Abbruch.
+    """
+    from sqlalchemy.orm import selectinload, undefer
+
+    from models_db import Abrechnung, Dienstreise
+
+    ids = {reise_id for reise_id, _ in wanted}
+    # Die JSON-Spalten sind deferred — hier werden sie gebraucht, also in
+    # einem Rutsch laden statt einer Nachlade-Query pro Reise.
+    query = (
+        session.query(Dienstreise)
+        .options(
+            undefer(Dienstreise.antrag_json),
+            selectinload(Dienstreise.abrechnung).undefer(Abrechnung.abrechnung_json),
+        )
+        .filter(Dienstreise.id.in_(ids))
+    )
+    if user_id is not None:
+        query = query.filter(Dienstreise.user_id == user_id)
+    reisen = {r.id: r for r in query}
+
+    jobs = []
+    for reise_id, art in wanted:
+        job = BatchJob(label=f"reise-{reise_id}", art=art)
+        reise = reisen.get(reise_id)
+        if art not in ARTEN:
+            job.error = f"Unbekannte Art '{art}' (erlaubt: {', '.join(ARTEN)})"
+        elif reise is None:
+            job.error = "Dienstreise nicht gefunden."
+        elif art == ANTRAG:
+            job.data = reise.antrag_json
+            if not job.data:
+                job.error = "Kein Antrag gespeichert."
+        else:
+            job.data = reise.abrechnung.abrechnung_json if reise.abrechnung else None
+            if not job.data:
+                job.error = "Keine Abrechnung gespeichert."
+        jobs.append(job)
+    return jobs
+
+
+def _parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Viele Antrags-/Abrechnungs-PDFs auf einmal als ZIP erzeugen.")
+    parser.add_argument("files", nargs="*", help="JSON-Dateien (Antrag oder Abrechnung, siehe --art)")
+    parser.add_argument("--ids", nargs="+", type=int, default=[], help="IDs gespeicherter Dienstreisen")
+    parser.add_argument("--art", choices=[*ARTEN, "beide"], default=ANTRAG, help="Welches PDF (Default: antrag)")
+    parser.add_argument("-o", "--output", required=True, help="Ziel-ZIP")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker-Prozesse (Default: CPU-Anzahl)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = _parse_args(argv)
+    arten = ARTEN if args.art == "beide" else (args.art,)
+
+    jobs: list[BatchJob] = []
+    if args.ids:
+        from db import SessionLocal
+
+        with SessionLocal() as s:
+            jobs += jobs_for_dienstreisen(s, [(reise_id, art) for reise_id in args.ids for art in arten])
+    for path in args.files:
+        for art in arten:
+            job = BatchJob(label=os.path.basename(path), art=art)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    job.data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                job.error = f"Datei nicht lesbar: {e}"
+            jobs.append(job)
+    if not jobs:
+        print("Nichts zu tun: --ids oder JSON-Dateien angeben.", file=sys.stderr)
+        return 2
+
+    errors: list[BatchResult] = []
+    with open(args.output, "wb") as f:
+        for chunk in iter_zip(_collect_errors(render_batch(jobs, workers=args.workers), errors)):
+            f.write(chunk)
+    print(f"{len(jobs) - len(errors)}/{len(jobs)} PDFs erzeugt → {args.output}")
+    return 1 if errors else 0
+
+
+def _collect_errors(results: Iterable[BatchResult], errors: list[BatchResult]) -> Iterator[BatchResult]:
+    for res in results:
+        if res.error is not None:
+            errors.append(res)
+            print(f"FEHLER {res.label} ({res.art}): {res.error}", file=sys.stderr)
+        yield res
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Vorverarbeitung des Freitexts vor der KI-Extraktion.
+
+Eingefuegte E-Mails bringen viel Ballast mit, der als Prompt-Tokens bezahlt
+und abgewartet wird: zitierte Antwortketten, Signaturen, Disclaimer,
+HTML-Reste, doppelte Leerzeichen. ``compact`` entfernt das deterministisch
+(gleiche Eingabe → gleiche Ausgabe, also auch gleicher Schluessel im
+Extract-Cache) und bewusst vorsichtig — im Zweifel bleibt Text stehen:
+
+- HTML: ``<style>``/``<script>`` samt Inhalt weg, Block-Tags werden zu
+  Zeilenumbruechen, restliche Tags weg, Entities aufgeloest.
+- Zitate: ``>``-Praefixe werden entfernt, der Inhalt bleibt. Ab einem
+  Antwort-Kopf ("Am … schrieb …:", "Von: …", "Ursprüngliche Nachricht")
+  fallen Zeilen ab ``MIN_DUPLICATE_LINE`` Zeichen weg, die schon in einem
+  frueheren Abschnitt standen — in Antwortketten steht dieselbe Einladung
+  sonst mehrfach im Prompt. Wiederholungen innerhalb eines Abschnitts
+  (z.B. gleiche Uhrzeiten an mehreren Tagen) bleiben.
+- Signaturen: ab dem Trenner ``-- `` (genau so, mit Leerzeichen) bis zum
+  Ende der Nachricht, also bis zum naechsten Antwort-Kopf oder Textende —
+  aber nur, wenn danach hoechstens ``SIGNATURE_MAX_LINES`` Zeilen folgen.
+  Ein ``--`` als Trenner mitten in einer Einladung bleibt stehen.
+- Mobil-Footer ("Gesendet von meinem iPhone"): nur die Zeile selbst.
+- Disclaimer: ab der Zeile, in der er beginnt, bis zum Absatzende
+  (hoechstens ``MAX_DISCLAIMER_CHARS`` Zeichen, sonst nur die Zeile).
+  Was im selben Absatz davor steht, bleibt.
+- Marker wie "-----Ursprüngliche Nachricht-----".
+- Whitespace: unsichtbare Zeichen, Mehrfach-Leerzeichen, mehr als eine
+  Leerzeile.
+
+Weitergeleitete Inhalte und Mail-Header (Betreff!) bleiben erhalten.
+"""
+
+from __future__ import annotations
+
+import html
+import re
+from dataclasses import dataclass
+
+MIN_DUPLICATE_LINE = 30
+SIGNATURE_MAX_LINES = 10
+MAX_DISCLAIMER_CHARS = 1200
+
+_HTML_TAGS = r"(?:a|b|i|u|p|br|hr|div|span|font|strong|em|small|center|table|tbody|thead|tr|td|th|ul|ol|li|h[1-6]|img|html|head|body|meta|o:p)"
+_HTML_TAG_RE = re.compile(rf"</?{_HTML_TAGS}(?:\s[^<>]*)?/?>", re.IGNORECASE)
+# Nur wenn das wirklich nach HTML aussieht ("a<b und c>d" bleibt stehen).
+_HTML_EVIDENCE_RE = re.compile(rf"</{_HTML_TAGS}\s*>|<br\s*/?>", re.IGNORECASE)
+_HTML_DROP_RE = re.compile(r"<(style|script)\b[^>]*>.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_HTML_BLOCK_RE = re.compile(r"<(?:br|/p|/div|/tr|/li|/h[1-6]|/table)\b[^<>]*>", re.IGNORECASE)
+_HTML_ENTITY_RE = re.compile(r"&(?:[a-zA-Z]+|#\d+|#x[0-9a-fA-F]+);")
+_INVISIBLE = {0x200B: None, 0x200C: None, 0x200D: None, 0xFEFF: None, 0xA0: " ", 0x09: " "}
+_SPACES_RE = re.compile(r" {2,}")
+_QUOTE_RE = re.compile(r"^(?:\s*>)+ ?")
+_MARKER_RE = re.compile(
+    r"^-*\s*(?:urspr(?:ü|ue)ngliche nachricht|original message|weitergeleitete nachricht|forwarded message)\s*-*$",
+    re.IGNORECASE,
+)
+# Beginn eines zitierten/weitergeleiteten Abschnitts (Antwortkette).
+_REPLY_HEADER_RE = re.compile(
+    r"^(?:(?:am|on)\b.{0,200}\b(?:schrieb|wrote)\b.{0,120}:|(?:von|from):\s.*)$", re.IGNORECASE
+)
+_FOOTER_RE = re.compile(r"gesendet (?:von|mit) (?:meinem|der)\b|\bsent from my\b", re.IGNORECASE)
+_DISCLAIMER_RE = re.compile(
+    "|".join(
+        (
+            r"diese (?:e-?mail|nachricht)[^.]{0,80}vertrauliche",
+            r"wenn sie nicht der (?:richtige|beabsichtigte) (?:adressat|empf(?:ä|ae)nger)",
+            r"this (?:e-?mail|message)[^.]{0,80}(?:confidential|privileged)",
+            r"bitte (?:denken sie an die umwelt|pr(?:ü|ue)fen sie, ob sie diese)",
+            r"please consider the environment",
+        )
+    ),
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Compacted:
+    text: str
+    removed_chars: int
+
+    @property
+    def removed_tokens_estimate(self) -> int:
+        # Gleiche Faustregel wie beim System-Prompt (~4 Zeichen pro Token).
+        return self.removed_chars // 4
+
+
+def _strip_html(text: str) -> str:
+    if _HTML_EVIDENCE_RE.search(text):
+        text = _HTML_DROP_RE.sub("", text)
+        text = _HTML_BLOCK_RE.sub("\n", text)
+        text = _HTML_TAG_RE.sub("", text)
+    if _HTML_ENTITY_RE.search(text):
+        text = html.unescape(text).translate(_INVISIBLE)
+    return text
+
+
+def _signature_lines(lines: list[str]) -> set[int]:
+    """Indizes der Zeilen, die zu einer Signatur am Ende einer Nachricht gehoeren."""
+    drop: set[int] = set()
+    for i, line in enumerate(lines):
+        if line != "-- ":
+            continue
+        end = next((j for j in range(i + 1, len(lines)) if _starts_section(lines[j])), len(lines))
+        if sum(1 for rest in lines[i + 1 : end] if rest.strip()) <= SIGNATURE_MAX_LINES:
+            drop.update(range(i, end))
+    return drop
+
+
+def _starts_section(line: str) -> bool:
+    line = _SPACES_RE.sub(" ", line).strip()
+    return bool(_MARKER_RE.match(line) or _REPLY_HEADER_RE.match(line))
+
+
+def _clean_lines(text: str) -> list[str]:
+    raw_lines = [_QUOTE_RE.sub("", raw) for raw in text.split("\n")]
+    signature = _signature_lines(raw_lines)
+    lines: list[str] = []
+    earlier: set[str] = set()  # lange Zeilen aus den vorherigen Abschnitten
+    section: set[str] = set()
+    for i, line in enumerate(raw_lines):
+        if i in signature:
+            continue
+        line = _SPACES_RE.sub(" ", line).strip()
+        if _MARKER_RE.match(line):
+            earlier |= section
+            section = set()
+            continue
+        if _REPLY_HEADER_RE.match(line):
+            earlier |= section
+            section = set()
+        if len(line) >= MIN_DUPLICATE_LINE:
+            if line in earlier:
+                continue
+            section.add(line)
+        lines.append(line)
+    return lines
+
+
+def _strip_boilerplate(paragraph: str) -> str:
+    kept: list[str] = []
+    lines = paragraph.split("\n")
+    for i, line in enumerate(lines):
+        if _FOOTER_RE.search(line):
+            continue
+        if _DISCLAIMER_RE.search(line):
+            if len("\n".join(lines[i:])) <= MAX_DISCLAIMER_CHARS:
+                break
+            continue
+        kept.append(line)
+    return "\n".join(kept).strip()
+
+
+def compact(text: str) -> Compacted:
+    """Freitext ohne Mail-/HTML-Ballast. Bleibt nichts uebrig, kommt das Original zurueck."""
+    original = text
+    text = text.replace("\r\n", "\n").replace("\r", "\n").translate(_INVISIBLE)
+    text = _strip_html(text)
+    paragraphs = re.split(r"\n{2,}", "\n".join(_clean_lines(text)))
+    kept = [p for p in map(_strip_boilerplate, paragraphs) if p]
+    result = "\n\n".join(kept)
+    if not result:
+        return Compacted(original, 0)
+    return Compacted(result, max(0, len(original) - len(result)))
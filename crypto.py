@@ -12,14 +12,27 @@ Konsequenzen der Wahl:
 - Key-Verlust = Datenverlust. Key gehoert in Authelias Ansible-Vault als
   ``vault_dr_automate_encryption_key``.
 - Key-Rotation: ``MultiFernet`` akzeptiert mehrere Keys; alter Key bleibt
-  fuer Read, neuer Key fuer Write.
+  fuer Read, neuer Key fuer Write. Bestandsdaten schreibt ``rotate_keys.py``
+  neu, danach kann der alte Key weg.
+- Fuer Cache-Lookups auf sensiblen Werten (z.B. Wohnadresse) gibt es
+  ``lookup_hash``: HMAC mit einem vom Encryption-Key abgeleiteten Schluessel.
+  Deterministisch (indexierbar), aber ohne Key nicht per Woerterbuch
+  rueckrechenbar.
+- Grosse JSON-Spalten (Reise-JSONs) sind in ``models_db.py`` ``deferred``:
+  Listen laden und entschluesseln sie gar nicht, erst der Attributzugriff.
+  Dazu gibt es einen optionalen Entschluesselungs-Cache pro Request
+  (``begin_decrypt_cache``), Schluessel ist ein Hash des Tokens.
 """
 
 from __future__ import annotations
 
+import hashlib
+import hmac
 import json
 import logging
 import os
+from collections import OrderedDict
+from contextvars import ContextVar
 
 from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from sqlalchemy import String
@@ -27,6 +40,9 @@ from sqlalchemy.types import TypeDecorator
 
 logger = logging.getLogger(__name__)
 
+# Max. Eintraege im Entschluesselungs-Cache pro Request (0 = aus).
+DECRYPT_CACHE_SIZE = int(os.environ.get("DR_AUTOMATE_DECRYPT_CACHE_SIZE", "32"))
+
 
 def _load_fernet() -> MultiFernet:
     primary = os.environ.get("DR_AUTOMATE_ENCRYPTION_KEY", "").strip()
@@ -62,6 +78,64 @@ def get_fernet() -> MultiFernet:
     return _fernet
 
 
+_lookup_key: bytes | None = None
+
+
+def lookup_hash(value: str) -> str:
+    """Deterministischer HMAC-SHA256 (hex) ueber ``value`` fuer Lookup-Spalten.
+
+    Ohne gesetzten Key (Debug) wird ein ephemerer Schluessel verwendet —
+    Lookups treffen dann nach einem Restart nicht mehr, mehr passiert nicht.
+    Nach einer Key-Rotation gilt dasselbe; fuer Caches ist das gewollt.
+    """
+    global _lookup_key
+    if _lookup_key is None:
+        primary = os.environ.get("DR_AUTOMATE_ENCRYPTION_KEY", "").strip().encode() or os.urandom(32)
+        _lookup_key = hashlib.sha256(b"dr-automate-lookup:" + primary).digest()
+    return hmac.new(_lookup_key, value.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+class _DecryptCache(OrderedDict):
+    """LRU: Token-Hash → entschluesseltes JSON."""
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+
+_decrypt_cache: ContextVar[_DecryptCache | None] = ContextVar("decrypt_cache", default=None)
+
+
+def begin_decrypt_cache(maxsize: int = DECRYPT_CACHE_SIZE) -> None:
+    """Aktiviert den Entschluesselungs-Cache fuer den laufenden Kontext (Request).
+
+    Bis ``end_decrypt_cache`` liefert ``EncryptedJSON`` fuer denselben Token
+    dasselbe Objekt, ohne erneut Fernet + ``json.loads`` zu bezahlen — wie die
+    Identity-Map einer Session, nur ueber Sessions hinweg. Werte deshalb nicht
+    in-place aendern, sondern neu zuweisen (das tut der Code ohnehin, sonst
+    erkennt SQLAlchemy die Aenderung nicht).
+    """
+    _decrypt_cache.set(_DecryptCache(maxsize) if maxsize > 0 else None)
+
+
+def end_decrypt_cache() -> None:
+    _decrypt_cache.set(None)
+
+
+def _decrypt_json(token: str):
+    cache = _decrypt_cache.get()
+    if cache is None:
+        return json.loads(decrypt(token))
+    key = hashlib.blake2b(token.encode("ascii"), digest_size=16).digest()
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    value = cache[key] = json.loads(decrypt(token))
+    if len(cache) > cache.maxsize:
+        cache.popitem(last=False)
+    return value
+
+
 def encrypt(plaintext: str) -> str:
     return get_fernet().encrypt(plaintext.encode("utf-8")).decode("ascii")
 
@@ -108,7 +182,7 @@ class EncryptedJSON(TypeDecorator):
         if value is None or value == "":
             return value
         try:
-            return json.loads(decrypt(value))
+            return _decrypt_json(value)
         except InvalidToken:
             logger.error("EncryptedJSON: Token konnte nicht entschluesselt werden (falscher Key?)")
             raise
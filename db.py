@@ -3,13 +3,22 @@ SQLAlchemy-Engine + Session-Factory fuer dr-automate.
 
 Schema-Definition siehe ``models_db.py``. Migrationen via Alembic
 (``alembic upgrade head`` beim Container-Start).
+
+Dazu ``write_behind``: Hintergrund-Thread fuer Writes, auf die kein
+Request warten muss (``last_login_at``, Geo-Cache-Treffer). Siehe
+``WriteBehind``.
 """
 
 from __future__ import annotations
 
+import atexit
 import logging
 import os
-from collections.abc import Iterator
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future
 from contextlib import contextmanager
 from pathlib import Path
 
@@ -22,6 +31,8 @@ logger = logging.getLogger(__name__)
 DATA_DIR = Path(os.environ.get("DR_AUTOMATE_DATA_DIR", "data"))
 DEFAULT_DB_PATH = DATA_DIR / "dr-automate.db"
 DATABASE_URL = os.environ.get("DR_AUTOMATE_DATABASE_URL") or f"sqlite:///{DEFAULT_DB_PATH}"
+# Max. wartende Write-Behind-Jobs (0 = aus, Writes laufen synchron im Request).
+WRITE_BEHIND_QUEUE = int(os.environ.get("DR_AUTOMATE_WRITE_BEHIND_QUEUE", "1000"))
 
 
 class Base(DeclarativeBase):
@@ -128,3 +139,148 @@ def session_scope() -> Iterator[Session]:
 def get_session() -> Session:
     """Pro-Request-Session. Vom Caller schliessen (oder Flask teardown nutzen)."""
     return SessionLocal()
+
+
+class WriteBehind:
+    """Hintergrund-Writer fuer unkritische Writes.
+
+    ``submit(job)`` stellt ``job(session)`` in eine Queue und kehrt sofort
+    zurueck. Ein Thread pro Prozess nimmt bis zu ``batch_size`` Jobs auf
+    einmal und committet sie in *einer* Transaktion — statt N Requests, die
+    nacheinander auf den SQLite-Writer-Lock warten. Schlaegt der Batch
+    fehl, laufen die Jobs einzeln nach, damit ein kaputter Job die anderen
+    nicht mitreisst.
+
+    Back-Pressure: ist die Queue voll, wartet ``submit`` bis zu
+    ``put_timeout`` Sekunden und schreibt dann selbst synchron, statt
+    Writes zu verwerfen. Beim regulaeren Beenden (``atexit``) wird die
+    Queue abgearbeitet; bei Absturz, SIGKILL oder Worker-Timeout gehen
+    die noch wartenden Jobs verloren. Deshalb nur fuer Writes, deren
+    Verlust verschmerzbar ist — was der Nutzer bestaetigt bekommt, wird
+    synchron geschrieben.
+    """
+
+    def __init__(self, maxsize: int, batch_size: int = 100, linger: float = 0.02, put_timeout: float = 2.0):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.linger = linger
+        self.put_timeout = put_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, job: Callable[[Session], object]) -> Future:
+        future: Future = Future()
+        if self.maxsize <= 0:
+            self._run_batch([(job, future)])
+            return future
+        self._ensure_thread()
+        try:
+            self._queue.put((job, future), timeout=self.put_timeout)
+        except queue.Full:
+            logger.warning("Write-Behind-Queue voll — schreibe synchron")
+            self._run_batch([(job, future)])
+        return future
+
+    def flush(self) -> None:
+        """Blockiert, bis alle bisher eingereihten Jobs geschrieben sind."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        """Arbeitet die Queue ab und beendet den Thread (``atexit``).
+
+        Haengt der Thread oder ist er tot und die Queue voll, blockiert das
+        nicht: nach ``put_timeout`` bzw. ``timeout`` Sekunden werden die noch
+        wartenden Jobs verworfen, geloggt und ihre Futures mit Fehler beendet.
+        """
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        self._thread = None
+        try:
+            self._queue.put(None, timeout=self.put_timeout)
+        except queue.Full:
+            pass
+        else:
+            thread.join(timeout=timeout)
+            if not thread.is_alive() and self._queue.empty():
+                return
+        dropped = 0
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            if item is not None:
+                dropped += 1
+                item[1].set_exception(RuntimeError("Write-Behind beendet, Job nicht geschrieben"))
+        if dropped:
+            logger.error("Write-Behind: %d wartende Jobs beim Beenden verworfen", dropped)
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            # Nach fork() gehoert der Thread dem Elternprozess — neu starten.
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue(self.maxsize)
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._worker, name="db-write-behind", daemon=True)
+                self._thread.start()
+
+    def _worker(self) -> None:
+        q = self._queue
+        while True:
+            item = q.get()
+            if item is None:
+                q.task_done()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.linger
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    nxt = q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    q.task_done()
+                    break
+                batch.append(nxt)
+            try:
+                self._run_batch(batch)
+            finally:
+                for _ in batch:
+                    q.task_done()
+            if stop:
+                return
+
+    @staticmethod
+    def _run_batch(batch: list[tuple[Callable[[Session], object], Future]]) -> None:
+        if len(batch) > 1:
+            try:
+                with SessionLocal() as s:
+                    results = [job(s) for job, _ in batch]
+                    s.commit()
+            except Exception:
+                logger.warning("Write-Behind: Batch mit %d Jobs fehlgeschlagen, einzeln nachholen", len(batch))
+            else:
+                for (_, future), result in zip(batch, results, strict=True):
+                    future.set_result(result)
+                return
+        for job, future in batch:
+            try:
+                with SessionLocal() as s:
+                    result = job(s)
+                    s.commit()
+            except Exception as e:
+                logger.exception("Write-Behind: Job fehlgeschlagen")
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+
+write_behind = WriteBehind(WRITE_BEHIND_QUEUE)
+atexit.register(write_behind.shutdown)
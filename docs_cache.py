@@ -0,0 +1,193 @@
+"""Render-Cache fuer die oeffentliche Doku unter ``/docs/<slug>``.
+
+``/docs`` ist die meistgecrawlte Route. Ohne Cache kostet jeder Aufruf
+Datei lesen, ``markdown.markdown`` mit vier Extensions, ``bleach.clean`` und
+einen Glob ueber ``DOCS_DIR``. Hier wird alles lazy gebaut und an die
+Dateiversion (``st_mtime_ns``, Groesse) gehaengt — ein geaendertes
+``docs/*.md`` ist beim naechsten Aufruf sichtbar, ohne Neustart:
+
+- ``render(path)``: sanitisiertes HTML einer Seite,
+- ``page_index(docs_dir)``: Liste der Slugs (Version = mtime des Verzeichnisses),
+- ``page(slug, version, build)``: fertig gerenderte Gast-Seite, vorkomprimiert
+  (gzip, brotli falls das Paket installiert ist) mit starkem ETag;
+  ``response`` waehlt per ``Accept-Encoding`` und beantwortet
+  ``If-None-Match`` mit 304.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import threading
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from pathlib import Path
+
+import bleach
+import markdown as md
+from flask import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional: ohne Paket nur gzip
+    brotli = None
+
+_ALLOWED_TAGS = frozenset(
+    {
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "p",
+        "br",
+        "hr",
+        "strong",
+        "em",
+        "code",
+        "pre",
+        "blockquote",
+        "ul",
+        "ol",
+        "li",
+        "a",
+        "table",
+        "thead",
+        "tbody",
+        "tr",
+        "th",
+        "td",
+        "div",
+        "span",
+    }
+)
+_ALLOWED_ATTRIBUTES = {
+    "a": ["href", "title", "rel", "target"],
+    "code": ["class"],  # fuer fenced_code language classes
+    "th": ["align"],
+    "td": ["align"],
+    "h1": ["id"],
+    "h2": ["id"],
+    "h3": ["id"],
+    "h4": ["id"],
+    "h5": ["id"],
+    "h6": ["id"],
+}
+_ALLOWED_PROTOCOLS = frozenset({"http", "https", "mailto"})
+# Kleinere Antworten lohnen die Kompression nicht.
+MIN_COMPRESS_BYTES = 512
+
+_lock = threading.Lock()
+_bodies: dict[Path, tuple[tuple[int, int], str]] = {}
+_indexes: dict[Path, tuple[int, list[str]]] = {}
+
+
+@dataclass(frozen=True, slots=True)
+class CompressedPage:
+    etag: str
+    identity: bytes
+    gzip: bytes | None
+    br: bytes | None
+
+
+_pages: dict[str, tuple[Hashable, CompressedPage]] = {}  # slug → (Quellversionen, Seite)
+
+
+def render_markdown(text: str) -> str:
+    # Markdown -> HTML mit Standard-Extensions (Tabellen, Fenced Code).
+    raw_html = md.markdown(text, extensions=["fenced_code", "tables", "toc", "sane_lists"])
+    # Defense-in-depth: Markdown-Quelle ist zwar Repo-Code (vertraut), aber wir
+    # sanitisieren trotzdem mit einer Allowlist, damit ein versehentlich
+    # eingeschmuggelter <script>-Tag in einer docs/*.md nicht direkt zu
+    # Stored-XSS wird. Ohne Bleach waere /docs/<slug> ein offener
+    # Vertrauensanker auf einer public-Route.
+    return bleach.clean(
+        raw_html,
+        tags=_ALLOWED_TAGS,
+        attributes=_ALLOWED_ATTRIBUTES,
+        protocols=_ALLOWED_PROTOCOLS,
+        strip=True,
+    )
+
+
+def render(path: Path) -> tuple[tuple[int, int], str] | None:
+    """(Dateiversion, sanitisiertes HTML) oder None, wenn die Datei fehlt."""
+    try:
+        st = path.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    version = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        cached = _bodies.get(path)
+    if cached is not None and cached[0] == version:
+        return cached
+    entry = (version, render_markdown(path.read_text(encoding="utf-8")))
+    with _lock:
+        _bodies[path] = entry
+    return entry
+
+
+def page_index(docs_dir: Path) -> tuple[int, list[str]]:
+    """(Verzeichnisversion, sortierte Slugs). Nicht veraendern, wird geteilt."""
+    try:
+        version = docs_dir.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0, []
+    with _lock:
+        cached = _indexes.get(docs_dir)
+    if cached is not None and cached[0] == version:
+        return cached
+    entry = (version, sorted(p.stem for p in docs_dir.glob("*.md")))
+    with _lock:
+        _indexes[docs_dir] = entry
+    return entry
+
+
+def compress(html: str) -> CompressedPage:
+    data = html.encode("utf-8")
+    etag = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return CompressedPage(etag, data, None, None)
+    return CompressedPage(
+        etag,
+        data,
+        gzip.compress(data, compresslevel=9, mtime=0),
+        brotli.compress(data, quality=11) if brotli is not None else None,
+    )
+
+
+def page(slug: str, version: Hashable, build: Callable[[], str]) -> CompressedPage:
+    """Gerenderte Seite ``slug``; ``version`` muss alle Quellversionen enthalten."""
+    with _lock:
+        cached = _pages.get(slug)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    compressed = compress(build())
+    with _lock:
+        _pages[slug] = (version, compressed)
+    return compressed
+
+
+def response(compressed: CompressedPage, request: Request) -> Response:
+    """Antwort mit passender Kodierung; ETag je Kodierung, 304 bei Treffer."""
+    offered = [name for name in ("br", "gzip") if getattr(compressed, name) is not None]
+    encoding = request.accept_encodings.best_match([*offered, "identity"], default="identity")
+    if encoding == "identity":
+        resp = Response(compressed.identity, mimetype="text/html")
+        resp.set_etag(compressed.etag)
+    else:
+        resp = Response(getattr(compressed, encoding), mimetype="text/html")
+        resp.headers["Content-Encoding"] = encoding
+        resp.set_etag(f"{compressed.etag}-{encoding}")
+    resp.vary.add("Accept-Encoding")
+    # Immer revalidieren: die Seite haengt an docs/*.md, nicht an einer festen Laufzeit.
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
+def clear() -> None:
+    with _lock:
+        _bodies.clear()
+        _indexes.clear()
+        _pages.clear()
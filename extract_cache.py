@@ -0,0 +1,62 @@
+"""Ergebnis-Cache fuer die KI-Extraktion (``/extract``), opt-in.
+
+Dieselbe Ausschreibung wird oft mehrfach eingefuegt — beim Feilen an den
+Sonderwuenschen oder von Kolleg:innen derselben Schule. Jeder Durchlauf
+kostet sonst einen kompletten DeepSeek-Aufruf auf das Kontingent des
+Nutzers (BYOK). Mit ``DR_AUTOMATE_EXTRACT_CACHE_TTL_HOURS`` > 0 werden
+Ergebnisse in der Tabelle ``extract_cache`` abgelegt:
+
+- Schluessel: ``crypto.lookup_hash`` ueber Modell, Hash des (gestrippten)
+  System-Prompts, normalisierten Freitext und Sonderwuensche — ein
+  geaenderter Prompt oder ein anderes Modell trifft also nie alte Eintraege.
+- Wert verschluesselt (``EncryptedJSON``), Obergrenze
+  ``DR_AUTOMATE_EXTRACT_CACHE_MAX_ENTRIES``; TTL, Aufraeumen und Zaehler
+  wie im Geo-Cache aus ``ttl_cache.TtlCache``.
+- Ergebnisse ueber ``MAX_VALUE_BYTES`` (JSON) werden nicht gespeichert.
+
+Fehler der DB werden nur geloggt — dann wird eben DeepSeek gefragt.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import unicodedata
+
+from crypto import lookup_hash
+from models_db import ExtractCacheEntry
+from ttl_cache import TtlCache
+
+TTL_SECONDS = float(os.environ.get("DR_AUTOMATE_EXTRACT_CACHE_TTL_HOURS", "0")) * 3600
+MAX_ENTRIES = int(os.environ.get("DR_AUTOMATE_EXTRACT_CACHE_MAX_ENTRIES", "2000"))
+# SQLite prueft String(65536) nicht — die Grenze setzt ``put``. Der
+# Fernet-Token (Base64, gut 4/3 des JSON) passt so noch in die Spalte.
+MAX_VALUE_BYTES = 32 * 1024
+
+_cache = TtlCache(ExtractCacheEntry, "Extract-Cache")
+get = _cache.get
+stats = _cache.stats
+reset_stats = _cache.reset_stats
+
+
+def enabled() -> bool:
+    return TTL_SECONDS > 0
+
+
+def normalize(text: str) -> str:
+    """Unicode-NFC, Whitespace zusammenziehen. Gross/Klein bleibt (Namen, Orte)."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def make_key(system_prompt: str, freitext: str, sonderwuensche: str, model: str) -> str:
+    prompt_version = hashlib.blake2b(system_prompt.encode("utf-8"), digest_size=16).hexdigest()
+    return lookup_hash(chr(0).join((model, prompt_version, normalize(freitext), normalize(sonderwuensche))))
+
+
+def put(key: str, value: dict) -> None:
+    _cache.put(key, value, TTL_SECONDS, MAX_ENTRIES, MAX_VALUE_BYTES)
+
+
+def purge(now: float | None = None) -> int:
+    """Loescht abgelaufene Eintraege und kappt auf ``MAX_ENTRIES``. Gibt die Anzahl zurueck."""
+    return _cache.purge(MAX_ENTRIES, now)
@@ -0,0 +1,280 @@
+"""Offline-Gazetteer: haeufige Orte/Strassen ohne Nominatim aufloesen.
+
+Der Grossteil der Geocoding-Anfragen sind immer dieselben Orte, Schulen und
+Behoerdenadressen. Ein vorbereiteter Index beantwortet diese sofort; nur
+Misses gehen an Nominatim (1 req/s).
+
+Ablauf:
+
+1. Orte/Strassen als CSV exportieren (z.B. mit osmium aus einem
+   Niedersachsen-Extrakt: ``place=*`` und ``highway=*`` mit Ort)::
+
+       name,lat,lon
+       Aurich,53.4714,7.4836
+       "Schulweg, Aurich",53.4701,7.4792
+
+2. Index bauen::
+
+       python gazetteer.py build orte.csv niedersachsen.gaz
+
+3. ``DR_AUTOMATE_GAZETTEER=niedersachsen.gaz`` setzen.
+
+Die Datei wird per ``mmap`` geladen und enthaelt:
+
+- die normalisierten Namen sortiert (exakter Treffer per Binaersuche),
+- einen Trigramm-Index (Trigramm → Eintraege) fuer unscharfe Treffer;
+  akzeptiert wird nur ab einem Dice-Koeffizienten von ``FUZZY_MIN``.
+
+Normalisiert wird auf ASCII-Kleinbuchstaben (ä → ae, ß → ss), Hausnummern
+fallen weg, "str." wird zu "strasse" und die Woerter werden sortiert —
+"Schulweg 1, Aurich" und "Aurich, Schulweg" ergeben denselben Schluessel.
+Treffer sind damit strassengenau, nicht hausnummerngenau; fuer die
+Kilometer-Schaetzung reicht das. Die PLZ bleibt im Schluessel; hat der
+Index-Eintrag keine, zaehlt der Treffer ohne sie.
+
+Unscharf darf sich nur der Strassenname unterscheiden: die Ortswoerter
+(alles ausser Strassennamen, siehe ``_STREET``) und eine PLZ des Eintrags
+muessen genau passen. "Hauptstrasse 5" ohne Ort trifft also nicht
+"Hauptstrasse, Aue", sondern geht an Nominatim.
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import csv
+import logging
+import mmap
+import re
+import struct
+import sys
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from collections.abc import Iterable, Sequence
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DRGAZ001"
+_HEADER = struct.Struct("<8sIII")  # magic, Eintraege, Trigramme, Postings
+# Mindest-Aehnlichkeit (Dice ueber Trigramme) fuer einen unscharfen Treffer.
+FUZZY_MIN = 0.8
+# Trigramme, die in mehr Eintraegen vorkommen, tragen zur Kandidatensuche nichts bei.
+MAX_POSTINGS = 5000
+
+_FOLD = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_ABBREVIATIONS = {"str": "strasse", "pl": "platz"}
+_PLZ = re.compile(r"\d{5}")
+# Strassennamen (auch vertippt: "strase", "wegg"), alles andere zaehlt als Ort.
+_STREET = re.compile(r"(str[a-z]{0,4}|weg[a-z]?|platz[a-z]?|allee|gasse|ring|damm|pfad)$")
+
+
+def normalize(text: str) -> str:
+    """Schluessel fuer Index und Abfrage (siehe Moduldocstring)."""
+    text = unicodedata.normalize("NFKD", text.casefold().translate(_FOLD))
+    text = text.encode("ascii", "ignore").decode("ascii")
+    # "Hauptstr." → "hauptstrasse" (nur am Wortende, "Strassburg" bleibt).
+    text = re.sub(r"(\w)str\b\.?", r"\1strasse", text)
+    words = []
+    for word in re.split(r"[^a-z0-9]+", text):
+        if not word or (word[0].isdigit() and not _PLZ.fullmatch(word)):
+            continue  # Hausnummern
+        words.append(_ABBREVIATIONS.get(word, word))
+    return " ".join(sorted(words))
+
+
+def _split(key: str) -> tuple[set[str], set[str]]:
+    """(Ortswoerter, PLZ) eines Schluessels."""
+    places, plz = set(), set()
+    for word in key.split():
+        if _PLZ.fullmatch(word):
+            plz.add(word)
+        elif not _STREET.search(word):
+            places.add(word)
+    return places, plz
+
+
+def _same_place(query: str, candidate: str) -> bool:
+    """Gleiche Ortswoerter, und eine PLZ des Eintrags steht auch in der Abfrage."""
+    q_places, q_plz = _split(query)
+    c_places, c_plz = _split(candidate)
+    return q_places == c_places and c_plz <= q_plz
+
+
+def trigrams(key: str) -> set[int]:
+    padded = f"  {key} ".encode("ascii")
+    return {padded[i] << 16 | padded[i + 1] << 8 | padded[i + 2] for i in range(len(padded) - 2)}
+
+
+# --- Index bauen ---
+
+
+def read_places_csv(path: str) -> list[tuple[str, float, float]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["name"], float(row["lat"]), float(row["lon"])) for row in csv.DictReader(f)]
+
+
+def build(places: Iterable[tuple[str, float, float]], out_path: str) -> int:
+    """Schreibt die Index-Datei. Doppelte Schluessel: der erste gewinnt."""
+    entries: dict[str, tuple[float, float]] = {}
+    for name, lat, lon in places:
+        key = normalize(name)
+        if key and key not in entries:
+            entries[key] = (lat, lon)
+    keys = sorted(entries)
+
+    postings: dict[int, list[int]] = defaultdict(list)
+    for idx, key in enumerate(keys):
+        for tri in trigrams(key):
+            postings[tri].append(idx)
+    tri_codes = array("I", sorted(postings))
+    tri_offsets, tri_entries = array("I", [0]), array("I")
+    for tri in tri_codes:
+        tri_entries.extend(postings[tri])
+        tri_offsets.append(len(tri_entries))
+
+    blob = bytearray()
+    key_offsets = array("I", [0])
+    for key in keys:
+        blob += key.encode("ascii")
+        key_offsets.append(len(blob))
+
+    with open(out_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(keys), len(tri_codes), len(tri_entries)))
+        for arr in (
+            key_offsets,
+            array("f", (entries[k][0] for k in keys)),
+            array("f", (entries[k][1] for k in keys)),
+            tri_codes,
+            tri_offsets,
+            tri_entries,
+        ):
+            arr.tofile(f)
+        f.write(blob)
+    logger.info("Gazetteer geschrieben: %s (%d Eintraege, %d Trigramme)", out_path, len(keys), len(tri_codes))
+    return len(keys)
+
+
+# --- Abfrage ---
+
+
+class _Keys(Sequence[bytes]):
+    """Sortierte Schluessel als Sequenz ueber dem mmap-Blob (fuer ``bisect``)."""
+
+    def __init__(self, offsets, blob):
+        self._offsets, self._blob = offsets, blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self._blob[self._offsets[i] : self._offsets[i + 1]])
+
+
+class Gazetteer:
+    """Per mmap geladener Orts-Index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._mm) < _HEADER.size:
+                raise ValueError(f"Gazetteer-Datei zu kurz: {path}")
+            magic, n, n_tri, n_post = _HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Keine Gazetteer-Datei: {path}")
+            # offsets (n+1), lat, lon, Trigramm-Codes, -Offsets (n_tri+1), Postings
+            if len(self._mm) < _HEADER.size + 4 * (3 * n + 1 + 2 * n_tri + 1 + n_post):
+                raise ValueError(f"Gazetteer-Datei abgeschnitten: {path}")
+        except ValueError:
+            self._mm.close()
+            raise
+        view = memoryview(self._mm)
+        pos = _HEADER.size
+
+        def take(fmt: str, count: int):
+            nonlocal pos
+            arr = view[pos : pos + 4 * count].cast(fmt)
+            pos += 4 * count
+            return arr
+
+        offsets = take("I", n + 1)
+        self.lat, self.lon = take("f", n), take("f", n)
+        self._tri_codes, self._tri_offsets, self._tri_entries = (
+            take("I", n_tri),
+            take("I", n_tri + 1),
+            take("I", n_post),
+        )
+        self._views = [offsets, self.lat, self.lon, self._tri_codes, self._tri_offsets, self._tri_entries]
+        self.keys = _Keys(offsets, view[pos:])
+        self._views.append(self.keys._blob)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _exact(self, key: bytes) -> int | None:
+        i = bisect.bisect_left(self.keys, key)
+        return i if i < len(self.keys) and self.keys[i] == key else None
+
+    def _fuzzy(self, key: str) -> tuple[int, float] | None:
+        wanted = trigrams(key)
+        common: Counter[int] = Counter()
+        for tri in wanted:
+            i = bisect.bisect_left(self._tri_codes, tri)
+            if i == len(self._tri_codes) or self._tri_codes[i] != tri:
+                continue
+            lo, hi = self._tri_offsets[i], self._tri_offsets[i + 1]
+            if hi - lo <= MAX_POSTINGS:
+                common.update(self._tri_entries[lo:hi])
+        best: tuple[int, float] | None = None
+        # Dice nur fuer die Kandidaten mit den meisten gemeinsamen Trigrammen ausrechnen.
+        for idx, shared in common.most_common(20):
+            candidate = self.keys[idx].decode("ascii")
+            if not _same_place(key, candidate):
+                continue
+            score = 2 * shared / (len(wanted) + len(trigrams(candidate)))
+            if best is None or score > best[1]:
+                best = (idx, score)
+        return best if best is not None and best[1] >= FUZZY_MIN else None
+
+    def lookup(self, text: str) -> tuple[float, float] | None:
+        """(lat, lon) fuer einen Orts-/Adressstring oder None."""
+        key = normalize(text)
+        if not key:
+            return None
+        idx = self._exact(key.encode("ascii"))
+        if idx is None:
+            # Index-Eintraege ohne PLZ: nochmal ohne die PLZ der Abfrage.
+            ohne_plz = " ".join(w for w in key.split() if not _PLZ.fullmatch(w))
+            if ohne_plz and ohne_plz != key:
+                idx = self._exact(ohne_plz.encode("ascii"))
+        if idx is None:
+            fuzzy = self._fuzzy(key)
+            if fuzzy is None:
+                return None
+            idx = fuzzy[0]
+        return float(self.lat[idx]), float(self.lon[idx])
+
+    def close(self) -> None:
+        for v in self._views:
+            v.release()
+        self._mm.close()
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline-Gazetteer fuer dr-automate bauen.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="Orts-CSV (name,lat,lon) indexieren")
+    p_build.add_argument("places_csv")
+    p_build.add_argument("out")
+    args = parser.parse_args(argv)
+
+    count = build(read_places_csv(args.places_csv), args.out)
+    print(f"{count} Eintraege → {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
@@ -3,12 +3,12 @@ import json
 import logging
 import os
 import re
+from collections.abc import Callable
 from datetime import datetime
 
-from pypdf import PdfReader, PdfWriter
 from pypdf.generic import BooleanObject, NameObject
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+
+import pdf_templates
 
 # --- LOGGING ---
 logger = logging.getLogger(__name__)
@@ -61,29 +61,50 @@ FIELD_MAPPING = {
 }
 
 
-def load_json_data(filepath):
-    with open(filepath, encoding="utf-8") as f:
-        return json.load(f)
+def _compile_getter(json_key: str) -> Callable[[dict], object]:
+    """Punkt-Pfad ("reise_details.zielort") einmalig in einen Getter übersetzen."""
+    if json_key == "CLEAR_DIENSTWAGEN":
+        return lambda _data: ""
+    keys = tuple(json_key.split("."))
 
+    def getter(data: dict) -> object:
+        value = data
+        for k in keys:
+            value = value.get(k, {})
+            if value is None:
+                break
+        return value
 
-def create_signature_overlay(text_str: str) -> PdfReader:
-    """Erstellt ein PDF-Overlay mit dem Unterschriftstext.
+    return getter
 
-    Args:
-        text_str: Der Text für die Unterschrift (Name, Datum)
 
-    Returns:
-        PdfReader mit dem Overlay
-    """
-    packet = io.BytesIO()
-    can = canvas.Canvas(packet, pagesize=A4)
+# FIELD_MAPPING wird beim Import in einen flachen Plan (Getter, Ziel-Felder)
+# übersetzt — pro Request entfällt das Splitten der Pfade. Welche Widgets
+# ein Feldname im Vordruck hat, löst pdf_templates pro Template auf.
+TEXT_FILL_PLAN: tuple[tuple[Callable[[dict], object], tuple[str, ...]], ...] = tuple(
+    (_compile_getter(json_key), tuple(pdf_id) if isinstance(pdf_id, list) else (pdf_id,))
+    for json_key, pdf_id in FIELD_MAPPING.items()
+)
 
-    can.setFont(SIGNATURE_FONT, SIGNATURE_FONT_SIZE)
-    can.drawString(SIGNATURE_POSITION_X, SIGNATURE_POSITION_Y, text_str)
 
-    can.save()
-    packet.seek(0)
-    return PdfReader(packet)
+def load_json_data(filepath):
+    with open(filepath, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_text_fields(data: dict) -> dict:
+    """Wendet TEXT_FILL_PLAN auf die Antrag-Daten an (nur str/int-Werte)."""
+    fields = {}
+    for getter, targets in TEXT_FILL_PLAN:
+        value = getter(data)
+        if isinstance(value, (str, int)):
+            if isinstance(value, str):
+                # PDF-Formularfelder nutzen \r als Zeilenumbruch (PDF-Spec ISO 32000).
+                # LLMs geben manchmal literal \\n (zwei Zeichen) aus → ebenfalls ersetzen.
+                value = value.replace("\r\n", "\r").replace("\\n", "\r").replace("\n", "\r")
+            for pid in targets:
+                fields[pid] = value
+    return fields
 
 
 def _checkbox_befoerderung(trans: dict) -> dict:
@@ -274,16 +295,15 @@ def generate_output_filename(data: dict) -> str:
     return f"{date_prefix}_DR-Antrag_{clean_suffix}.pdf"
 
 
-def fill_pdf(json_input: dict | str, input_pdf_path: str, output_dir: str) -> str:
-    """Füllt das PDF-Formular mit den übergebenen Daten.
+def render_pdf(json_input: dict | str, input_pdf_path: str) -> tuple[str, bytes]:
+    """Füllt das PDF-Formular im Speicher, ohne etwas auf die Platte zu schreiben.
 
     Args:
         json_input: Entweder ein dict mit Daten oder Pfad zu einer JSON-Datei
         input_pdf_path: Pfad zum PDF-Template
-        output_dir: Ausgabeverzeichnis für das generierte PDF
 
     Returns:
-        Pfad zur generierten PDF-Datei
+        Tupel aus Dateiname (siehe ``generate_output_filename``) und PDF-Bytes
 
     Raises:
         FileNotFoundError: Wenn das Template nicht gefunden wird
@@ -295,49 +315,15 @@ def fill_pdf(json_input: dict | str, input_pdf_path: str, output_dir: str) -> st
         else:
             data = json_input
 
-        # Stelle sicher, dass Ausgabeverzeichnis existiert
-        os.makedirs(output_dir, exist_ok=True)
-
         output_filename = generate_output_filename(data)
-        output_pdf_path = os.path.join(output_dir, output_filename)
-
-        writer = PdfWriter(clone_from=input_pdf_path)
-
-        # 1. Textfelder
-        fields_to_fill = {}
-        for json_key, pdf_id in FIELD_MAPPING.items():
-            if json_key == "CLEAR_DIENSTWAGEN":
-                for pid in pdf_id:
-                    fields_to_fill[pid] = ""
-                continue
-
-            keys = json_key.split(".")
-            value = data
-            for k in keys:
-                value = value.get(k, {})
-                if value is None:
-                    break
-
-            if isinstance(value, (str, int)):
-                if isinstance(value, str):
-                    # PDF-Formularfelder nutzen \r als Zeilenumbruch (PDF-Spec ISO 32000).
-                    # LLMs geben manchmal literal \\n (zwei Zeichen) aus → ebenfalls ersetzen.
-                    value = value.replace("\r\n", "\r").replace("\\n", "\r").replace("\n", "\r")
-                if isinstance(pdf_id, list):
-                    for pid in pdf_id:
-                        fields_to_fill[pid] = value
-                else:
-                    fields_to_fill[pdf_id] = value
-
-        # 2. Checkboxen
-        checkbox_fields = apply_checkbox_logic(data)
-
-        # 3. Anwenden
-        all_fields = {**fields_to_fill, **checkbox_fields}
-
-        # Iteriere über alle Seiten, um sicherzustellen, dass Felder auf Seite 2 (z.B. Obj39, Bemerkungen) auch gefüllt werden
-        for page in writer.pages:
-            writer.update_page_form_field_values(page, all_fields, auto_regenerate=False)
+
+        template = pdf_templates.get_template(input_pdf_path)
+        writer = template.clone()
+
+        # 1. Textfelder + 2. Checkboxen, 3. nur geänderte Felder auf ihren Seiten
+        # befüllen (Felder auf Seite 2, z.B. Obj39/Bemerkungen, kennt der Seiten-Index).
+        all_fields = {**build_text_fields(data), **apply_checkbox_logic(data)}
+        template.fill(writer, all_fields)
 
         set_need_appearances(writer)
 
@@ -346,18 +332,25 @@ def fill_pdf(json_input: dict | str, input_pdf_path: str, output_dir: str) -> st
         name = data.get("antragsteller", {}).get("name", "")
         unterschrift_text = f"{name}, {heute_str}"
 
-        overlay = create_signature_overlay(unterschrift_text)
-        writer.pages[1].merge_page(overlay.pages[0], over=True)
+        pdf_templates.stamp_text(
+            writer,
+            1,
+            unterschrift_text,
+            SIGNATURE_POSITION_X,
+            SIGNATURE_POSITION_Y,
+            font=SIGNATURE_FONT,
+            font_size=SIGNATURE_FONT_SIZE,
+        )
 
-        with open(output_pdf_path, "wb") as f:
-            writer.write(f)
+        buf = io.BytesIO()
+        writer.write(buf)
 
-        logger.info(f"PDF erstellt: {output_pdf_path}")
+        logger.info(f"PDF erstellt: {output_filename} ({buf.tell()} Bytes)")
         logger.debug(
             f"Unterschrift: '{unterschrift_text}' an Position ({SIGNATURE_POSITION_X}, {SIGNATURE_POSITION_Y})"
         )
 
-        return output_pdf_path
+        return output_filename, buf.getvalue()
 
     except FileNotFoundError:
         logger.error(f"Template nicht gefunden: {input_pdf_path}")
@@ -365,3 +358,20 @@ def fill_pdf(json_input: dict | str, input_pdf_path: str, output_dir: str) -> st
     except Exception as e:
         logger.exception(f"Fehler bei PDF-Generierung: {e}")
         raise
+
+
+def fill_pdf(json_input: dict | str, input_pdf_path: str, output_dir: str) -> str:
+    """Füllt das PDF-Formular und schreibt es nach ``output_dir``.
+
+    Dünner Wrapper um ``render_pdf`` für CLI/Tests — die Web-Routen streamen
+    die Bytes direkt und brauchen keine Datei.
+
+    Returns:
+        Pfad zur generierten PDF-Datei
+    """
+    output_filename, pdf_bytes = render_pdf(json_input, input_pdf_path)
+    os.makedirs(output_dir, exist_ok=True)
+    output_pdf_path = os.path.join(output_dir, output_filename)
+    with open(output_pdf_path, "wb") as f:
+        f.write(pdf_bytes)
+    return output_pdf_path
@@ -6,11 +6,8 @@ import os
 import re
 from datetime import datetime
 
-from pypdf import PdfReader, PdfWriter
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-
 import nrkvo_rates
+import pdf_templates
 from abrechnung_calc import berechnung, tagegeld_tage
 from generator import set_need_appearances
 from models import AbrechnungData
@@ -61,16 +58,6 @@ def _split_iban(iban: str) -> dict:
     return fields
 
 
-def _create_signature_overlay(text_str: str) -> PdfReader:
-    packet = io.BytesIO()
-    can = canvas.Canvas(packet, pagesize=A4)
-    can.setFont(SIGNATURE_FONT, SIGNATURE_FONT_SIZE)
-    can.drawString(SIGNATURE_POSITION_X, SIGNATURE_POSITION_Y, text_str)
-    can.save()
-    packet.seek(0)
-    return PdfReader(packet)
-
-
 def _build_text_fields(data: AbrechnungData) -> dict:
     """Befüllt alle Textfelder."""
     fields = {}
@@ -399,8 +386,8 @@ def generate_output_filename(data: AbrechnungData) -> str:
     return f"{date_prefix}_DR-Abrechnung_{clean}.pdf"
 
 
-def fill_pdf(data: AbrechnungData, input_pdf_path: str, output_dir: str) -> str:
-    """Befüllt das Abrechnungs-PDF.
+def render_pdf(data: AbrechnungData, input_pdf_path: str) -> tuple[str, bytes]:
+    """Befüllt das Abrechnungs-PDF im Speicher → (Dateiname, PDF-Bytes).
 
     Berechnungswerte werden vor dem Befüllen autoritativ neu berechnet —
     Werte aus dem Input werden überschrieben.
@@ -408,18 +395,14 @@ def fill_pdf(data: AbrechnungData, input_pdf_path: str, output_dir: str) -> str:
     # Autoritative Berechnung
     data.berechnet = berechnung(data)
 
-    os.makedirs(output_dir, exist_ok=True)
     output_filename = generate_output_filename(data)
-    output_pdf_path = os.path.join(output_dir, output_filename)
 
-    writer = PdfWriter(clone_from=input_pdf_path)
+    template = pdf_templates.get_template(input_pdf_path)
+    writer = template.clone()
 
     text_fields = _build_text_fields(data)
     button_fields = _build_button_fields(data)
-    all_fields = {**text_fields, **button_fields}
-
-    for page in writer.pages:
-        writer.update_page_form_field_values(page, all_fields, auto_regenerate=False)
+    template.fill(writer, {**text_fields, **button_fields})
 
     set_need_appearances(writer)
 
@@ -431,11 +414,28 @@ def fill_pdf(data: AbrechnungData, input_pdf_path: str, output_dir: str) -> str:
     if data.antragsteller.amtsbezeichnung:
         sig_parts.append(data.antragsteller.amtsbezeichnung)
     sig_parts.append(heute)
-    overlay = _create_signature_overlay(", ".join(sig_parts))
-    writer.pages[1].merge_page(overlay.pages[0], over=True)
+    pdf_templates.stamp_text(
+        writer,
+        1,
+        ", ".join(sig_parts),
+        SIGNATURE_POSITION_X,
+        SIGNATURE_POSITION_Y,
+        font=SIGNATURE_FONT,
+        font_size=SIGNATURE_FONT_SIZE,
+    )
 
-    with open(output_pdf_path, "wb") as f:
-        writer.write(f)
+    buf = io.BytesIO()
+    writer.write(buf)
+
+    logger.info(f"Abrechnungs-PDF erstellt: {output_filename} ({buf.tell()} Bytes)")
+    return output_filename, buf.getvalue()
 
-    logger.info(f"Abrechnungs-PDF erstellt: {output_pdf_path}")
+
+def fill_pdf(data: AbrechnungData, input_pdf_path: str, output_dir: str) -> str:
+    """Befüllt das Abrechnungs-PDF und schreibt es nach ``output_dir`` (CLI/Tests)."""
+    output_filename, pdf_bytes = render_pdf(data, input_pdf_path)
+    os.makedirs(output_dir, exist_ok=True)
+    output_pdf_path = os.path.join(output_dir, output_filename)
+    with open(output_pdf_path, "wb") as f:
+        f.write(pdf_bytes)
     return output_pdf_path
@@ -0,0 +1,54 @@
+"""Persistenter TTL-Cache fuer ``routing.geocode`` und ``routing.route_km``.
+
+Der ``lru_cache`` in ``routing.py`` lebt nur so lange wie der Worker —
+nach jedem Restart zahlt jede Adresse wieder die 1,05-s-Drossel von
+Nominatim. Dieser Cache legt die Ergebnisse in die Tabelle ``geo_cache``
+der App-DB und gilt damit ueber Restarts und alle Worker hinweg:
+
+- Schluessel: ``crypto.lookup_hash`` der normalisierten Eingabe (die
+  Wohnadresse steht nicht im Klartext in der DB), Wert verschluesselt.
+- TTL pro Eintrag (``DR_AUTOMATE_GEO_CACHE_TTL_DAYS``), abgelaufene
+  Eintraege gelten als Miss und werden beim Aufraeumen geloescht.
+- Obergrenze ``DR_AUTOMATE_GEO_CACHE_MAX_ENTRIES``: darueber fliegen die
+  am kuerzesten gueltigen Eintraege zuerst.
+- Hit/Miss-Zaehler pro Art (``geo_hit``, ``route_miss``) in ``stats()``.
+
+TTL, Aufraeumen und Zaehler kommen aus ``ttl_cache.TtlCache``. Fehler der
+DB werden nur geloggt — das Routing faellt dann auf die externen Dienste
+zurueck.
+"""
+
+from __future__ import annotations
+
+import os
+
+from crypto import lookup_hash
+from models_db import GeoCacheEntry
+from ttl_cache import TtlCache
+
+TTL_SECONDS = float(os.environ.get("DR_AUTOMATE_GEO_CACHE_TTL_DAYS", "90")) * 86400
+MAX_ENTRIES = int(os.environ.get("DR_AUTOMATE_GEO_CACHE_MAX_ENTRIES", "20000"))
+
+_cache = TtlCache(GeoCacheEntry, "Geo-Cache")
+get = _cache.get
+count = _cache.count
+stats = _cache.stats
+reset_stats = _cache.reset_stats
+
+
+def normalize(text: str) -> str:
+    """Whitespace zusammenziehen, Gross/Klein ignorieren."""
+    return " ".join(text.split()).casefold()
+
+
+def make_key(kind: str, *parts: str) -> str:
+    return f"{kind}:{lookup_hash(chr(0).join(normalize(p) for p in parts))}"
+
+
+def put(key: str, value: dict, ttl: float | None = None) -> None:
+    _cache.put(key, value, ttl or TTL_SECONDS, MAX_ENTRIES)
+
+
+def purge(now: float | None = None) -> int:
+    """Loescht abgelaufene Eintraege und kappt auf ``MAX_ENTRIES``. Gibt die Anzahl zurueck."""
+    return _cache.purge(MAX_ENTRIES, now)
@@ -378,6 +378,20 @@ def validate_reiseantrag(data: dict) -> tuple[bool, str | ReiseantragData]:
 _PLACEHOLDER_RE = re.compile(r"\[(?:DEIN|DEINE|OPTIONALER)\b[^\]]*\]")
 
 
+_CITATION_RE = re.compile(r"\s*\[cite:[^\]]+\]", re.IGNORECASE)
+
+
+def strip_citations(obj):
+    """Entfernt KI-Zitatmarker wie [cite: 1, 2] rekursiv aus allen String-Werten."""
+    if isinstance(obj, dict):
+        return {k: strip_citations(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [strip_citations(i) for i in obj]
+    if isinstance(obj, str):
+        return _CITATION_RE.sub("", obj).strip()
+    return obj
+
+
 def find_placeholder(obj) -> str | None:
     """Sucht rekursiv den ersten zurückgebliebenen Prompt-Platzhalter in
     String-Werten (defense-in-depth — soll nie ins PDF gelangen)."""
@@ -22,6 +22,7 @@ from sqlalchemy import (
     Date,
     DateTime,
     Enum,
+    Float,
     ForeignKey,
     Index,
     Integer,
@@ -138,7 +139,9 @@ class Dienstreise(Base):
     # Volles Antrag-JSON (Pydantic-serialisiert) — enthaelt Reisedaten,
     # Befoerderung, Konfiguration, ggf. Bemerkungen. Verschluesselt, weil
     # Reise-Details inkl. Mitreisende/Adressen personenbezogen sind.
-    antrag_json: Mapped[dict | None] = mapped_column(EncryptedJSON(65536))
+    # ``deferred``: erst beim Attributzugriff laden + entschluesseln — das
+    # Dashboard listet nur Titel/Status/Daten und zahlt so kein Fernet.
+    antrag_json: Mapped[dict | None] = mapped_column(EncryptedJSON(65536), deferred=True)
     antrag_pdf_path: Mapped[str | None] = mapped_column(String(512))
 
     # DR-Genehmigung (vom Vorgesetzten/Personalstelle erteilt).
@@ -162,6 +165,31 @@ class Dienstreise(Base):
     )
 
 
+def antrag_columns(antrag: dict) -> dict:
+    """Plain-Spalten einer ``Dienstreise`` aus dem Antrag-JSON.
+
+    Gemeinsam fuer ``/generate`` (``_persist_antrag``) und die Entwuerfe der
+    Batch-Extraktion. Daten als "DD.MM.YYYY" oder ISO, sonst ``None``.
+    """
+    details = antrag.get("reise_details") or {}
+    zielort = details.get("zielort") or None
+    return {
+        "titel": (details.get("zweck") or zielort or "Dienstreise")[:200],
+        "zielort": zielort,
+        "start_datum": _parse_antrag_date(details.get("start_datum")),
+        "ende_datum": _parse_antrag_date(details.get("ende_datum")),
+    }
+
+
+def _parse_antrag_date(value) -> date | None:
+    for fmt in ("%d.%m.%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
 class Abrechnung(Base):
     __tablename__ = "abrechnungen"
 
@@ -172,7 +200,7 @@ class Abrechnung(Base):
     status: Mapped[AbrechnungStatus] = mapped_column(
         Enum(AbrechnungStatus, name="abrechnung_status"), default=AbrechnungStatus.entwurf, nullable=False
     )
-    abrechnung_json: Mapped[dict | None] = mapped_column(EncryptedJSON(65536))
+    abrechnung_json: Mapped[dict | None] = mapped_column(EncryptedJSON(65536), deferred=True)
     abrechnung_pdf_path: Mapped[str | None] = mapped_column(String(512))
     generated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -199,5 +227,55 @@ class AccountRequest(Base):
     fulfilled_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
 
+class RateLimitCounter(Base):
+    """Fixed-Window-Zaehler fuer flask-limiter (Storage ``db://``, siehe
+    ``ratelimit_store.py``) — gemeinsam fuer alle gunicorn-Worker."""
+
+    __tablename__ = "rate_limits"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Unix-Timestamp (time.time()) des Fensterendes — float statt DateTime,
+    # damit das Upsert ohne Zeitzonen-Konvertierung vergleichen kann.
+    expires_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
+
+
+class GeoCacheEntry(Base):
+    """Persistenter Cache fuer Geocoding/Routing (``geo_cache.py``).
+
+    Adressen und Koordinaten sind personenbezogen (Wohnadresse): der
+    Schluessel ist ein ``crypto.lookup_hash`` der normalisierten Eingabe,
+    der Wert liegt verschluesselt vor.
+    """
+
+    __tablename__ = "geo_cache"
+
+    # "<art>:<hmac-hex>", art = geo | route
+    key: Mapped[str] = mapped_column(String(80), primary_key=True)
+    value: Mapped[dict] = mapped_column(EncryptedJSON(1024), nullable=False)
+    expires_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
+    hits: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ExtractCacheEntry(Base):
+    """Cache fuer KI-Extraktionen (``extract_cache.py``).
+
+    Schluessel: ``crypto.lookup_hash`` ueber Prompt-Version, Modell,
+    normalisierten Freitext und Sonderwuensche; Ergebnis verschluesselt.
+    """
+
+    __tablename__ = "extract_cache"
+
+    key: Mapped[str] = mapped_column(String(80), primary_key=True)
+    value: Mapped[dict] = mapped_column(EncryptedJSON(65536), nullable=False)
+    expires_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
+    hits: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
 Index("idx_dienstreisen_user_status", Dienstreise.user_id, Dienstreise.status)
+# Dashboard: WHERE user_id = ? ORDER BY created_at DESC, id DESC. Die id steckt
+# als rowid ohnehin in jedem SQLite-Index, der Keyset-Cursor braucht keinen Sort.
+Index("idx_dienstreisen_user_created", Dienstreise.user_id, Dienstreise.created_at)
 UniqueConstraint("user_id", name="uq_user_profiles_user")
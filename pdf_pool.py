@@ -0,0 +1,119 @@
+"""Optionaler Prozess-Pool fuer das PDF-Rendern.
+
+gunicorn laeuft mit einem Worker und vier Threads (flask-limiter mit
+``memory://`` zaehlt pro Prozess). Das pypdf-Befuellen haengt damit an
+einem GIL — parallele Requests warten aufeinander. Mit
+``DR_AUTOMATE_PDF_POOL_WORKERS=N`` rendert stattdessen ein Pool aus N
+vorgestarteten Prozessen, die die Vordrucke warm halten; der Flask-Thread
+reicht den Job weiter und wartet (ohne GIL) auf die Bytes. Rate-Limiter,
+DB und Persistenz bleiben im Web-Prozess.
+
+Default ``0``: kein Pool, gerendert wird wie bisher im Request-Thread.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pdf_templates
+
+logger = logging.getLogger(__name__)
+
+POOL_WORKERS = int(os.environ.get("DR_AUTOMATE_PDF_POOL_WORKERS", "0"))
+# Obergrenze fuers Warten auf einen Render-Job (Sekunden).
+POOL_TIMEOUT = float(os.environ.get("DR_AUTOMATE_PDF_POOL_TIMEOUT", "60"))
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_warm_paths: tuple[str, ...] = ()
+
+
+def enabled() -> bool:
+    return POOL_WORKERS > 0
+
+
+def warm_templates(paths: Iterable[str]) -> None:
+    """Vordrucke, die jeder Pool-Worker beim Start parst. Vor dem ersten Job setzen."""
+    global _warm_paths
+    _warm_paths = tuple(paths)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Pool lazy starten — erst im gunicorn-Worker, nicht schon im Master."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # forkserver: der Web-Prozess hat Threads, fork() daraus ist unsicher.
+            # Der Forkserver importiert die Generatoren einmal vor.
+            ctx = multiprocessing.get_context("forkserver")
+            ctx.set_forkserver_preload(["generator", "generator_abrechnung", __name__])
+            _pool = ProcessPoolExecutor(
+                max_workers=POOL_WORKERS,
+                mp_context=ctx,
+                initializer=pdf_templates.warm,
+                initargs=(_warm_paths,),
+            )
+            logger.info("PDF-Render-Pool gestartet (%d Prozesse)", POOL_WORKERS)
+        return _pool
+
+
+def terminate(pool: ProcessPoolExecutor) -> None:
+    """Pool herunterfahren und seine Prozesse beenden.
+
+    ``shutdown(wait=False)`` allein laesst einen haengenden Job weiterlaufen —
+    der Prozess hielte seinen Slot (und Speicher) bis zum Ende des Jobs.
+    """
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for proc in processes:
+        if proc.is_alive():
+            proc.terminate()
+
+
+def discard(pool: ProcessPoolExecutor) -> None:
+    """Defekten Pool verwerfen; der naechste ``get_pool`` startet einen neuen."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    terminate(pool)
+
+
+def run[T](fn: Callable[..., T], *args) -> T:
+    """Fuehrt ``fn(*args)`` im Pool aus (oder direkt, wenn der Pool aus ist).
+
+    ``fn`` und ``args`` muessen picklebar sein (Modul-Funktionen, dicts,
+    Pydantic-Modelle). Stirbt ein Worker oder braucht der Job laenger als
+    ``POOL_TIMEOUT``, wird der Pool verworfen (haengende Prozesse beendet)
+    und der Job einmal im eigenen Prozess nachgeholt — wie in
+    ``batch_pdf._collect``; der Request scheitert daran nicht.
+    """
+    if not enabled():
+        return fn(*args)
+    pool = get_pool()
+    try:
+        return pool.submit(fn, *args).result(timeout=POOL_TIMEOUT)
+    except BrokenProcessPool:
+        logger.exception("PDF-Render-Pool defekt — Neustart beim naechsten Job, rendere lokal")
+    except TimeoutError:
+        logger.error("PDF-Render-Pool: Job haengt (> %ss) — Pool verworfen, rendere lokal", POOL_TIMEOUT)
+    discard(pool)
+    return fn(*args)
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown)
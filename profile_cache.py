@@ -0,0 +1,136 @@
+"""Entschluesselter Profil-Snapshot pro User, im Prozess gecacht.
+
+Jede gerenderte Seite braucht das Profil (Wizard-Seed im Template-Kontext),
+dazu ``/profil/json``, der Profil-Merge in ``/generate`` und der
+DeepSeek-Key-Fallback in ``/extract``. Ohne Cache heisst das jedes Mal:
+eigene Session, ``UserProfile`` laden, Adresse/IBAN/BIC/BahnCards per
+Fernet entschluesseln. ``get(user_id)`` liefert stattdessen einen
+gemeinsamen, unveraenderlichen ``ProfileSnapshot``:
+
+- ``invalidate(user_id)`` nach jedem Schreiben des Profils (``profil_save``,
+  Anlegen in ``profil_view``) — im selben Prozess ist der naechste Request
+  sofort aktuell.
+- Die Invalidierung wirkt nur im eigenen Prozess. Mit
+  ``DR_AUTOMATE_PROCESS_LOCAL_CACHES=0`` (mehrere gunicorn-Worker) ist der
+  Cache deshalb aus — ein anderer Worker
+  wuerde nach dem Speichern sonst bis zu ``DR_AUTOMATE_PROFILE_CACHE_TTL``
+  Sekunden den alten Stand ausliefern (``0`` = Cache auch sonst aus).
+- Eine Ladung, die vor einer Invalidierung begonnen hat, landet nicht mehr
+  im Cache (Generationszaehler pro User) — sonst koennte ein paralleler
+  Request den alten Stand nach dem Speichern wieder eintragen.
+- Auch "kein Profil" wird gecacht (``None``).
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, fields
+
+# Mehrere Worker: kein Cache, siehe Modul-Docstring.
+PROFILE_CACHE_TTL = (
+    float(os.environ.get("DR_AUTOMATE_PROFILE_CACHE_TTL", "60"))
+    if os.environ.get("DR_AUTOMATE_PROCESS_LOCAL_CACHES", "1") != "0"
+    else 0.0
+)
+PROFILE_CACHE_MAX = 1024
+
+
+@dataclass(frozen=True, slots=True)
+class ProfileSnapshot:
+    """Klartext-Kopie der ``UserProfile``-Spalten (gleiche Attributnamen)."""
+
+    vorname: str | None = None
+    nachname: str | None = None
+    abteilung: str | None = None
+    amtsbezeichnung: str | None = None
+    telefon: str | None = None
+    email: str | None = None
+    adresse_privat: str | None = None
+    iban: str | None = None
+    bic: str | None = None
+    mitreisender_name_default: str | None = None
+    rkr_default: str | None = None
+    abrechnende_dienststelle: str | None = None
+    anordnende_dienststelle: str | None = None
+    ai_provider_default: str | None = None
+    standard_verkehrsmittel: str | None = None
+    deepseek_api_key: str | None = None
+    auto_save_dienstreisen: bool = True
+    # Geteilt zwischen Requests: nur lesen, Aufrufer kopieren vor Aenderungen.
+    bahncards: dict | None = None
+
+    @classmethod
+    def from_profile(cls, profile) -> ProfileSnapshot:
+        return cls(**{f.name: getattr(profile, f.name) for f in fields(cls)})
+
+
+class _ProfileCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[int, tuple[float, ProfileSnapshot | None]] = {}
+        self._generation: dict[int, int] = {}
+
+    def get(self, user_id: int) -> tuple[bool, ProfileSnapshot | None, int]:
+        """(Treffer, Snapshot, Generation fuer ein anschliessendes ``put``)."""
+        with self._lock:
+            generation = self._generation.get(user_id, 0)
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                return False, None, generation
+            return True, entry[1], generation
+
+    def put(self, user_id: int, snapshot: ProfileSnapshot | None, generation: int) -> None:
+        with self._lock:
+            if self._generation.get(user_id, 0) != generation:
+                return  # waehrend des Ladens invalidiert
+            if len(self._entries) >= PROFILE_CACHE_MAX:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+                if len(self._entries) >= PROFILE_CACHE_MAX:
+                    self._entries.clear()
+            self._entries[user_id] = (time.monotonic() + PROFILE_CACHE_TTL, snapshot)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generation[user_id] = self._generation.get(user_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation.clear()
+
+
+_cache = _ProfileCache()
+
+
+def _load(user_id: int) -> ProfileSnapshot | None:
+    from db import SessionLocal
+    from models_db import UserProfile
+
+    with SessionLocal() as s:
+        profile = s.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+        return None if profile is None else ProfileSnapshot.from_profile(profile)
+
+
+def get(user_id: int) -> ProfileSnapshot | None:
+    """Snapshot des Profils von ``user_id`` oder None, wenn keins existiert."""
+    if PROFILE_CACHE_TTL <= 0:
+        return _load(user_id)
+    hit, snapshot, generation = _cache.get(user_id)
+    if not hit:
+        snapshot = _load(user_id)
+        _cache.put(user_id, snapshot, generation)
+    return snapshot
+
+
+def invalidate(user_id: int) -> None:
+    """Nach jeder Aenderung am Profil von ``user_id`` aufrufen."""
+    _cache.invalidate(user_id)
+
+
+def clear() -> None:
+    """Cache leeren (Tests, nach manuellen Profil-Aenderungen in der DB)."""
+    _cache.clear()
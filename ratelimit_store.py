@@ -0,0 +1,117 @@
+"""Rate-Limit-Storage fuer flask-limiter in der App-Datenbank.
+
+``memory://`` zaehlt pro Prozess — mit N gunicorn-Workern waeren die
+Limits ver-N-facht, deshalb lief die App bisher mit genau einem Worker.
+Dieses Backend legt die Fixed-Window-Zaehler in die Tabelle
+``rate_limits`` der SQLite-DB (``db.engine``, WAL-Modus). Jeder Hit ist
+ein einzelnes atomares Upsert (``INSERT … ON CONFLICT … RETURNING``), die
+Zaehler sind damit ueber alle Prozesse auf dem Host exakt — ohne Redis.
+
+Aktivieren mit ``RATELIMIT_STORAGE_URI=db://``. Import registriert das
+Schema ``db`` bei ``limits``.
+
+Unterstuetzt nur die Fixed-Window-Strategie (Default von flask-limiter).
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+from limits.storage import Storage
+from sqlalchemy import case, delete, select, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from db import engine
+from models_db import RateLimitCounter
+
+logger = logging.getLogger(__name__)
+
+# Abgelaufene Zeilen hoechstens so oft (Sekunden) pro Prozess wegraeumen.
+PURGE_INTERVAL = 60.0
+
+
+class DBStorage(Storage):
+    """Fixed-Window-Zaehler in der Tabelle ``rate_limits``."""
+
+    STORAGE_SCHEME = ["db"]
+
+    def __init__(self, uri: str | None = None, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._next_purge = 0.0
+        self._purge_lock = threading.Lock()
+
+    @property
+    def base_exceptions(self) -> type[Exception]:
+        return SQLAlchemyError
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        now = time.time()
+        tbl = RateLimitCounter.__table__
+        expired = tbl.c.expires_at <= now
+        stmt = (
+            insert(tbl)
+            .values(key=key, count=amount, expires_at=now + expiry)
+            .on_conflict_do_update(
+                index_elements=[tbl.c.key],
+                set_={
+                    # Abgelaufenes Fenster: neu beginnen statt weiterzaehlen.
+                    "count": case((expired, amount), else_=tbl.c.count + amount),
+                    "expires_at": case((expired, now + expiry), else_=tbl.c.expires_at),
+                },
+            )
+            .returning(tbl.c.count)
+        )
+        with engine.begin() as conn:
+            value = conn.execute(stmt).scalar_one()
+        self._maybe_purge(now)
+        return value
+
+    def get(self, key: str) -> int:
+        tbl = RateLimitCounter.__table__
+        with engine.connect() as conn:
+            value = conn.execute(
+                select(tbl.c.count).where(tbl.c.key == key, tbl.c.expires_at > time.time())
+            ).scalar_one_or_none()
+        return value or 0
+
+    def get_expiry(self, key: str) -> float:
+        tbl = RateLimitCounter.__table__
+        with engine.connect() as conn:
+            value = conn.execute(select(tbl.c.expires_at).where(tbl.c.key == key)).scalar_one_or_none()
+        return value if value is not None else time.time()
+
+    def check(self) -> bool:
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except SQLAlchemyError:
+            return False
+
+    def reset(self) -> int | None:
+        with engine.begin() as conn:
+            return conn.execute(delete(RateLimitCounter.__table__)).rowcount
+
+    def clear(self, key: str) -> None:
+        tbl = RateLimitCounter.__table__
+        with engine.begin() as conn:
+            conn.execute(delete(tbl).where(tbl.c.key == key))
+
+    def _maybe_purge(self, now: float) -> None:
+        """Abgelaufene Fenster loeschen — sonst waechst die Tabelle mit jeder IP."""
+        if now < self._next_purge or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_purge = now + PURGE_INTERVAL
+            tbl = RateLimitCounter.__table__
+            with engine.begin() as conn:
+                removed = conn.execute(delete(tbl).where(tbl.c.expires_at <= now)).rowcount
+            if removed:
+                logger.debug("Rate-Limit: %d abgelaufene Zaehler entfernt", removed)
+        except SQLAlchemyError:
+            logger.warning("Rate-Limit: Aufraeumen fehlgeschlagen", exc_info=True)
+        finally:
+            self._purge_lock.release()
@@ -0,0 +1,289 @@
+"""Fernet-Key-Rotation: alle verschluesselten Spalten mit dem neuen Key neu schreiben.
+
+``MultiFernet`` liest nach einem Key-Wechsel alte Tokens weiter, neu
+verschluesselt wird aber nur, was die App ohnehin schreibt. Dieses
+Kommando zieht den Rest nach, danach kann ``DR_AUTOMATE_ENCRYPTION_KEY_OLD``
+weg::
+
+    DR_AUTOMATE_ENCRYPTION_KEY=<neu> DR_AUTOMATE_ENCRYPTION_KEY_OLD=<alt> \\
+        python rotate_keys.py --checkpoint data/rotate_keys.json
+
+Ablauf pro Tabelle (``user_profiles``, ``dienstreisen``, ``abrechnungen``,
+verschluesselte Spalten werden am Spaltentyp erkannt):
+
+- Keyset-Batches ueber den Primaerschluessel, jeweils in einer eigenen
+  kurzen Lese-Transaktion — nie die ganze Tabelle im Speicher, kein
+  langer Snapshot, der den WAL wachsen laesst.
+- ``MultiFernet.rotate`` laeuft in einem Prozess-Pool; die DB liest und
+  schreibt nur der Hauptprozess. Es sind hoechstens ``2 × Worker`` Batches
+  gleichzeitig unterwegs.
+- Zurueckgeschrieben wird pro Batch in einer Transaktion, als
+  Compare-and-Set auf den alten Token: hat die App die Zeile inzwischen
+  selbst neu geschrieben (dann schon mit dem neuen Key), bleibt sie
+  unangetastet.
+- Nach jedem Batch wird der Checkpoint (letzter Primaerschluessel je
+  Tabelle + Fingerprint des neuen Keys) geschrieben. Ein Neustart macht
+  dort weiter; mit einem anderen Key beginnt er von vorn.
+- Zeilen mit unlesbarem Token landen mit ihrem Primaerschluessel im
+  Checkpoint (``failed``) und werden beim naechsten Lauf erneut versucht
+  (z.B. nachdem der fehlende alte Key gesetzt ist). Solange welche offen
+  sind, endet das Kommando mit Exit-Code 1.
+
+Geo- und Extract-Cache (``geo_cache``, ``extract_cache``) werden nicht
+rotiert, sondern geleert: ihre Schluessel sind HMACs mit dem alten Key
+(``crypto.lookup_hash``) und treffen ohnehin nicht mehr. Das passiert nur,
+wenn sie in ``--tables`` stehen (Default: alle).
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from collections.abc import Iterator, Sequence
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from cryptography.fernet import InvalidToken
+from sqlalchemy import String, Table, and_, select, type_coerce, update
+
+import crypto
+from db import Base, engine
+
+logger = logging.getLogger(__name__)
+
+TABLES = ("user_profiles", "dienstreisen", "abrechnungen")
+# Werden nicht rotiert, sondern geleert (siehe Modul-Docstring).
+CACHE_TABLES = ("geo_cache", "extract_cache")
+DEFAULT_BATCH_SIZE = 200
+
+Row = tuple[object, tuple[str | None, ...]]  # (Primaerschluessel, Tokens je Spalte)
+
+
+@dataclass
+class TableStats:
+    rows: int = 0
+    rotated: int = 0
+    skipped: int = 0  # zwischenzeitlich von der App geschrieben
+    failed: list = field(default_factory=list)  # Primaerschluessel mit unlesbarem Token
+    bytes: int = 0
+
+
+def key_fingerprint() -> str:
+    """Kurzer Fingerprint des aktuellen Primaer-Keys (fuer den Checkpoint, nicht der Key selbst)."""
+    primary = os.environ.get("DR_AUTOMATE_ENCRYPTION_KEY", "").strip()
+    return hashlib.sha256(b"dr-automate-rotation:" + primary.encode()).hexdigest()[:16]
+
+
+def encrypted_columns(table: Table) -> list[str]:
+    return [c.name for c in table.columns if isinstance(c.type, crypto.EncryptedString | crypto.EncryptedJSON)]
+
+
+def rotate_rows(rows: list[Row]) -> tuple[list[tuple[object, tuple, tuple]], list[object]]:
+    """Worker: Tokens mit dem Primaer-Key neu verschluesseln.
+
+    Returns: ([(pk, alte Tokens, neue Tokens)], [pk mit unlesbarem Token])
+    """
+    fernet = crypto.get_fernet()
+    out, failed = [], []
+    for pk, tokens in rows:
+        try:
+            new = tuple(fernet.rotate(t.encode("ascii")).decode("ascii") if t else t for t in tokens)
+        except InvalidToken:
+            failed.append(pk)
+            continue
+        out.append((pk, tokens, new))
+    return out, failed
+
+
+def _init_worker(primary: str, old: str) -> None:
+    # Der Forkserver kann aelter sein als die aktuelle Key-Konfiguration.
+    os.environ["DR_AUTOMATE_ENCRYPTION_KEY"] = primary
+    os.environ["DR_AUTOMATE_ENCRYPTION_KEY_OLD"] = old
+    crypto._fernet = None
+
+
+def _load_checkpoint(path: str | None) -> dict:
+    if path and os.path.isfile(path):
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("key") == key_fingerprint():
+            return state
+        logger.warning("Checkpoint %s gehoert zu einem anderen Key — beginne von vorn", path)
+    return {"key": key_fingerprint(), "tables": {}}
+
+
+def _save_checkpoint(path: str | None, state: dict) -> None:
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)  # atomar: ein Abbruch hinterlaesst nie einen halben Checkpoint
+
+
+def _batches(table: Table, pk_name: str, columns: list[str], after, batch_size: int) -> Iterator[list[Row]]:
+    pk = table.c[pk_name]
+    cols = [type_coerce(table.c[name], String) for name in columns]  # rohe Tokens, nicht entschluesselt
+    while True:
+        stmt = select(pk, *cols).order_by(pk).limit(batch_size)
+        if after is not None:
+            stmt = stmt.where(pk > after)
+        with engine.connect() as conn:
+            rows = [(r[0], tuple(r[1:])) for r in conn.execute(stmt)]
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][0]
+
+
+def _rows_by_pk(table: Table, pk_name: str, columns: list[str], pks: list, batch_size: int) -> Iterator[list[Row]]:
+    pk = table.c[pk_name]
+    cols = [type_coerce(table.c[name], String) for name in columns]
+    for i in range(0, len(pks), batch_size):
+        stmt = select(pk, *cols).where(pk.in_(pks[i : i + batch_size])).order_by(pk)
+        with engine.connect() as conn:
+            rows = [(r[0], tuple(r[1:])) for r in conn.execute(stmt)]
+        if rows:
+            yield rows
+
+
+def _write_back(table: Table, pk_name: str, columns: list[str], rotated: list[tuple[object, tuple, tuple]]) -> int:
+    written = 0
+    with engine.begin() as conn:
+        for pk, old, new in rotated:
+            unchanged = [table.c[name].is_(type_coerce(o, String)) for name, o in zip(columns, old, strict=True)]
+            values = {name: type_coerce(n, String) for name, n in zip(columns, new, strict=True)}
+            stmt = update(table).where(table.c[pk_name] == pk, and_(*unchanged)).values(values)
+            written += conn.execute(stmt).rowcount
+    return written
+
+
+def rotate_table(
+    name: str, executor: Executor | None, state: dict, checkpoint: str | None, batch_size: int, max_inflight: int
+) -> TableStats:
+    table = Base.metadata.tables[name]
+    (pk_col,) = table.primary_key.columns
+    columns = encrypted_columns(table)
+    stats = TableStats()
+    progress = state["tables"].setdefault(name, {"after": None, "done": False})
+    retry = progress.setdefault("failed", [])
+    if (progress["done"] and not retry) or not columns:
+        return stats
+
+    started = time.monotonic()
+    inflight: deque[tuple[list[Row], Future | tuple]] = deque()
+
+    def write(rows: list[Row], rotated: list, failed: list) -> None:
+        written = _write_back(table, pk_col.name, columns, rotated)
+        stats.rows += len(rows)
+        stats.rotated += written
+        stats.skipped += len(rotated) - written
+        stats.failed += failed
+        stats.bytes += sum(len(t) for _, tokens in rows for t in tokens if t)
+
+    # Zeilen, die beim letzten Lauf unlesbar waren, zuerst (im Hauptprozess,
+    # es sind wenige). Inzwischen geloeschte Zeilen fallen dabei heraus.
+    for rows in _rows_by_pk(table, pk_col.name, columns, retry, batch_size):
+        write(rows, *rotate_rows(rows))
+    progress["failed"] = list(stats.failed)
+    _save_checkpoint(checkpoint, state)
+    if progress["done"]:
+        return stats
+
+    def finish_oldest() -> None:
+        rows, pending = inflight.popleft()
+        rotated, failed = pending.result() if isinstance(pending, Future) else pending
+        write(rows, rotated, failed)
+        progress["failed"] += failed
+        progress["after"] = rows[-1][0]
+        _save_checkpoint(checkpoint, state)
+        elapsed = max(time.monotonic() - started, 1e-9)
+        logger.info(
+            "%s: %d Zeilen (%.0f Zeilen/s, %.1f MB/s), bis %s=%s",
+            name,
+            stats.rows,
+            stats.rows / elapsed,
+            stats.bytes / elapsed / 1e6,
+            pk_col.name,
+            progress["after"],
+        )
+
+    for rows in _batches(table, pk_col.name, columns, progress["after"], batch_size):
+        pending = executor.submit(rotate_rows, rows) if executor is not None else rotate_rows(rows)
+        inflight.append((rows, pending))
+        # Reihenfolge bleibt erhalten: der Checkpoint rueckt nur ueber fertig geschriebene Batches vor.
+        while len(inflight) >= max_inflight:
+            finish_oldest()
+    while inflight:
+        finish_oldest()
+    progress["done"] = True
+    _save_checkpoint(checkpoint, state)
+    return stats
+
+
+def run(
+    tables: Sequence[str] = TABLES + CACHE_TABLES,
+    workers: int = 0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    checkpoint: str | None = None,
+) -> dict[str, TableStats]:
+    """Rotiert ``tables`` (Caches darunter werden geleert); ``workers`` 0 = CPU-Anzahl, 1 = ohne Pool."""
+    import models_db  # noqa: F401 — registriert die Tabellen in Base.metadata
+
+    caches = [name for name in tables if name in CACHE_TABLES]
+    tables = [name for name in tables if name not in CACHE_TABLES]
+    crypto.get_fernet()  # fehlt der Key, hier scheitern statt in jedem Worker
+    state = _load_checkpoint(checkpoint)
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    results: dict[str, TableStats] = {}
+    if workers == 1:
+        for name in tables:
+            results[name] = rotate_table(name, None, state, checkpoint, batch_size, max_inflight=1)
+    else:
+        # forkserver wie in batch_pdf: keine geerbten Locks/Verbindungen im Worker.
+        ctx = multiprocessing.get_context("forkserver")
+        keys = (os.environ.get("DR_AUTOMATE_ENCRYPTION_KEY", ""), os.environ.get("DR_AUTOMATE_ENCRYPTION_KEY_OLD", ""))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker, initargs=keys) as pool:
+            for name in tables:
+                results[name] = rotate_table(name, pool, state, checkpoint, batch_size, max_inflight=2 * workers)
+
+    if caches:
+        with engine.begin() as conn:
+            for name in caches:
+                conn.execute(Base.metadata.tables[name].delete())
+        logger.info("Caches geleert: %s", ", ".join(caches))
+    return results
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Verschluesselte Spalten mit dem aktuellen Fernet-Key neu schreiben.")
+    parser.add_argument("--tables", nargs="+", choices=TABLES + CACHE_TABLES, default=list(TABLES + CACHE_TABLES))
+    parser.add_argument("-w", "--workers", type=int, default=0, help="Worker-Prozesse (Default: CPU-Anzahl)")
+    parser.add_argument("-b", "--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Zeilen pro Batch")
+    parser.add_argument("--checkpoint", help="JSON-Datei fuer den Fortschritt (Neustart setzt dort fort)")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    results = run(args.tables, workers=args.workers, batch_size=args.batch_size, checkpoint=args.checkpoint)
+    elapsed = time.monotonic() - started
+    failed = 0
+    for name, st in results.items():
+        print(f"{name}: {st.rotated} rotiert, {st.skipped} zwischenzeitlich geaendert, {len(st.failed)} unlesbar")
+        for pk in st.failed:
+            print(f"FEHLER {name} {pk}: Token mit keinem Key lesbar", file=sys.stderr)
+        failed += len(st.failed)
+    total = sum(st.rows for st in results.values())
+    print(f"{total} Zeilen in {elapsed:.1f} s ({total / max(elapsed, 1e-9):.0f} Zeilen/s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
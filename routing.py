@@ -1,4 +1,4 @@
-"""Routing-Helper: Geocoding via Nominatim, Distanz via OSRM.
+"""Routing-Helper: Geocoding via Nominatim, Distanz via lokalem Graph/OSRM.
 
 Beide Services sind kostenfrei und ohne Account nutzbar:
 - Nominatim (OpenStreetMap): https://nominatim.openstreetmap.org
@@ -6,55 +6,258 @@ Beide Services sind kostenfrei und ohne Account nutzbar:
 - OSRM Public Demo: https://router.project-osrm.org
   Heavy-Use entmutigt, fuer privates Tool ok.
 
-Pro Address-Paar wird das Ergebnis in einem In-Memory-LRU gecached
-(Reduktion der externen Calls; Cache lebt nur waehrend des Worker-
-Prozesses, ueberlebt also keinen Container-Restart).
+Caching in zwei Stufen: ein In-Memory-LRU pro Worker-Prozess und
+dahinter der persistente TTL-Cache in der DB (``geo_cache.py``), der
+Restarts und alle Worker ueberlebt. Schluessel ist jeweils die
+normalisierte Adresse (Whitespace, Gross/Klein egal); an Nominatim und
+in Fehlermeldungen geht die Eingabe des Nutzers unveraendert. Ist
+``DR_AUTOMATE_GAZETTEER`` gesetzt, beantwortet der Offline-Index aus
+``gazetteer.py`` bekannte Orte/Strassen vor dem DB-Cache und Nominatim.
+
+Gleichzeitige Anfragen fuer dieselbe Adresse/Route werden zu einem
+externen Call zusammengefasst (Single-Flight), die Nominatim-Drossel ist
+ein Token-Bucket, der Slots reserviert und ohne gehaltene Sperre wartet.
+
+Die Distanz kommt aus austauschbaren Backends (``RoutingBackend``): ist
+``DR_AUTOMATE_ROUTING_GRAPH`` gesetzt, rechnet zuerst der lokale
+CH-Graph aus ``road_graph.py`` (offline, Millisekunden), sonst bzw. bei
+Fehlschlag der OSRM-Demo-Server.
 """
 
 from __future__ import annotations
 
 import logging
+import os
 import threading
 import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from functools import lru_cache
+from typing import Protocol
 
 import requests
+from requests.adapters import HTTPAdapter
+
+import geo_cache
+from db import DATA_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: nur prozesslokal drosseln
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
 USER_AGENT = "dr-automate/1.0 (https://dr-automate.zilinski.eu; admin@zilinski.eu)"
 NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
 OSRM_URL = "https://router.project-osrm.org/route/v1/driving"
+# Vorberechneter Strassengraph (``python road_graph.py build ...``), leer = nur OSRM.
+ROUTING_GRAPH_PATH = os.environ.get("DR_AUTOMATE_ROUTING_GRAPH", "").strip()
+# Offline-Orts-Index (``python gazetteer.py build ...``), leer = nur Nominatim.
+GAZETTEER_PATH = os.environ.get("DR_AUTOMATE_GAZETTEER", "").strip()
+
+# Eine Session fuer Nominatim und OSRM: Keep-Alive spart pro Call den
+# TCP-/TLS-Handshake. requests.Session ist fuer parallele GETs ohne
+# Cookie-Aenderungen thread-safe genug.
+_session = requests.Session()
+_session.headers["User-Agent"] = USER_AGENT
+_session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=8))
 
-# Nominatim verlangt max 1 req/s. Wir serialisieren mit einer kleinen Sperre.
-_nominatim_lock = threading.Lock()
-_last_nominatim_call = 0.0
+# Getrennte Pools: route_many wartet auf route_km, route_km auf die
+# Geocodes — im selben Pool koennten sich die Ebenen gegenseitig aushungern.
+_geocode_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="geocode")
+_route_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="route")
+
+# Nominatim verlangt max 1 req/s (mit etwas Luft: ein Token alle 1,05 s).
+NOMINATIM_INTERVAL = 1.05
+# Zustand der Nominatim-Drossel, geteilt von allen Prozessen auf dem Host
+# (gunicorn-Worker, CLI): sonst schickten N Worker N req/s.
+NOMINATIM_BUCKET_PATH = os.environ.get("DR_AUTOMATE_NOMINATIM_BUCKET", str(DATA_DIR / "nominatim.bucket"))
 
 
 class RoutingError(Exception):
     """Geocoding oder Routing fehlgeschlagen."""
 
 
+class NoRouteError(RoutingError):
+    """Beide Punkte bekannt, aber das Backend findet keine Verbindung."""
+
+
+@dataclass(frozen=True, slots=True)
+class _Address:
+    """Adresse fuer die LRU-Caches: gleich bei gleicher normalisierter Form,
+    ``text`` bleibt die Eingabe des Nutzers (fuer Nominatim und Meldungen)."""
+
+    key: str
+    text: str = field(compare=False)
+
+    @classmethod
+    def of(cls, text: str) -> _Address:
+        return cls(geo_cache.normalize(text), text.strip())
+
+
+class _TokenBucket:
+    """Token-Bucket, der Slots reserviert statt unter der Sperre zu schlafen.
+
+    ``reserve`` bucht unter einem kurzen Lock den naechsten freien Slot und
+    liefert die Wartezeit bis dahin; geschlafen wird danach ohne Lock. So
+    blockiert ein wartender Thread keine anderen beim Reservieren, und die
+    Slots bleiben trotzdem streng im Abstand ``interval``.
+
+    Mit ``path`` liegt der Bestand in einer Datei und wird unter ``flock``
+    gelesen und geschrieben — dann teilen sich alle Prozesse auf dem Host
+    einen Bucket. Ist die Datei nicht nutzbar, zaehlt der Bucket pro Prozess.
+    """
+
+    def __init__(self, interval: float, capacity: int = 1, path: str | None = None):
+        self.interval = interval
+        self.capacity = capacity
+        self.path = path if fcntl is not None else None
+        self._tokens = float(capacity)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self, now: float) -> float:
+        self._tokens = min(self.capacity, self._tokens + max(0.0, now - self._stamp) / self.interval)
+        self._stamp = now
+        self._tokens -= 1
+        # Negativer Bestand = bereits vergebene Slots in der Zukunft.
+        return max(0.0, -self._tokens * self.interval)
+
+    def _take_shared(self) -> float:
+        with open(self.path, "a+", encoding="ascii") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # gilt bis close
+            f.seek(0)
+            now = time.time()  # Prozessuebergreifend: Wanduhr statt monotonic
+            try:
+                self._tokens, self._stamp = (float(v) for v in f.read().split())
+            except ValueError:  # neue oder kaputte Datei
+                self._tokens, self._stamp = float(self.capacity), now
+            wait = self._take(now)
+            f.seek(0)
+            f.truncate()
+            f.write(f"{self._tokens!r} {self._stamp!r}")
+            return wait
+
+    def reserve(self) -> float:
+        with self._lock:
+            if self.path is not None:
+                try:
+                    return self._take_shared()
+                except OSError:
+                    logger.warning("Drossel-Datei %s nicht nutzbar, drossele nur pro Prozess", self.path, exc_info=True)
+                    self.path = None
+                    self._tokens, self._stamp = float(self.capacity), time.monotonic()
+            return self._take(time.monotonic())
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class _SingleFlight:
+    """Fasst gleichzeitige Aufrufe mit gleichem Schluessel zu einem zusammen.
+
+    Der erste Aufrufer fuehrt ``fn`` aus, alle weiteren warten auf dessen
+    Ergebnis (oder Exception) statt einen eigenen externen Call abzusetzen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, Future] = {}
+
+    def do[T](self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+_nominatim_bucket = _TokenBucket(NOMINATIM_INTERVAL, path=NOMINATIM_BUCKET_PATH)
+_inflight = _SingleFlight()
+
+
 def _rate_limit_nominatim() -> None:
-    global _last_nominatim_call
-    with _nominatim_lock:
-        delta = time.monotonic() - _last_nominatim_call
-        if delta < 1.05:
-            time.sleep(1.05 - delta)
-        _last_nominatim_call = time.monotonic()
+    _nominatim_bucket.acquire()
+
+
+_gazetteer = None
+_gazetteer_loaded = False
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Offline-Index oder None; wird beim ersten Aufruf geladen."""
+    global _gazetteer, _gazetteer_loaded
+    with _gazetteer_lock:
+        if not _gazetteer_loaded:
+            _gazetteer_loaded = True
+            if GAZETTEER_PATH:
+                import gazetteer
+
+                try:
+                    _gazetteer = gazetteer.Gazetteer(GAZETTEER_PATH)
+                    logger.info("Gazetteer geladen: %s (%d Eintraege)", GAZETTEER_PATH, len(_gazetteer))
+                except (OSError, ValueError):
+                    logger.exception("Gazetteer %s nicht ladbar — nur Nominatim", GAZETTEER_PATH)
+        return _gazetteer
+
+
+def set_gazetteer(index) -> None:
+    """Gazetteer ersetzen (Tests); ``None`` schaltet ihn ab."""
+    global _gazetteer, _gazetteer_loaded
+    with _gazetteer_lock:
+        _gazetteer, _gazetteer_loaded = index, True
 
 
-@lru_cache(maxsize=512)
 def geocode(address: str) -> tuple[float, float]:
-    """Wandelt eine Adresse via Nominatim in (lat, lon)."""
+    """Wandelt eine Adresse in (lat, lon) — Gazetteer, Caches, sonst Nominatim."""
     if not address or not address.strip():
         raise RoutingError("Adresse leer.")
+    addr = _Address.of(address)
+    return _inflight.do(f"geo:{addr.key}", lambda: _geocode_cached(addr))
+
+
+@lru_cache(maxsize=512)
+def _geocode_cached(addr: _Address) -> tuple[float, float]:
+    index = get_gazetteer()
+    if index is not None:
+        hit = index.lookup(addr.text)
+        if hit is not None:
+            geo_cache.count("gazetteer_hit")
+            return hit
+    key = geo_cache.make_key("geo", addr.key)
+    hit = geo_cache.get(key)
+    if hit is not None:
+        return hit["lat"], hit["lon"]
+    lat, lon = _geocode_nominatim(addr.text)
+    geo_cache.put(key, {"lat": lat, "lon": lon})
+    return lat, lon
+
+
+def _geocode_nominatim(address: str) -> tuple[float, float]:
     _rate_limit_nominatim()
     try:
-        r = requests.get(
+        r = _session.get(
             NOMINATIM_URL,
             params={"q": address, "format": "jsonv2", "limit": 1, "addressdetails": 0},
-            headers={"User-Agent": USER_AGENT, "Accept-Language": "de"},
+            headers={"Accept-Language": "de"},
             timeout=8,
         )
         r.raise_for_status()
@@ -67,33 +270,144 @@ def geocode(address: str) -> tuple[float, float]:
     return float(data[0]["lat"]), float(data[0]["lon"])
 
 
-@lru_cache(maxsize=512)
 def route_km(start: str, ende: str) -> dict:
-    """Routing-Schaetzung Start → Ende via OSRM-Demo.
+    """Routing-Schaetzung Start → Ende (lokaler Graph, sonst OSRM-Demo).
 
     Returns dict: km (gefahrene Strecke), duration_min.
     Hinweis: Fähren-Anteile sind in OSRM-Demo nicht zuverlaessig getaggt.
     Das Frontend zeigt einen statischen Hinweis, dass der User ggf. manuell
     Faehren-Strecke abziehen muss.
     """
+    a, b = _Address.of(start), _Address.of(ende)
+    return dict(_inflight.do(f"route:{a.key}\0{b.key}", lambda: _route_cached(a, b)))
+
+
+@lru_cache(maxsize=512)
+def _route_cached(start: _Address, ende: _Address) -> dict:
+    key = geo_cache.make_key("route", start.key, ende.key)
+    hit = geo_cache.get(key)
+    if hit is not None:
+        return hit
+    result = _route_backends(start.text, ende.text)
+    geo_cache.put(key, result)
+    return result
+
+
+class RoutingBackend(Protocol):
+    """Liefert ``{"km": ..., "duration_min": ...}`` zwischen zwei Koordinaten.
+
+    Raises:
+        RoutingError: Keine Route (das naechste Backend wird versucht)
+    """
+
+    name: str
+
+    def route(self, lat1: float, lon1: float, lat2: float, lon2: float) -> dict: ...
+
+
+class OsrmBackend:
+    """Public OSRM-Demo-Server (ohne SLA) — immer der letzte Fallback."""
+
+    name = "osrm"
+
+    def route(self, lat1: float, lon1: float, lat2: float, lon2: float) -> dict:
+        try:
+            r = _session.get(
+                f"{OSRM_URL}/{lon1},{lat1};{lon2},{lat2}",
+                params={"overview": "false", "alternatives": "false", "steps": "false"},
+                timeout=10,
+            )
+            r.raise_for_status()
+            data = r.json()
+        except requests.RequestException as e:
+            logger.warning("OSRM error: %s", e)
+            raise RoutingError(f"Routing fehlgeschlagen: {e}") from e
+        if data.get("code") != "Ok" or not data.get("routes"):
+            # Die Adressen kennt erst ``_route_backends`` — es ergaenzt sie.
+            raise NoRouteError("Keine Route gefunden.")
+        route = data["routes"][0]
+        return {
+            "km": round(route["distance"] / 1000.0, 1),
+            "duration_min": round(route["duration"] / 60.0, 0),
+        }
+
+
+class LocalGraphBackend:
+    """Lokaler Strassengraph mit Contraction Hierarchies (``road_graph.py``)."""
+
+    name = "local"
+
+    def __init__(self, path: str):
+        import road_graph
+
+        self.graph = road_graph.RoadGraph(path)
+
+    def route(self, lat1: float, lon1: float, lat2: float, lon2: float) -> dict:
+        try:
+            return self.graph.route(lat1, lon1, lat2, lon2)
+        except LookupError as e:
+            raise RoutingError(str(e)) from e
+
+
+_backends: list[RoutingBackend] | None = None
+_backends_lock = threading.Lock()
+
+
+def get_backends() -> list[RoutingBackend]:
+    """Backends in Abfrage-Reihenfolge; der Graph wird beim ersten Aufruf geladen."""
+    global _backends
+    with _backends_lock:
+        if _backends is None:
+            backends: list[RoutingBackend] = []
+            if ROUTING_GRAPH_PATH:
+                try:
+                    backends.append(LocalGraphBackend(ROUTING_GRAPH_PATH))
+                    logger.info("Lokaler Routing-Graph geladen: %s", ROUTING_GRAPH_PATH)
+                except (OSError, ValueError):
+                    logger.exception("Routing-Graph %s nicht ladbar — nur OSRM", ROUTING_GRAPH_PATH)
+            backends.append(OsrmBackend())
+            _backends = backends
+        return _backends
+
+
+def set_backends(backends: list[RoutingBackend] | None) -> None:
+    """Backends ersetzen (Tests); ``None`` laedt beim naechsten Aufruf neu aus der Config."""
+    global _backends
+    with _backends_lock:
+        _backends = backends
+
+
+def _route_backends(start: str, ende: str) -> dict:
+    # Beide Endpunkte parallel aufloesen: ist einer gecacht, kostet er nichts,
+    # sind beide remote, verteilt der Token-Bucket sie auf zwei Slots.
+    ende_future = _geocode_executor.submit(geocode, ende)
     lat1, lon1 = geocode(start)
-    lat2, lon2 = geocode(ende)
-    try:
-        r = requests.get(
-            f"{OSRM_URL}/{lon1},{lat1};{lon2},{lat2}",
-            params={"overview": "false", "alternatives": "false", "steps": "false"},
-            headers={"User-Agent": USER_AGENT},
-            timeout=10,
-        )
-        r.raise_for_status()
-        data = r.json()
-    except requests.RequestException as e:
-        logger.warning("OSRM error: %s", e)
-        raise RoutingError(f"Routing fehlgeschlagen: {e}") from e
-    if data.get("code") != "Ok" or not data.get("routes"):
-        raise RoutingError(f"Keine Route zwischen {start!r} und {ende!r} gefunden.")
-    route = data["routes"][0]
-    return {
-        "km": round(route["distance"] / 1000.0, 1),
-        "duration_min": round(route["duration"] / 60.0, 0),
-    }
+    lat2, lon2 = ende_future.result()
+    error: RoutingError | None = None
+    for backend in get_backends():
+        try:
+            return backend.route(lat1, lon1, lat2, lon2)
+        except RoutingError as e:
+            logger.info("Routing-Backend %s: %s", backend.name, e)
+            error = e
+    # OSRM ist immer das letzte Backend — dessen Fehler ist der aussagekraeftigste.
+    if isinstance(error, NoRouteError):
+        raise NoRouteError(f"Keine Route zwischen {start!r} und {ende!r} gefunden.") from error
+    raise error or RoutingError("Kein Routing-Backend konfiguriert.")
+
+
+def route_many(pairs: list[tuple[str, str]]) -> list[dict]:
+    """Mehrere Routen auf einmal (z.B. Hin- und Rueckreise), parallel.
+
+    Returns: eine Liste in Eingabe-Reihenfolge; fehlgeschlagene Routen als
+    ``{"error": "..."}`` statt Exception, damit eine unbekannte Adresse die
+    anderen Ergebnisse nicht verwirft.
+    """
+    futures = [_route_executor.submit(route_km, start, ende) for start, ende in pairs]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except RoutingError as e:
+            results.append({"error": str(e)})
+    return results
@@ -0,0 +1,289 @@
+"""Regelbasierter Schnellpfad fuer /extract — ohne LLM, ohne API-Key.
+
+Viele Ausschreibungen sind Standardvorlagen mit beschrifteten Zeilen::
+
+    Thema: Sensordaten im Unterricht
+    Ort: NLQ, Keßlerstraße 52, 31134 Hildesheim
+    Datum: Mittwoch, 12.03.2027
+    Uhrzeit: 9:00 – 16:00 Uhr
+
+``extract`` liest diese Zeilen mit festen Regeln und gibt das Antrag-JSON
+(Schema wie ``system_prompt.md``) samt ``confidence`` (0..1) zurueck.
+``/extract`` nutzt den Schnellpfad nur fuer Nutzer ohne API-Key und nur ab
+``DR_AUTOMATE_FAST_PATH_MIN_CONFIDENCE``; mit Key fragt es immer DeepSeek.
+
+Die Reisezeiten (``start_*``/``ende_*``) schaetzt der Schnellpfad nicht wie
+das LLM aus Strecke und Verkehrsmittel, sondern setzt ``REISE_PUFFER_MIN``
+vor Beginn bzw. nach Ende des Dienstgeschaefts. Das Ergebnis traegt dann
+``_meta.reisezeiten_geschaetzt`` und die Konfidenz wird mit
+``GESCHAETZT_FAKTOR`` multipliziert — der Nutzer muss die Zeiten im
+Review-Schritt pruefen.
+
+Gewichte der Konfidenz: Zielort mit PLZ 0,3 (ohne 0,15), Datum 0,3,
+Beginn- und Endzeit 0,25 (nur Beginn 0,1), Zweck 0,15. Widerspruechliche
+Angaben halbieren den Wert: zwei verschiedene Orte oder Termine, mehrere
+Daten in einer Zeile ohne "bis"/Strich dazwischen ("12.03. oder
+19.03.2027"), ein Tag ohne Monat, der keinem Datum zuzuordnen ist ("2. oder
+3. Mai"), eine "Zeit:"-Angabe, die nicht zu "Beginn:"/"Ende:" passt.
+Ein Ende vor dem Beginn ergibt 0.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+MIN_CONFIDENCE = float(os.environ.get("DR_AUTOMATE_FAST_PATH_MIN_CONFIDENCE", "0.9"))
+REISE_PUFFER_MIN = 60
+# Reisezeiten nur per festem Puffer geschaetzt: nie volle Konfidenz.
+GESCHAETZT_FAKTOR = 0.9
+
+_LABELS = {
+    "ort": ("ort", "veranstaltungsort", "tagungsort", "seminarort", "adresse", "anschrift"),
+    "datum": ("datum", "termin", "zeitraum", "wann"),
+    "zeit": ("uhrzeit", "zeit"),
+    "beginn": ("beginn", "start"),
+    "ende": ("ende", "schluss"),
+    "zweck": ("thema", "titel", "veranstaltung", "fortbildung", "seminar", "tagung", "workshop", "betreff"),
+}
+_LABEL_OF = {alias: key for key, aliases in _LABELS.items() for alias in aliases}
+_LINE_RE = re.compile(r"^\s*([A-Za-zÄÖÜäöüß]+)\s*:\s*(.+?)\s*$")
+
+_MONTHS = {
+    "januar": 1,
+    "jan": 1,
+    "februar": 2,
+    "feb": 2,
+    "märz": 3,
+    "maerz": 3,
+    "mär": 3,
+    "april": 4,
+    "apr": 4,
+    "mai": 5,
+    "juni": 6,
+    "jun": 6,
+    "juli": 7,
+    "jul": 7,
+    "august": 8,
+    "aug": 8,
+    "september": 9,
+    "sep": 9,
+    "sept": 9,
+    "oktober": 10,
+    "okt": 10,
+    "november": 11,
+    "nov": 11,
+    "dezember": 12,
+    "dez": 12,
+}
+_NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2})\.\s?(\d{1,2})\.(?:\s?(\d{4}|\d{2})\b)?")
+_NAMED_DATE_RE = re.compile(r"\b(\d{1,2})\.\s*([A-Za-zÄäÖöÜü]{3,9})\.?(?:\s+(\d{4}))?", re.IGNORECASE)
+# "2.-3. Mai 2027", "02. bis 04.03.2027": Tag ohne Monat vor dem Bindewort.
+_BARE_DAY_RE = re.compile(r"\b(\d{1,2})\.(?!\s?\d)")
+_TIME_RE = re.compile(r"\b([01]?\d|2[0-3])(?:[:.]([0-5]\d))?\s*(?=uhr\b|h\b|[-–—]|bis\b|\s*$)", re.IGNORECASE)
+# Zwischen zwei Daten einer Zeile: nur das macht daraus einen Zeitraum.
+_RANGE_JOIN_RE = re.compile(r"\s*,?\s*(?:[-–—]|bis(?:\s+zum)?)\s*(?:[A-Za-zÄäÖöÜü]+\.?,?\s*)?", re.IGNORECASE)
+_PLZ_RE = re.compile(r"\b\d{5}\b")
+_HOME_CITY_RE = re.compile(r"\b\d{5}\s+([^,]+?)\s*$")
+
+
+@dataclass(frozen=True, slots=True)
+class Result:
+    data: dict
+    confidence: float
+
+    @property
+    def confident(self) -> bool:
+        return self.confidence >= MIN_CONFIDENCE
+
+
+def _labelled(text: str) -> dict[str, list[tuple[int, str]]]:
+    """Feld → [(Rang des Labels, Wert)]; kleinerer Rang = spezifischeres Label."""
+    found: dict[str, list[tuple[int, str]]] = {}
+    for line in text.splitlines():
+        m = _LINE_RE.match(line)
+        if m and (key := _LABEL_OF.get(m.group(1).casefold())):
+            found.setdefault(key, []).append((_LABELS[key].index(m.group(1).casefold()), m.group(2)))
+    return found
+
+
+def _year(raw: str | None) -> int | None:
+    if not raw:
+        return None
+    return int(raw) + 2000 if len(raw) == 2 else int(raw)
+
+
+def _date_spans(value: str) -> tuple[list[tuple[date, int, int]], bool]:
+    """(Datum, Start, Ende) aller Daten in ``value``, nach Position sortiert,
+    plus ob ein Tag ohne Monat ("2." in "2. oder 3. Mai") offen blieb.
+
+    Ein Tag ohne Monat direkt vor "bis"/Strich und einem vollstaendigen Datum
+    ("2.-3. Mai 2027", "02. bis 04.03.2027") uebernimmt Monat und Jahr von
+    diesem Datum.
+    """
+    raw: list[tuple[int, int, int | None, int, int]] = []  # (Tag, Monat, Jahr, Start, Ende)
+    for m in _NUMERIC_DATE_RE.finditer(value):
+        raw.append((int(m.group(1)), int(m.group(2)), _year(m.group(3)), m.start(), m.end()))
+    for m in _NAMED_DATE_RE.finditer(value):
+        month = _MONTHS.get(m.group(2).casefold())
+        if month:
+            raw.append((int(m.group(1)), month, _year(m.group(3)), m.start(), m.end()))
+    raw.sort(key=lambda r: r[3])
+    spans = []
+    for i, (day, month, year, start, end) in enumerate(raw):
+        if year is None:
+            year = next((r[2] for r in raw[i + 1 :] if r[2] is not None), None)
+            if year is None:
+                continue
+        try:
+            spans.append((date(year, month, day), start, end))
+        except ValueError:
+            continue
+
+    unresolved = False
+    bare = []
+    for m in _BARE_DAY_RE.finditer(value):
+        if any(start <= m.start() < end for _, start, end in spans):
+            continue
+        following = next((s for s in spans if s[1] >= m.end()), None)
+        if following is None or _RANGE_JOIN_RE.fullmatch(value[m.end() : following[1]]) is None:
+            unresolved = True
+            continue
+        day = int(m.group(1))
+        # "30.-2. Mai" reicht in den Vormonat — das raet der Schnellpfad nicht.
+        if day >= following[0].day:
+            unresolved = True
+            continue
+        bare.append((following[0].replace(day=day), m.start(), m.end()))
+    return sorted(spans + bare, key=lambda s: s[1]), unresolved
+
+
+def parse_dates(value: str) -> list[date]:
+    """Alle Daten in ``value``; fehlende Jahre kommen vom naechsten Datum mit Jahr ("02.05. – 05.05.2027")."""
+    return [d for d, _, _ in _date_spans(value)[0]]
+
+
+def parse_date_range(value: str) -> tuple[list[date], bool]:
+    """Daten in ``value`` plus ob sie sich widersprechen.
+
+    Zwei Daten gelten nur mit "bis" oder Strich dazwischen als Zeitraum;
+    "12.03.2027 oder 19.03.2027" sind zwei Alternativen, kein Zeitraum.
+    Ein Tag ohne Monat, der sich keinem Datum zuordnen laesst, ist ebenfalls
+    ein Widerspruch.
+    """
+    spans, unresolved = _date_spans(value)
+    if len(spans) < 2:
+        return [d for d, _, _ in spans], unresolved
+    joined = len(spans) == 2 and _RANGE_JOIN_RE.fullmatch(value[spans[0][2] : spans[1][1]]) is not None
+    return [d for d, _, _ in spans], unresolved or not joined
+
+
+def parse_times(value: str) -> list[time]:
+    return [time(int(h), int(mm or 0)) for h, mm in _TIME_RE.findall(value)]
+
+
+def _fmt_date(d: date) -> str:
+    return d.strftime("%d.%m.%Y")
+
+
+def _fmt_time(t: time) -> str:
+    return t.strftime("%H:%M")
+
+
+def home_city(adresse_privat: str) -> str:
+    """ "Musterstr. 1, 49808 Lingen" → "Lingen" (fuer den Reiseweg)."""
+    m = _HOME_CITY_RE.search(adresse_privat or "")
+    return m.group(1) if m else ""
+
+
+def _city(zielort: str) -> str:
+    m = re.search(r"\b\d{5}\s+([^,]+)", zielort)
+    return m.group(1).strip() if m else zielort.split(",")[-1].strip()
+
+
+def extract(freitext: str, heimatort: str = "") -> Result:
+    """Antrag-JSON aus beschrifteten Zeilen; ``heimatort`` nur fuer den Reiseweg."""
+    fields = _labelled(freitext)
+    values = {key: [v for _, v in entries] for key, entries in fields.items()}
+    score, conflict = 0.0, False
+
+    orte = values.get("ort", [])
+    zielort = next((o for o in orte if _PLZ_RE.search(o)), orte[0] if orte else "")
+    conflict |= len({plz for o in orte for plz in _PLZ_RE.findall(o)}) > 1
+    if zielort:
+        score += 0.3 if _PLZ_RE.search(zielort) else 0.15
+
+    dates: list[date] = []
+    for value in values.get("datum", []):
+        found, ambiguous = parse_date_range(value)
+        dates += found
+        conflict |= ambiguous
+    conflict |= len({tuple(parse_dates(v)) for v in values.get("datum", [])}) > 1
+    if dates:
+        score += 0.3
+
+    times = [t for value in values.get("zeit", []) for t in parse_times(value)]
+    beginn_label = next((t for v in values.get("beginn", []) for t in parse_times(v)), None)
+    ende_label = next((t for v in values.get("ende", []) for t in parse_times(v)), None)
+    # "Zeit: 10 Uhr" neben "Beginn: 9 Uhr" — welche stimmt, kann nur der Mensch sagen.
+    conflict |= bool(times and beginn_label and times[0] != beginn_label)
+    conflict |= bool(len(times) > 1 and ende_label and times[-1] != ende_label)
+    beginn = times[0] if times else beginn_label
+    ende = times[-1] if len(times) > 1 else ende_label
+    if beginn and ende:
+        score += 0.25
+    elif beginn:
+        score += 0.1
+
+    zweck = min(fields.get("zweck", []), default=(0, ""))[1]
+    if zweck:
+        score += 0.15
+
+    details: dict[str, str] = {"zielort": zielort, "zweck": zweck, "reiseweg": ""}
+    if zielort:
+        ziel = _city(zielort)
+        details["reiseweg"] = f"{heimatort} -> {ziel} -> {heimatort}" if heimatort else ziel
+    if dates:
+        start_day, end_day = min(dates), max(dates)
+        beginn_at = datetime.combine(start_day, beginn or time(0))
+        ende_at = datetime.combine(end_day, ende or beginn or time(0))
+        if ende_at < beginn_at:
+            score = 0.0
+        puffer = timedelta(minutes=REISE_PUFFER_MIN)
+        details["dienstgeschaeft_beginn_datum"] = _fmt_date(start_day)
+        details["dienstgeschaeft_ende_datum"] = _fmt_date(end_day)
+        if beginn:
+            details["dienstgeschaeft_beginn_zeit"] = _fmt_time(beginn)
+            details["start_datum"] = _fmt_date((beginn_at - puffer).date())
+            details["start_zeit"] = _fmt_time((beginn_at - puffer).time())
+        if ende:
+            details["dienstgeschaeft_ende_zeit"] = _fmt_time(ende)
+            details["ende_datum"] = _fmt_date((ende_at + puffer).date())
+            details["ende_zeit"] = _fmt_time((ende_at + puffer).time())
+
+    geschaetzt = "start_zeit" in details or "ende_zeit" in details
+    confidence = round(score * (0.5 if conflict else 1.0) * (GESCHAETZT_FAKTOR if geschaetzt else 1.0), 2)
+    data = {
+        "_meta": {
+            "description": "Reisekostenantrag NRKVO",
+            "version": "RULES",
+            "confidence": confidence,
+            "reisezeiten_geschaetzt": geschaetzt,
+        },
+        "reise_details": details,
+        "zusatz_infos": {"bemerkungen_feld": ""},
+        "konfiguration_checkboxen": {
+            "dienstgeschaeft_2km_umkreis": False,
+            "anspruch_trennungsgeld": False,
+            "kosten_durch_andere_stelle": False,
+            "weitere_anmerkungen_checkbox_aktivieren": False,
+        },
+        "verzicht_erklaerung": {
+            "verzicht_tagegeld": False,
+            "verzicht_uebernachtungsgeld": False,
+            "verzicht_fahrtkosten": False,
+        },
+    }
+    return Result(data, confidence)
@@ -0,0 +1,99 @@
+"""Antrag-System-Prompt (``system_prompt.md``) laden — fuer App und CLI.
+
+Liegt eine lokal personalisierte ``system_prompt.local.md`` daneben, gewinnt
+sie. Der Text wird pro Datei, mtime und Groesse gecacht; Aenderungen greifen
+ohne Neustart. Eigenes Modul, damit ``batch_extract.py`` den Prompt laden
+kann, ohne die Flask-App (DB, Limiter, Mail, PDF-Pool) zu initialisieren.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT_FILE = "system_prompt.md"
+SYSTEM_PROMPT_LOCAL_FILE = "system_prompt.local.md"
+
+# Profil-/Beförderungs-eigene Abschnitte stehen in system_prompt.md zwischen
+# diesen Markern (als Doku für Maintainer), werden zur Laufzeit aber entfernt:
+# Antragsteller, BahnCard/Großkundenrabatt und Beförderung kommen autoritativ
+# aus Profil bzw. Reise-Abfrage, nicht aus der KI-Ausgabe.
+_PROFIL_SECTION_RE = re.compile(
+    r"^\[\[PROFIL:START\]\].*?^\[\[PROFIL:END\]\]\n?",
+    re.DOTALL | re.MULTILINE,
+)
+
+
+def strip_profile_sections(text: str) -> str:
+    """Entfernt die [[PROFIL:START]]…[[PROFIL:END]]-Blöcke und kollabiert
+    dabei entstehende Dreifach-Leerzeilen."""
+    stripped = _PROFIL_SECTION_RE.sub("", text)
+    return re.sub(r"\n{3,}", "\n\n", stripped)
+
+
+@dataclass(frozen=True, slots=True)
+class SystemPrompt:
+    path: str
+    mtime_ns: int
+    file_size: int
+    text: str  # bereits gestrippt
+
+    @property
+    def bytes(self) -> int:
+        return len(self.text.encode("utf-8"))
+
+    @property
+    def tokens_estimate(self) -> int:
+        # Grobe Faustregel (~4 Zeichen pro Token), reicht fuers Monitoring.
+        return (len(self.text) + 3) // 4
+
+
+_cached: SystemPrompt | None = None
+
+
+def snapshot() -> SystemPrompt:
+    """Gestrippter Prompt, gecacht pro Datei und mtime — Aenderungen greifen ohne Neustart."""
+    global _cached
+    try:
+        prompt_file, st = SYSTEM_PROMPT_LOCAL_FILE, os.stat(SYSTEM_PROMPT_LOCAL_FILE)
+    except FileNotFoundError:
+        prompt_file, st = SYSTEM_PROMPT_FILE, os.stat(SYSTEM_PROMPT_FILE)
+    cached = _cached
+    if (
+        cached is not None
+        and cached.path == prompt_file
+        and cached.mtime_ns == st.st_mtime_ns
+        and cached.file_size == st.st_size
+    ):
+        return cached
+    with open(prompt_file, encoding="utf-8") as f:
+        cached = SystemPrompt(prompt_file, st.st_mtime_ns, st.st_size, strip_profile_sections(f.read()))
+    _cached = cached
+    logger.info("System-Prompt geladen: %s (%d Bytes, ~%d Tokens)", prompt_file, cached.bytes, cached.tokens_estimate)
+    return cached
+
+
+def load_system_prompt() -> str:
+    """Lädt den Antrag-System-Prompt (lokal personalisierte Version bevorzugt).
+
+    Die profil-/beförderungs-eigenen Abschnitte werden immer entfernt — diese
+    Felder ergänzt das System autoritativ (Auth: serverseitig aus dem Profil,
+    Gast: clientseitig aus localStorage). Eine markerlose ``.local.md`` aus
+    Altbeständen bleibt unverändert (Strip ist dort ein No-op)."""
+    try:
+        return snapshot().text
+    except Exception as e:
+        return f"Error loading prompt file: {e}"
+
+
+def system_prompt_stats() -> dict:
+    """Groesse des aktuell geladenen Prompts fuer /health."""
+    try:
+        p = snapshot()
+    except OSError:
+        return {"loaded": False}
+    return {"loaded": True, "file": p.path, "bytes": p.bytes, "tokens_estimate": p.tokens_estimate}
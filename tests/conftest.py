@@ -51,6 +51,11 @@ def app_module():
 
     app_module.app.config["TESTING"] = True
     app_module.app.config["WTF_CSRF_ENABLED"] = False
+    # Rate-Limit-Zaehler (memory://) leben modulweit — pro Test frisch starten.
+    app_module.limiter.reset()
+    # Ebenso den User-Cache (auth.py), sonst ueberleben User aus anderen Tests.
+    app_module.auth.clear_user_cache()
+    app_module.profile_cache.clear()
     return app_module
 
 
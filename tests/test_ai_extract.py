@@ -3,14 +3,13 @@
 DeepSeek-Aufrufe sind komplett gemockt — keine echten Netzaufrufe.
 """
 
-import io
 import json
 import os
 import sys
-import urllib.error
 from unittest.mock import MagicMock, patch
 
 import pytest
+import requests
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -21,22 +20,29 @@ from app import app
 
 
 def _make_deepseek_response(content: str) -> MagicMock:
-    """Baut ein urlopen-Context-Manager-Mock, das `content` als choices[0].message.content liefert."""
+    """Baut eine Response-Attrappe fuer ``_session.post``, die `content` als choices[0].message.content liefert."""
     envelope = {"choices": [{"message": {"content": content}}]}
-    cm = MagicMock()
-    cm.__enter__.return_value.read.return_value = json.dumps(envelope).encode("utf-8")
-    cm.__exit__.return_value = False
-    return cm
+    resp = MagicMock(status_code=200)
+    resp.content = json.dumps(envelope).encode("utf-8")
+    return resp
 
 
-def _http_error(code: int) -> urllib.error.HTTPError:
-    return urllib.error.HTTPError(
-        url="https://api.deepseek.com/v1/chat/completions",
-        code=code,
-        msg="err",
-        hdrs=None,
-        fp=io.BytesIO(b'{"error":"x"}'),
-    )
+def _http_error(code: int) -> MagicMock:
+    resp = MagicMock(status_code=code)
+    resp.content = b'{"error":"x"}'
+    return resp
+
+
+def _sse_response(*chunks: str, tail: list[bytes] | None = None) -> MagicMock:
+    """Streaming-Antwort: jedes Chunk als ``data:``-Zeile, danach ``[DONE]``."""
+    lines = [b": keep-alive", b""]
+    for chunk in chunks:
+        lines += [b"data: " + json.dumps({"choices": [{"delta": {"content": chunk}}]}).encode("utf-8"), b""]
+    lines += tail if tail is not None else [b"data: [DONE]", b""]
+    resp = MagicMock(status_code=200)
+    resp.iter_lines.return_value = iter(lines)
+    resp.__enter__.return_value = resp
+    return resp
 
 
 # --- ai_extract.call_deepseek --------------------------------------------
@@ -44,14 +50,14 @@ def _http_error(code: int) -> urllib.error.HTTPError:
 
 def test_call_deepseek_returns_parsed_json():
     json_payload = '{"antragsteller": {"name": "Max"}, "reise_details": {}}'
-    with patch("ai_extract.urllib.request.urlopen", return_value=_make_deepseek_response(json_payload)):
+    with patch("ai_extract._session.post", return_value=_make_deepseek_response(json_payload)):
         result = ai_extract.call_deepseek("Reise nach Berlin", "sk-test", "prompt")
     assert result["antragsteller"]["name"] == "Max"
 
 
 def test_call_deepseek_strips_code_fences():
     fenced = '```json\n{"foo": "bar"}\n```'
-    with patch("ai_extract.urllib.request.urlopen", return_value=_make_deepseek_response(fenced)):
+    with patch("ai_extract._session.post", return_value=_make_deepseek_response(fenced)):
         result = ai_extract.call_deepseek("text", "sk-test", "prompt")
     assert result == {"foo": "bar"}
 
@@ -59,11 +65,11 @@ def test_call_deepseek_strips_code_fences():
 def test_call_deepseek_appends_sonderwuensche():
     captured = {}
 
-    def fake_urlopen(req, timeout=None):
-        captured["body"] = json.loads(req.data.decode())
+    def fake_post(url, json=None, **kwargs):
+        captured["body"] = json
         return _make_deepseek_response('{"ok": true}')
 
-    with patch("ai_extract.urllib.request.urlopen", side_effect=fake_urlopen):
+    with patch("ai_extract._session.post", side_effect=fake_post):
         ai_extract.call_deepseek("Reise A", "sk-test", "sys-prompt", sonderwuensche="PKW statt Bahn")
 
     user_msg = captured["body"]["messages"][1]["content"]
@@ -92,50 +98,91 @@ def test_call_deepseek_too_long_freitext_raises_400():
 
 
 def test_call_deepseek_http_401_maps_to_401():
-    with patch("ai_extract.urllib.request.urlopen", side_effect=_http_error(401)):
+    with patch("ai_extract._session.post", return_value=_http_error(401)):
         with pytest.raises(ai_extract.AIExtractError) as exc:
             ai_extract.call_deepseek("text", "sk-bad", "prompt")
     assert exc.value.status_code == 401
 
 
 def test_call_deepseek_http_429_maps_to_429():
-    with patch("ai_extract.urllib.request.urlopen", side_effect=_http_error(429)):
+    with patch("ai_extract._session.post", return_value=_http_error(429)):
         with pytest.raises(ai_extract.AIExtractError) as exc:
             ai_extract.call_deepseek("text", "sk-test", "prompt")
     assert exc.value.status_code == 429
 
 
 def test_call_deepseek_http_500_maps_to_502():
-    with patch("ai_extract.urllib.request.urlopen", side_effect=_http_error(500)):
+    with patch("ai_extract._session.post", return_value=_http_error(500)):
         with pytest.raises(ai_extract.AIExtractError) as exc:
             ai_extract.call_deepseek("text", "sk-test", "prompt")
     assert exc.value.status_code == 502
 
 
 def test_call_deepseek_timeout_maps_to_504():
-    with patch("ai_extract.urllib.request.urlopen", side_effect=TimeoutError("timed out")):
+    with patch("ai_extract._session.post", side_effect=requests.Timeout("timed out")):
         with pytest.raises(ai_extract.AIExtractError) as exc:
             ai_extract.call_deepseek("text", "sk-test", "prompt")
     assert exc.value.status_code == 504
 
 
 def test_call_deepseek_malformed_response_maps_to_502():
-    cm = MagicMock()
-    cm.__enter__.return_value.read.return_value = b"not json at all"
-    cm.__exit__.return_value = False
-    with patch("ai_extract.urllib.request.urlopen", return_value=cm):
+    resp = MagicMock(status_code=200)
+    resp.content = b"not json at all"
+    with patch("ai_extract._session.post", return_value=resp):
         with pytest.raises(ai_extract.AIExtractError) as exc:
             ai_extract.call_deepseek("text", "sk-test", "prompt")
     assert exc.value.status_code == 502
 
 
 def test_call_deepseek_non_json_content_maps_to_502():
-    with patch("ai_extract.urllib.request.urlopen", return_value=_make_deepseek_response("sorry, kein JSON")):
+    with patch("ai_extract._session.post", return_value=_make_deepseek_response("sorry, kein JSON")):
         with pytest.raises(ai_extract.AIExtractError) as exc:
             ai_extract.call_deepseek("text", "sk-test", "prompt")
     assert exc.value.status_code == 502
 
 
+def test_call_deepseek_connection_error_maps_to_502():
+    with patch("ai_extract._session.post", side_effect=requests.ConnectionError("refused")):
+        with pytest.raises(ai_extract.AIExtractError) as exc:
+            ai_extract.call_deepseek("text", "sk-test", "prompt")
+    assert exc.value.status_code == 502
+
+
+# --- ai_extract.stream_deepseek ------------------------------------------
+
+
+def test_stream_deepseek_reports_progress_and_result(monkeypatch):
+    monkeypatch.setattr(ai_extract, "STREAM_PROGRESS_STEP", 10)
+    resp = _sse_response('{"reise_details": ', '{"zielort": "Lüneburg"}', "}")
+    with patch("ai_extract._session.post", return_value=resp) as post:
+        events = list(ai_extract.stream_deepseek("Reise", "sk-test", "prompt"))
+    assert post.call_args.kwargs["json"]["stream"] is True
+    assert post.call_args.kwargs["stream"] is True
+    assert events[0] == ("progress", len('{"reise_details": '))
+    assert events[-1] == ("result", {"reise_details": {"zielort": "Lüneburg"}})
+
+
+def test_stream_deepseek_checks_status_before_iterating():
+    with patch("ai_extract._session.post", return_value=_http_error(429)):
+        with pytest.raises(ai_extract.AIExtractError) as exc:
+            ai_extract.stream_deepseek("text", "sk-test", "prompt")
+    assert exc.value.status_code == 429
+
+
+def test_stream_deepseek_broken_connection_maps_to_502():
+    def lines():
+        yield b'data: {"choices": [{"delta": {"content": "{"}}]}'
+        raise requests.ConnectionError("reset")
+
+    resp = _sse_response()
+    resp.iter_lines.return_value = lines()
+    with patch("ai_extract._session.post", return_value=resp):
+        events = ai_extract.stream_deepseek("text", "sk-test", "prompt")
+        with pytest.raises(ai_extract.AIExtractError) as exc:
+            list(events)
+    assert exc.value.status_code == 502
+
+
 # --- /extract Endpoint ---------------------------------------------------
 
 
@@ -149,7 +196,7 @@ def client():
 
 def test_extract_endpoint_success(client):
     json_payload = '{"reise_details": {"zielort": "Berlin"}}'
-    with patch("ai_extract.urllib.request.urlopen", return_value=_make_deepseek_response(json_payload)):
+    with patch("ai_extract._session.post", return_value=_make_deepseek_response(json_payload)):
         resp = client.post(
             "/extract",
             data={"freitext": "Reise nach Berlin"},
@@ -170,7 +217,7 @@ def test_extract_endpoint_missing_freitext(client):
 
 
 def test_extract_endpoint_invalid_key(client):
-    with patch("ai_extract.urllib.request.urlopen", side_effect=_http_error(401)):
+    with patch("ai_extract._session.post", return_value=_http_error(401)):
         resp = client.post(
             "/extract",
             data={"freitext": "Reise"},
@@ -181,7 +228,7 @@ def test_extract_endpoint_invalid_key(client):
 
 def test_extract_endpoint_strips_citations(client):
     json_with_citations = '{"reise_details": {"zielort": "Berlin [cite: 1]"}}'
-    with patch("ai_extract.urllib.request.urlopen", return_value=_make_deepseek_response(json_with_citations)):
+    with patch("ai_extract._session.post", return_value=_make_deepseek_response(json_with_citations)):
         resp = client.post(
             "/extract",
             data={"freitext": "Reise"},
@@ -194,7 +241,7 @@ def test_extract_endpoint_strips_citations(client):
 def test_extract_endpoint_does_not_log_api_key(client, caplog):
     import logging
 
-    with patch("ai_extract.urllib.request.urlopen", side_effect=_http_error(401)):
+    with patch("ai_extract._session.post", return_value=_http_error(401)):
         with caplog.at_level(logging.WARNING):
             client.post(
                 "/extract",
@@ -204,3 +251,189 @@ def test_extract_endpoint_does_not_log_api_key(client, caplog):
     all_logs = " ".join(r.getMessage() for r in caplog.records)
     assert "sk-very-secret-key-12345" not in all_logs
     assert "geheimer text" not in all_logs
+
+
+def _parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_extract_endpoint_streams_events(client):
+    resp = _sse_response('{"reise_details": {"zielort": "Berlin [cite: 1]"}}')
+    with patch("ai_extract._session.post", return_value=resp):
+        r = client.post(
+            "/extract",
+            data={"freitext": "Reise nach Berlin"},
+            headers={"X-DeepSeek-Key": "sk-test", "Accept": "text/event-stream"},
+        )
+        assert r.status_code == 200
+        assert r.mimetype == "text/event-stream"
+        events = _parse_sse(r.get_data(as_text=True))
+    assert events == [("result", {"reise_details": {"zielort": "Berlin"}})]
+
+
+def test_extract_endpoint_stream_reports_errors(client):
+    with patch("ai_extract._session.post", return_value=_http_error(401)):
+        r = client.post(
+            "/extract",
+            data={"freitext": "Reise"},
+            headers={"X-DeepSeek-Key": "sk-bad", "Accept": "text/event-stream"},
+        )
+    assert r.status_code == 401
+
+    with patch("ai_extract._session.post", return_value=_sse_response("kein JSON")):
+        r = client.post(
+            "/extract",
+            data={"freitext": "Reise"},
+            headers={"X-DeepSeek-Key": "sk-test", "Accept": "text/event-stream"},
+        )
+        events = _parse_sse(r.get_data(as_text=True))
+    assert events == [("error", {"error": "DeepSeek hat kein valides JSON geliefert", "status": 502})]
+
+
+# --- extract_cache --------------------------------------------------------
+
+
+@pytest.fixture
+def extract_cache_on(monkeypatch):
+    import app as app_module
+    import extract_cache
+
+    app_module.limiter.reset()  # /extract ist rate-limitiert, die Tests rufen es oft
+    from db import SessionLocal
+    from models_db import ExtractCacheEntry
+
+    monkeypatch.setattr(extract_cache, "TTL_SECONDS", 3600.0)
+    with SessionLocal() as s:
+        s.query(ExtractCacheEntry).delete()
+        s.commit()
+    extract_cache.reset_stats()
+    return extract_cache
+
+
+def test_extract_cache_serves_repeated_paste(client, extract_cache_on):
+    payload = '{"reise_details": {"zielort": "Oldenburg"}}'
+    with patch("ai_extract._session.post", return_value=_make_deepseek_response(payload)) as post:
+        for freitext in ("Fortbildung in  Oldenburg", "Fortbildung in Oldenburg\n"):
+            r = client.post("/extract", data={"freitext": freitext}, headers={"X-DeepSeek-Key": "sk-test"})
+            assert r.get_json()["reise_details"]["zielort"] == "Oldenburg"
+        assert post.call_count == 1
+
+        # Andere Sonderwuensche → eigener Eintrag
+        client.post(
+            "/extract",
+            data={"freitext": "Fortbildung in Oldenburg", "sonderwuensche": "mit PKW"},
+            headers={"X-DeepSeek-Key": "sk-test"},
+        )
+        assert post.call_count == 2
+
+        # Auch der Stream-Pfad nutzt den Cache
+        r = client.post(
+            "/extract",
+            data={"freitext": "Fortbildung in Oldenburg"},
+            headers={"X-DeepSeek-Key": "sk-test", "Accept": "text/event-stream"},
+        )
+        assert _parse_sse(r.get_data(as_text=True)) == [("result", {"reise_details": {"zielort": "Oldenburg"}})]
+        assert post.call_count == 2
+
+    stats = extract_cache_on.stats()
+    assert stats["hit"] == 2 and stats["miss"] == 2 and stats["entries"] == 2
+
+    # Ergebnis liegt verschluesselt in der DB
+    import sqlite3
+
+    conn = sqlite3.connect(os.environ["DR_AUTOMATE_DATABASE_URL"].removeprefix("sqlite:///"))
+    raw = [row[0] for row in conn.execute("SELECT value FROM extract_cache")]
+    conn.close()
+    assert raw and not any("Oldenburg" in v for v in raw)
+
+
+def test_extract_cache_key_depends_on_prompt_and_model(extract_cache_on):
+    key = extract_cache_on.make_key("prompt v1", "Text", "", "deepseek-chat")
+    assert key == extract_cache_on.make_key("prompt v1", " Text ", "", "deepseek-chat")
+    assert key != extract_cache_on.make_key("prompt v2", "Text", "", "deepseek-chat")
+    assert key != extract_cache_on.make_key("prompt v1", "Text", "", "deepseek-reasoner")
+
+
+def test_extract_cache_purge_caps_entries(extract_cache_on, monkeypatch):
+    monkeypatch.setattr(extract_cache_on, "MAX_ENTRIES", 2)
+    for i in range(4):
+        extract_cache_on.put(f"k{i}", {"i": i})
+    extract_cache_on.purge()
+    assert extract_cache_on.stats()["entries"] == 2
+    assert extract_cache_on.get("k0") is None
+    assert extract_cache_on.get("k3") == {"i": 3}
+
+
+def test_extract_cache_skips_oversized_results(extract_cache_on, monkeypatch):
+    monkeypatch.setattr(extract_cache_on, "MAX_VALUE_BYTES", 100)
+    extract_cache_on.put("klein", {"a": "x"})
+    extract_cache_on.put("gross", {"a": "x" * 200})
+    assert extract_cache_on.get("klein") == {"a": "x"}
+    assert extract_cache_on.get("gross") is None
+    assert extract_cache_on.stats()["too_large"] == 1
+
+
+def test_extract_cache_off_by_default(client):
+    import app as app_module
+    import extract_cache
+
+    app_module.limiter.reset()
+
+    assert not extract_cache.enabled()
+    with patch("ai_extract._session.post", return_value=_make_deepseek_response('{"a": 1}')) as post:
+        for _ in range(2):
+            client.post("/extract", data={"freitext": "Reise"}, headers={"X-DeepSeek-Key": "sk-test"})
+    assert post.call_count == 2
+
+
+def test_extract_endpoint_sends_compacted_freitext(client):
+    import app as app_module
+
+    app_module.limiter.reset()
+    captured = {}
+
+    def fake_post(url, json=None, **kwargs):
+        captured["user"] = json["messages"][1]["content"]
+        return _make_deepseek_response('{"reise_details": {"zielort": "Aurich"}}')
+
+    freitext = "Fortbildung   in Aurich\n\n\n\n--\x20\nMax Mustermann\nTel. 123\n\nGesendet von meinem iPhone"
+    with patch("ai_extract._session.post", side_effect=fake_post):
+        r = client.post("/extract", data={"freitext": freitext}, headers={"X-DeepSeek-Key": "sk-test"})
+    assert r.status_code == 200
+    assert captured["user"] == "Fortbildung in Aurich"
+    assert int(r.headers["X-Freitext-Removed-Chars"]) == len(freitext) - len("Fortbildung in Aurich")
+
+
+def test_extract_fast_path_needs_no_key(client):
+    import app as app_module
+
+    app_module.limiter.reset()
+    freitext = "Thema: Sensordaten\nOrt: 31134 Hildesheim\nDatum: 12.03.2027\nUhrzeit: 9 - 16 Uhr"
+    with patch("ai_extract._session.post") as post:
+        r = client.post("/extract", data={"freitext": freitext})
+        r_stream = client.post("/extract", data={"freitext": freitext}, headers={"Accept": "text/event-stream"})
+    post.assert_not_called()
+    assert r.status_code == 200
+    assert r.get_json()["reise_details"]["zielort"] == "31134 Hildesheim"
+    assert _parse_sse(r_stream.get_data(as_text=True)) == [("result", r.get_json())]
+
+
+def test_extract_with_key_skips_fast_path(client):
+    """Mit Key schaetzt DeepSeek die Reisezeiten — auch fuer Standardvorlagen."""
+    import app as app_module
+
+    app_module.limiter.reset()
+    freitext = "Thema: Sensordaten\nOrt: 31134 Hildesheim\nDatum: 12.03.2027\nUhrzeit: 9 - 16 Uhr"
+    with patch("ai_extract._session.post", return_value=_make_deepseek_response('{"a": 1}')) as post:
+        r = client.post("/extract", data={"freitext": freitext}, headers={"X-DeepSeek-Key": "sk-test"})
+        r_sonder = client.post(
+            "/extract",
+            data={"freitext": freitext, "sonderwuensche": "Verzicht auf Tagegeld"},
+            headers={"X-DeepSeek-Key": "sk-test"},
+        )
+    assert post.call_count == 2
+    assert r.get_json() == r_sonder.get_json() == {"a": 1}
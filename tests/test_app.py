@@ -462,18 +462,17 @@ class TestAPIEndpoints:
         response = client.post("/generate", data={"json_data": json.dumps(invalid_json_data)})
         assert response.status_code == 400
 
-    @patch("generator.fill_pdf")
-    def test_generate_with_valid_data_returns_pdf(self, mock_fill_pdf, client, valid_json_data, tmp_path):
-        """Valide Daten generieren PDF."""
-        # Mock PDF-Generierung
-        test_pdf_path = tmp_path / "test.pdf"
-        test_pdf_path.write_bytes(b"%PDF-1.4 test content")
-        mock_fill_pdf.return_value = str(test_pdf_path)
+    @patch("generator.render_pdf")
+    def test_generate_with_valid_data_returns_pdf(self, mock_render_pdf, client, valid_json_data):
+        """Valide Daten generieren PDF — direkt aus dem Speicher gestreamt."""
+        mock_render_pdf.return_value = ("20260101_DR-Antrag_Test.pdf", b"%PDF-1.4 test content")
 
         response = client.post("/generate", data={"json_data": json.dumps(valid_json_data)})
 
-        # Entweder erfolgreiche PDF-Antwort oder Fehler (wenn Template fehlt)
-        assert response.status_code in [200, 500]
+        assert response.status_code == 200
+        assert response.mimetype == "application/pdf"
+        assert response.data == b"%PDF-1.4 test content"
+        assert "20260101_DR-Antrag_Test.pdf" in response.headers["Content-Disposition"]
 
 
 # --- TESTS: EDGE CASES ---
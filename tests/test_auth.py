@@ -41,7 +41,101 @@ def test_account_request_public(guest_client):
     assert b"<form" in r.data
 
 
+def test_account_request_is_stored_and_announced_with_id(app_module, guest_client, monkeypatch):
+    from db import SessionLocal
+    from models_db import AccountRequest
+
+    sent = []
+    monkeypatch.setattr(app_module, "_send_telegram", sent.append)
+    r = guest_client.post(
+        "/account/request",
+        data={
+            "email": "neu@example.org",
+            "display_name": "Neu",
+            "begruendung": "Ich plane regelmaessig Dienstreisen zu Fortbildungen.",
+        },
+    )
+    assert r.status_code == 302
+    with SessionLocal() as s:
+        req = s.query(AccountRequest).filter_by(email="neu@example.org").one()
+    assert f"Anfrage-ID:</b> {req.id}" in sent[0]
+
+
 def test_login_required_endpoints_block_guest(guest_client):
     for path in ("/dashboard", "/profil", "/profil/json"):
         r = guest_client.get(path)
         assert r.status_code in (302, 401), f"Public access on {path}!"
+
+
+def test_user_cache_avoids_writes_on_read_path(auth_client, monkeypatch):
+    """Wiederholte Requests schreiben nicht; last_login_at kommt gesammelt und gedrosselt."""
+    from sqlalchemy import event
+
+    import auth
+    from db import SessionLocal, engine, write_behind
+    from models_db import User
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0].upper())
+
+    headers = {"Remote-User": "cache_test", "Remote-Name": "Cache Test"}
+    assert auth_client.get("/dashboard", headers=headers).status_code == 200  # legt User an
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        for _ in range(5):
+            assert auth_client.get("/dashboard", headers=headers).status_code == 200
+        assert "UPDATE" not in statements and "INSERT" not in statements
+
+        # Intervall abgelaufen: genau ein gesammeltes UPDATE.
+        monkeypatch.setattr(auth, "LAST_LOGIN_INTERVAL", 0)
+        monkeypatch.setattr(auth, "LOGIN_FLUSH_DELAY", 0)
+        with SessionLocal() as s:
+            before = s.query(User).filter_by(remote_user="cache_test").one().last_login_at
+        auth_client.get("/dashboard", headers=headers)
+        write_behind.flush()
+        assert statements.count("UPDATE") == 1
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    with SessionLocal() as s:
+        assert s.query(User).filter_by(remote_user="cache_test").one().last_login_at > before
+
+
+def test_failed_login_write_is_retried(monkeypatch):
+    """Schlaegt der Write-Behind-Job fehl, bleibt der Login faellig statt als geschrieben zu gelten."""
+    from concurrent.futures import Future
+
+    import auth
+
+    outcome = [RuntimeError("database is locked")]
+
+    def submit(job):
+        future = Future()
+        if outcome:
+            future.set_exception(outcome.pop())
+        else:
+            future.set_result(None)
+        return future
+
+    cache = auth._UserCache()
+    monkeypatch.setattr(auth, "_user_cache", cache)
+    monkeypatch.setattr(auth, "LOGIN_FLUSH_DELAY", 0)
+    monkeypatch.setattr(auth.write_behind, "submit", submit)
+    cache.logged_in(4711)
+
+    assert auth.flush_logins() == 1
+    assert 4711 not in cache._written
+    assert auth.flush_logins() == 1  # erneut faellig
+    assert 4711 in cache._written
+    assert auth.flush_logins() == 0
+
+
+def test_changed_headers_bypass_user_cache(auth_client):
+    from db import SessionLocal
+    from models_db import User
+
+    auth_client.get("/dashboard", headers={"Remote-User": "rename_test", "Remote-Name": "Alt"})
+    auth_client.get("/dashboard", headers={"Remote-User": "rename_test", "Remote-Name": "Neu"})
+    with SessionLocal() as s:
+        assert s.query(User).filter_by(remote_user="rename_test").one().display_name == "Neu"
@@ -0,0 +1,215 @@
+"""Tests fuer die Batch-Extraktion (batch_extract.py, /extract/batch)."""
+
+from __future__ import annotations
+
+import json
+import threading
+from unittest.mock import patch
+
+import pytest
+
+import batch_extract
+from ai_extract import AIExtractError
+
+STANDARDVORLAGE = "Thema: Sensordaten\nOrt: 31134 Hildesheim\nDatum: 12.03.2027\nUhrzeit: 9 - 16 Uhr"
+
+
+def _example_input():
+    with open("example_input.json") as f:
+        return json.load(f)
+
+
+def _llm_result() -> dict:
+    """Was DeepSeek liefert: alles ausser Antragsteller und Befoerderung."""
+    d = _example_input()
+    del d["antragsteller"], d["befoerderung"]
+    return d
+
+
+def _ctx(**kwargs) -> batch_extract.BatchContext:
+    example = _example_input()
+    defaults = {
+        "api_key": "sk-test",
+        "system_prompt": "prompt",
+        "basis": {"befoerderung": example["befoerderung"]},
+        "antragsteller": example["antragsteller"],
+    }
+    return batch_extract.BatchContext(**{**defaults, **kwargs})
+
+
+@pytest.fixture(autouse=True)
+def _fast_backoff(monkeypatch):
+    monkeypatch.setattr(batch_extract, "BACKOFF_INITIAL", 0.01)
+
+
+def test_throttle_backoff_doubles_and_recovers():
+    now = [0.0]
+    slept = []
+
+    def sleep(s):
+        slept.append(s)
+        now[0] += s
+
+    throttle = batch_extract.Throttle(2, sleep=sleep, clock=lambda: now[0])
+    assert throttle.rate_limited() == 0.01
+    assert throttle.rate_limited() == 0.02
+    # Alle Threads warten die Pause ab, nicht nur der, der das 429 bekam.
+    with throttle.slot():
+        pass
+    assert slept == [pytest.approx(0.02)]
+    throttle.succeeded()
+    throttle.succeeded()
+    assert throttle.rate_limited() == 0.01
+
+
+def test_batch_retries_429_and_validates_each_result():
+    calls = []
+    lock = threading.Lock()
+
+    def fake_call(freitext, **kwargs):
+        with lock:
+            calls.append(freitext)
+            first = calls.count(freitext) == 1
+        if freitext == "Einladung A" and first:
+            raise AIExtractError("Rate-Limit bei DeepSeek erreicht", status_code=429)
+        return _llm_result()
+
+    jobs = [
+        batch_extract.ExtractJob("a", "Einladung A"),
+        batch_extract.ExtractJob("vorlage", STANDARDVORLAGE),
+        batch_extract.ExtractJob("leer", "  "),
+        batch_extract.ExtractJob("b", "Einladung B"),
+    ]
+    with patch("ai_extract.call_deepseek", side_effect=fake_call):
+        results = batch_extract.extract_batch(jobs, _ctx(), concurrency=3)
+
+    assert [r.label for r in results] == ["a", "vorlage", "leer", "b"]
+    assert calls.count("Einladung A") == 2
+    # Mit Key auch die Standardvorlage per DeepSeek (Reisezeiten aus der Strecke).
+    assert "Einladung B" in calls and STANDARDVORLAGE in calls
+    assert [r.quelle for r in results] == ["deepseek", "deepseek", None, "deepseek"]
+    assert results[0].gueltig and results[3].gueltig
+    assert results[0].data["antragsteller"]["name"] == _example_input()["antragsteller"]["name"]
+    assert results[2].report() == {"label": "leer", "ok": False, "fehler": "Freitext fehlt", "status": 400}
+
+
+def test_batch_without_key_uses_rules_for_templates():
+    jobs = [batch_extract.ExtractJob("vorlage", STANDARDVORLAGE), batch_extract.ExtractJob("frei", "Reise")]
+    with patch("ai_extract.call_deepseek", side_effect=AIExtractError("API-Key fehlt", status_code=400)) as call:
+        results = batch_extract.extract_batch(jobs, _ctx(api_key=""))
+    assert [c.kwargs["freitext"] for c in call.call_args_list] == ["Reise"]
+    assert results[0].quelle == "regeln" and results[0].gueltig
+    assert results[1].status_code == 400
+
+
+def test_batch_reports_validation_errors_without_failing():
+    with patch("ai_extract.call_deepseek", return_value=_llm_result()):
+        [res] = batch_extract.extract_batch([batch_extract.ExtractJob("x", "Reise")], _ctx(basis={}))
+    report = res.report()
+    assert report["ok"] and not report["gueltig"]
+    assert "befoerderung" in report["validierung"]
+
+
+def test_batch_stops_after_invalid_key():
+    jobs = [batch_extract.ExtractJob(str(i), f"Reise {i}") for i in range(5)]
+    with patch("ai_extract.call_deepseek", side_effect=AIExtractError("API-Key ungültig", status_code=401)) as call:
+        results = batch_extract.extract_batch(jobs, _ctx(), concurrency=1)
+    assert call.call_count == 1
+    assert {r.status_code for r in results} == {401}
+
+
+def test_batch_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(batch_extract, "MAX_RETRIES", 2)
+    with patch("ai_extract.call_deepseek", side_effect=AIExtractError("Rate-Limit", status_code=429)) as call:
+        [res] = batch_extract.extract_batch([batch_extract.ExtractJob("x", "Reise")], _ctx())
+    assert call.call_count == 3
+    assert res.status_code == 429
+
+
+def test_cli_writes_report(tmp_path, monkeypatch):
+    vorlage = tmp_path / "vorlage.txt"
+    vorlage.write_text(STANDARDVORLAGE, encoding="utf-8")
+    basis = tmp_path / "basis.json"
+    example = _example_input()
+    basis.write_text(json.dumps({k: example[k] for k in ("antragsteller", "befoerderung")}), encoding="utf-8")
+    (tmp_path / "ohne_key.txt").write_text("Reise nach Berlin", encoding="utf-8")
+    out = tmp_path / "ergebnisse.json"
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+
+    rc = batch_extract.main([str(vorlage), str(tmp_path / "ohne_key.txt"), "--basis", str(basis), "-o", str(out)])
+
+    assert rc == 1
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert [(e["label"], e["ok"]) for e in report] == [("vorlage.txt", True), ("ohne_key.txt", False)]
+    assert report[0]["gueltig"]
+
+
+# --- /extract/batch -------------------------------------------------------
+
+
+def test_batch_endpoint_creates_drafts(app_module, auth_client, auth_headers):
+    headers = {**auth_headers, "Remote-User": "batch_extract_user", "X-DeepSeek-Key": "sk-test"}
+    body = {
+        "dokumente": [{"freitext": "Einladung A", "label": "A"}, {"freitext": ""}],
+        "befoerderung": _example_input()["befoerderung"],
+        "entwuerfe": True,
+    }
+    llm = _llm_result()
+    llm["antragsteller"] = _example_input()["antragsteller"]  # Profil fehlt → Fallback auf gelieferte Werte
+    with patch("ai_extract.call_deepseek", return_value=llm):
+        r = auth_client.post("/extract/batch", json=body, headers=headers)
+    assert r.status_code == 200
+    first, second = r.get_json()["ergebnisse"]
+    assert first["gueltig"] and first["label"] == "A"
+    assert second == {"label": "dokument-2", "ok": False, "fehler": "Freitext fehlt", "status": 400}
+
+    from db import SessionLocal
+    from models_db import Dienstreise, DienstreiseStatus
+
+    with SessionLocal() as s:
+        reise = s.get(Dienstreise, first["dienstreise_id"])
+        assert reise.status == DienstreiseStatus.entwurf
+        assert reise.titel == llm["reise_details"]["zweck"][:200]
+
+
+def test_batch_endpoint_rejects_bad_requests(auth_client, auth_headers, monkeypatch):
+    assert auth_client.post("/extract/batch", data="kein json", headers=auth_headers).status_code == 400
+    assert auth_client.post("/extract/batch", json={"dokumente": []}, headers=auth_headers).status_code == 400
+    monkeypatch.setattr(batch_extract, "MAX_BATCH_DOCUMENTS", 1)
+    r = auth_client.post("/extract/batch", json={"dokumente": [{}, {}]}, headers=auth_headers)
+    assert r.status_code == 400
+
+
+def test_full_batch_fits_default_rate_limit(app_module, auth_client, auth_headers):
+    app_module.limiter.reset()
+    headers = {**auth_headers, "X-DeepSeek-Key": "sk-test"}
+    n = batch_extract.MAX_BATCH_DOCUMENTS
+    assert n > int(app_module.RATE_LIMIT)
+    body = {"dokumente": [{"freitext": f"Einladung {i}"} for i in range(n)]}
+    with patch("ai_extract.call_deepseek", return_value=_llm_result()):
+        r = auth_client.post("/extract/batch", json=body, headers=headers)
+    assert r.status_code == 200
+    assert all(e["ok"] for e in r.get_json()["ergebnisse"])
+    app_module.limiter.reset()
+
+
+def test_batch_rate_limit_charges_only_deepseek_calls(app_module, auth_client, auth_headers, monkeypatch):
+    app_module.limiter.reset()
+    monkeypatch.setattr(app_module, "BATCH_EXTRACT_RATE_LIMIT", "1")
+    headers = {**auth_headers, "X-DeepSeek-Key": "sk-test"}
+    body = {"dokumente": [{"freitext": "Einladung A"}, {"freitext": ""}, {"freitext": "Einladung B"}]}
+    with patch("ai_extract.call_deepseek", return_value=_llm_result()) as call:
+        r = auth_client.post("/extract/batch", json=body, headers=headers)
+    assert r.status_code == 200
+    a, leer, b = r.get_json()["ergebnisse"]
+    # Das leere Dokument verbraucht kein Kontingent, von A und B geht genau eins durch.
+    assert leer["status"] == 400
+    assert sorted([a["ok"], b["ok"]]) == [False, True]
+    assert (a if not a["ok"] else b)["status"] == 429
+    assert call.call_count == 1
+    app_module.limiter.reset()
+
+
+def test_batch_endpoint_requires_login(client):
+    r = client.post("/extract/batch", json={"dokumente": [{"freitext": "x"}]})
+    assert r.status_code in (401, 403)
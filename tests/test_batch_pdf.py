@@ -0,0 +1,219 @@
+"""Tests fuer die Batch-PDF-Erzeugung (batch_pdf.py, /batch/generate)."""
+
+from __future__ import annotations
+
+import io
+import json
+import zipfile
+
+import pytest
+
+import batch_pdf
+
+
+def _example_input():
+    with open("example_input.json") as f:
+        return json.load(f)
+
+
+def _abrechnung_input():
+    d = _example_input()
+    d["stammdaten"] = {
+        "iban": "DE89370400440532013000",
+        "bic": "COBADEFFXXX",
+        "email": "test@example.com",
+        "abrechnende_dienststelle": "NLBV Aurich",
+    }
+    d["rkr"] = "DR"
+    d["befoerderung"]["hinreise"]["paragraph_5_nrkvo"] = "II"
+    d["befoerderung"]["rueckreise"]["paragraph_5_nrkvo"] = "II"
+    return d
+
+
+def _read_zip(data: bytes) -> tuple[zipfile.ZipFile, list[dict]]:
+    zf = zipfile.ZipFile(io.BytesIO(data))
+    return zf, json.loads(zf.read(batch_pdf.REPORT_NAME))
+
+
+def test_batch_reports_item_errors_without_failing():
+    jobs = [
+        batch_pdf.BatchJob(label="ok", art=batch_pdf.ANTRAG, data=_example_input()),
+        batch_pdf.BatchJob(label="kaputt", art=batch_pdf.ANTRAG, data={"x": 1}),
+        batch_pdf.BatchJob(label="fehlt", art=batch_pdf.ANTRAG, error="Dienstreise nicht gefunden."),
+        batch_pdf.BatchJob(label="abr", art=batch_pdf.ABRECHNUNG, data=_abrechnung_input()),
+    ]
+    zf, report = _read_zip(b"".join(batch_pdf.iter_zip(batch_pdf.render_batch(jobs, workers=1))))
+
+    assert [e["label"] for e in report] == ["ok", "kaputt", "fehlt", "abr"]
+    assert [e["ok"] for e in report] == [True, False, False, True]
+    assert report[1]["fehler"].startswith("Validierungsfehler")
+    assert report[2]["fehler"] == "Dienstreise nicht gefunden."
+    for entry in (report[0], report[3]):
+        assert zf.read(entry["datei"]).startswith(b"%PDF")
+
+
+def test_batch_entry_names_are_unique():
+    jobs = [batch_pdf.BatchJob(label=str(i), art=batch_pdf.ANTRAG, data=_example_input()) for i in range(2)]
+    zf, report = _read_zip(b"".join(batch_pdf.iter_zip(batch_pdf.render_batch(jobs, workers=1))))
+    names = [e["datei"] for e in report]
+    assert len(set(names)) == 2
+    assert set(names) <= set(zf.namelist())
+
+
+def test_batch_process_pool_keeps_order(monkeypatch):
+    monkeypatch.setattr(batch_pdf, "MIN_POOL_JOBS", 1)
+    jobs = [
+        batch_pdf.BatchJob(label="a", art=batch_pdf.ANTRAG, data=_example_input()),
+        batch_pdf.BatchJob(label="b", art="quittung", data={}),
+        batch_pdf.BatchJob(label="c", art=batch_pdf.ABRECHNUNG, data=_abrechnung_input()),
+    ]
+    results = list(batch_pdf.render_batch(jobs, workers=2))
+    assert [r.label for r in results] == ["a", "b", "c"]
+    assert results[0].pdf.startswith(b"%PDF")
+    assert "Unbekannte Art" in results[1].error
+    assert results[2].filename.startswith("20260515_DR-Abrechnung_")
+
+    # Der naechste Batch nutzt denselben Pool statt neue Prozesse zu starten.
+    pool = batch_pdf._executor[1]
+    list(batch_pdf.render_batch(jobs[:1], workers=2))
+    assert batch_pdf._executor[1] is pool
+    batch_pdf.shutdown()
+
+
+def _kill_workers(pool) -> None:
+    import os
+    import signal
+
+    for proc in list(pool._processes.values()):
+        os.kill(proc.pid, signal.SIGKILL)
+
+
+def test_killed_worker_mid_batch_renders_rest_locally(monkeypatch):
+    monkeypatch.setattr(batch_pdf, "MIN_POOL_JOBS", 1)
+    jobs = [batch_pdf.BatchJob(label=str(i), art=batch_pdf.ANTRAG, data=_example_input()) for i in range(5)]
+    results = batch_pdf.render_batch(jobs, workers=2)
+    first = next(results)
+    pool = batch_pdf._executor[1]
+    _kill_workers(pool)
+    rest = list(results)
+    assert [r.label for r in [first, *rest]] == ["0", "1", "2", "3", "4"]
+    assert all(r.error is None and r.pdf.startswith(b"%PDF") for r in rest)
+    # Defekter Pool ist verworfen, der naechste Batch startet einen neuen.
+    assert batch_pdf._executor is None
+
+
+def test_small_batch_renders_in_process(monkeypatch):
+    monkeypatch.setattr(batch_pdf, "_batch_pool", lambda *a: pytest.fail("kein Pool fuer kleine Batches"))
+    jobs = [batch_pdf.BatchJob(label="a", art=batch_pdf.ANTRAG, data=_example_input())] * 2
+    assert all(r.error is None for r in batch_pdf.render_batch(jobs, workers=4))
+
+
+def test_collect_caps_in_flight_jobs():
+    from concurrent.futures import Future
+
+    submitted = []
+
+    class FakePool:
+        def submit(self, fn, job, templates):
+            submitted.append(job.label)
+            future = Future()
+            future.set_result(batch_pdf.BatchResult(label=job.label, art=job.art))
+            return future
+
+    jobs = [batch_pdf.BatchJob(label=str(i), art=batch_pdf.ANTRAG, data={}) for i in range(6)]
+    peak = 0
+    for n, _ in enumerate(batch_pdf._collect(jobs, FakePool(), {}, window=2)):
+        peak = max(peak, len(submitted) - n)
+    assert submitted == [str(i) for i in range(6)]
+    assert peak == 2
+
+
+def test_cli_writes_zip_and_signals_errors(tmp_path):
+    good = tmp_path / "a.json"
+    good.write_text(json.dumps(_example_input()))
+    out = tmp_path / "out.zip"
+    rc = batch_pdf.main([str(good), str(tmp_path / "fehlt.json"), "-o", str(out), "-w", "1"])
+    assert rc == 1
+    _, report = _read_zip(out.read_bytes())
+    assert [e["ok"] for e in report] == [True, False]
+
+
+@pytest.fixture
+def saved_reise(auth_client, auth_headers):
+    headers = {**auth_headers, "Remote-User": "batch_user"}
+    r = auth_client.post(
+        "/generate",
+        data={"json_data": json.dumps(_example_input()), "save_to_account": "1"},
+        headers=headers,
+    )
+    assert r.status_code == 200
+    return headers, int(r.headers["X-Dienstreise-Id"])
+
+
+def test_batch_endpoint_mixes_ids_and_payloads(auth_client, saved_reise):
+    headers, reise_id = saved_reise
+    items = [
+        {"art": "antrag", "dienstreise_id": reise_id},
+        {"art": "abrechnung", "dienstreise_id": reise_id},
+        {"art": "abrechnung", "json": _abrechnung_input()},
+        {"art": "antrag"},
+    ]
+    r = auth_client.post("/batch/generate", json={"items": items}, headers=headers)
+    assert r.status_code == 200
+    assert r.mimetype == "application/zip"
+
+    _, report = _read_zip(r.data)
+    assert [e["ok"] for e in report] == [True, False, True, False]
+    assert report[1]["fehler"] == "Keine Abrechnung gespeichert."
+    assert "dienstreise_id" in report[3]["fehler"]
+
+
+def test_batch_endpoint_hides_foreign_reisen(auth_client, auth_headers, saved_reise):
+    _, reise_id = saved_reise
+    headers = {**auth_headers, "Remote-User": "batch_fremd"}
+    r = auth_client.post(
+        "/batch/generate", json={"items": [{"art": "antrag", "dienstreise_id": reise_id}]}, headers=headers
+    )
+    assert r.status_code == 200
+    _, report = _read_zip(r.data)
+    assert report == [
+        {"label": f"reise-{reise_id}", "art": "antrag", "ok": False, "fehler": "Dienstreise nicht gefunden."}
+    ]
+
+
+def test_batch_endpoint_rejects_bad_requests(auth_client, auth_headers, monkeypatch):
+    assert auth_client.post("/batch/generate", data="kein json", headers=auth_headers).status_code == 400
+    assert auth_client.post("/batch/generate", json={"items": []}, headers=auth_headers).status_code == 400
+    monkeypatch.setattr(batch_pdf, "MAX_BATCH_ITEMS", 1)
+    r = auth_client.post("/batch/generate", json={"items": [{}, {}]}, headers=auth_headers)
+    assert r.status_code == 400
+
+
+def test_batch_endpoint_requires_login(client):
+    r = client.post("/batch/generate", json={"items": [{"art": "antrag"}]})
+    assert r.status_code in (401, 403)
+
+
+def test_hung_worker_times_out_and_renders_locally(monkeypatch):
+    from concurrent.futures import Future
+
+    class HangingPool:
+        def submit(self, fn, job, templates):
+            return Future()  # wird nie fertig
+
+    broken = []
+    monkeypatch.setattr(batch_pdf.pdf_pool, "POOL_TIMEOUT", 0.01)
+    jobs = [batch_pdf.BatchJob(label=str(i), art=batch_pdf.ANTRAG, data=_example_input()) for i in range(3)]
+    results = list(batch_pdf._collect(jobs, HangingPool(), batch_pdf.DEFAULT_TEMPLATES, 2, lambda: broken.append(1)))
+    assert [r.label for r in results] == ["0", "1", "2"]
+    assert all(r.error is None and r.pdf.startswith(b"%PDF") for r in results)
+    assert broken == [1]
+
+
+def test_single_worker_app_pool_stays_free_for_generate(monkeypatch):
+    monkeypatch.setattr(batch_pdf.pdf_pool, "POOL_WORKERS", 1)
+    monkeypatch.setattr(
+        batch_pdf.pdf_pool, "get_pool", lambda: pytest.fail("Batch darf den einzigen Worker nicht belegen")
+    )
+    jobs = [batch_pdf.BatchJob(label=str(i), art=batch_pdf.ANTRAG, data=_example_input()) for i in range(5)]
+    assert all(r.error is None for r in batch_pdf.render_batch(jobs))
@@ -0,0 +1,88 @@
+"""Tests fuer die Freitext-Kompaktierung vor der KI-Extraktion (compaction.py)."""
+
+from __future__ import annotations
+
+import compaction
+
+REPLY_CHAIN = """Hallo zusammen,  ich komme mit.
+
+--\x20
+Max Mustermann
+Tel. 0491 12345
+
+Gesendet von meinem iPhone
+
+Am 02.03.2027 um 10:00 schrieb Anna Schulz <a@schule.de>:
+> Liebe Kolleginnen und Kollegen,
+> hiermit lade ich zur Fortbildung "Sensordaten im Unterricht" ein.
+> 09:00 - 16:00 Uhr Workshop im großen Saal
+> 09:00 - 16:00 Uhr Workshop im großen Saal
+>
+> Diese E-Mail enthält vertrauliche und/oder rechtlich geschützte Informationen.
+
+-----Ursprüngliche Nachricht-----
+Von: Anna Schulz
+hiermit lade ich zur Fortbildung "Sensordaten im Unterricht" ein.
+"""
+
+
+def test_reply_chain_keeps_content_drops_ballast():
+    result = compaction.compact(REPLY_CHAIN)
+    text = result.text
+    assert text.startswith("Hallo zusammen, ich komme mit.")
+    assert "Max Mustermann" not in text and "iPhone" not in text
+    assert "vertrauliche" not in text and "Ursprüngliche Nachricht" not in text
+    assert ">" not in text.replace("<a@schule.de>", "")
+    # Einladung einmal, die Wiederholung aus der Antwortkette faellt weg
+    assert text.count("Sensordaten im Unterricht") == 1
+    # Gleiche Zeilen innerhalb eines Abschnitts bleiben (z.B. zwei Tage)
+    assert text.count("09:00 - 16:00 Uhr Workshop") == 2
+    assert result.removed_chars == len(REPLY_CHAIN) - len(text)
+    assert result.removed_tokens_estimate == result.removed_chars // 4
+
+
+def test_html_remnants_are_flattened():
+    html = '<div style="x">Ort: <b>Aurich</b></div><style>p{color:red}</style><p>Beginn&nbsp;9 Uhr</p>'
+    assert compaction.compact(html).text == "Ort: Aurich\nBeginn 9 Uhr"
+
+
+def test_plain_text_with_angle_brackets_is_untouched():
+    text = "Lingen -> Wangerooge -> Lingen, Kosten < 100 EUR und Teilnehmer > 5"
+    result = compaction.compact(text)
+    assert result.text == text and result.removed_chars == 0
+
+
+def test_compaction_is_idempotent_and_never_empties():
+    once = compaction.compact(REPLY_CHAIN).text
+    assert compaction.compact(once).text == once
+    assert compaction.compact("Gesendet von meinem iPhone").text == "Gesendet von meinem iPhone"
+
+
+def test_footer_in_content_paragraph_drops_only_the_footer():
+    text = (
+        "Hallo Kollegium,\nEinladung zur Fortbildung am 12.03.2027 in Hannover, 9-16 Uhr, "
+        "Ort: Schulzentrum Mitte.\nGesendet von meinem iPhone\n\nViele Gruesse\nAnna"
+    )
+    assert compaction.compact(text).text == (
+        "Hallo Kollegium,\nEinladung zur Fortbildung am 12.03.2027 in Hannover, 9-16 Uhr, "
+        "Ort: Schulzentrum Mitte.\n\nViele Gruesse\nAnna"
+    )
+
+
+def test_disclaimer_drops_only_the_trailing_block():
+    text = (
+        "Ort: Hannover\nDatum: 12.03.2027\nDiese E-Mail enthält vertrauliche Informationen.\n"
+        "Wenn Sie nicht der richtige Adressat sind, informieren Sie den Absender.\n\nAnmeldung bis 01.02."
+    )
+    assert compaction.compact(text).text == "Ort: Hannover\nDatum: 12.03.2027\n\nAnmeldung bis 01.02."
+
+
+def test_plain_separator_is_not_a_signature():
+    text = "Ort: Hannover\nZeit: 9 Uhr\n--\nProgramm:\n09:00 Begruessung\n10:00 Workshop"
+    assert compaction.compact(text).text == text
+
+
+def test_signature_only_at_the_end_of_a_message():
+    programm = "\n".join(f"{9 + i}:00 Block {i}" for i in range(12))
+    text = f"Ort: Hannover\n-- \nProgramm:\n{programm}"
+    assert "Block 11" in compaction.compact(text).text
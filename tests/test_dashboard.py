@@ -33,6 +33,30 @@ def test_save_flag_persists_reise(auth_client, auth_headers):
     assert b"badge" in dash.data
 
 
+def test_persisted_pdf_matches_response_and_is_private(auth_client, auth_headers):
+    """Das gestreamte PDF wird genau einmal (0600) unter data/pdfs/<user>/<reise> abgelegt."""
+    import os
+    import stat
+
+    headers = {**auth_headers, "Remote-User": "persist_bytes"}
+    r = auth_client.post(
+        "/generate",
+        data={"json_data": json.dumps(_example_input()), "save_to_account": "1"},
+        headers=headers,
+    )
+    assert r.status_code == 200
+    reise_id = r.headers["X-Dienstreise-Id"]
+
+    stored = auth_client.get(f"/dienstreisen/{reise_id}/antrag.pdf", headers=headers)
+    assert stored.status_code == 200
+    assert stored.data == r.data
+
+    pdf_root = os.path.join(os.environ["DR_AUTOMATE_DATA_DIR"], "pdfs")
+    matches = [os.path.join(root, f) for root, _, files in os.walk(pdf_root) for f in files if root.endswith(reise_id)]
+    assert len(matches) == 1
+    assert stat.S_IMODE(os.stat(matches[0]).st_mode) == 0o600
+
+
 def test_generate_without_save_flag_does_not_persist(auth_client, auth_headers):
     headers = {**auth_headers, "Remote-User": "nosave"}
     payload = _example_input()
@@ -141,3 +165,98 @@ def test_account_request_honeypot_blocks_bots(guest_client):
     rows = list(conn.execute("SELECT email FROM account_requests WHERE email = 'spam@example.org'"))
     conn.close()
     assert rows == [], "Bot-Eintrag wurde gespeichert!"
+
+
+def test_dashboard_does_not_decrypt_reise_json(auth_client, auth_headers, monkeypatch):
+    """Antrags-/Abrechnungs-JSON sind deferred: die Liste entschluesselt nichts."""
+    import crypto
+
+    headers = {**auth_headers, "Remote-User": "lazy_decrypt"}
+    r = auth_client.post(
+        "/generate",
+        data={"json_data": json.dumps(_example_input()), "save_to_account": "1"},
+        headers=headers,
+    )
+    reise_id = r.headers["X-Dienstreise-Id"]
+
+    decrypted = []
+    real = crypto.decrypt
+    monkeypatch.setattr(crypto, "decrypt", lambda t: decrypted.append(len(t)) or real(t))
+    assert auth_client.get("/dashboard", headers=headers).status_code == 200
+    assert not [n for n in decrypted if n > 1000]
+
+    j = auth_client.get(f"/dienstreisen/{reise_id}/antrag-json", headers=headers).get_json()
+    assert j["antrag_json"]["reise_details"]
+    assert [n for n in decrypted if n > 1000]
+
+
+def test_dashboard_keyset_pagination(auth_client, auth_headers, app_module, monkeypatch):
+    """Seiten ueberlappen nicht, auch bei gleichem created_at (Tie-Break ueber id)."""
+    import re
+
+    from db import SessionLocal
+    from models_db import Abrechnung, Dienstreise, User
+
+    headers = {**auth_headers, "Remote-User": "paging_test"}
+    assert auth_client.get("/dashboard", headers=headers).status_code == 200
+    with SessionLocal() as s:
+        user = s.query(User).filter_by(remote_user="paging_test").one()
+        reisen = [Dienstreise(user_id=user.id, titel=f"Reise-{i:02d}") for i in range(7)]
+        s.add_all(reisen)
+        s.flush()
+        s.add(Abrechnung(dienstreise_id=reisen[6].id, abrechnung_pdf_path="/tmp/abr.pdf"))
+        s.commit()
+
+    monkeypatch.setattr(app_module, "DASHBOARD_PAGE_SIZE", 3)
+    seen, url, pages = [], "/dashboard", 0
+    while url:
+        html = auth_client.get(url, headers=headers).get_data(as_text=True)
+        seen += re.findall(r"Reise-\d\d", html)
+        if pages == 0:
+            assert "Abr.-PDF" in html  # Abrechnungs-Spalten kommen aus dem Outer Join
+        more = re.search(r'href="(/dashboard\?nach=\d+)"', html)
+        url = more.group(1) if more else None
+        pages += 1
+    assert pages == 3
+    assert seen == [f"Reise-{i:02d}" for i in reversed(range(7))]
+
+
+def test_docs_guest_page_precompressed_with_etag(guest_client, app_module, monkeypatch, tmp_path):
+    """Gast-Doku kommt vorkomprimiert aus dem Cache, ETag → 304, Aenderung an der .md greift sofort."""
+    import gzip
+
+    monkeypatch.setattr(app_module, "DOCS_DIR", tmp_path)
+    doc = tmp_path / "hilfe.md"
+    doc.write_text("# Hilfe\n\n" + "Ein Absatz mit Text. " * 50, encoding="utf-8")
+
+    r = guest_client.get("/docs/hilfe", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["Vary"]
+    html = gzip.decompress(r.data).decode("utf-8")
+    assert "<h1" in html and "Ein Absatz" in html
+    etag = r.headers["ETag"]
+
+    r = guest_client.get("/docs/hilfe", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert r.status_code == 304
+
+    r = guest_client.get("/docs/hilfe")
+    assert "Content-Encoding" not in r.headers
+    assert r.get_data(as_text=True) == html
+    assert r.headers["ETag"] != etag  # eigener ETag je Kodierung
+
+    doc.write_text("# Neu\n\n<script>alert(1)</script>kurz", encoding="utf-8")
+    r = guest_client.get("/docs/hilfe", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    body = r.get_data(as_text=True)
+    assert "Neu" in body and "<script>alert" not in body
+
+
+def test_docs_authenticated_page_not_shared(auth_client, auth_headers):
+    r = auth_client.get("/docs/faq")  # ohne Remote-User: Gast, fuellt den Seiten-Cache
+    assert r.status_code == 200
+    headers = {**auth_headers, "Remote-User": "docsleser", "Remote-Name": "Docs Leser"}
+    r = auth_client.get("/docs/faq", headers=headers)
+    assert r.status_code == 200
+    assert "Docs Leser" in r.get_data(as_text=True)
+    assert "ETag" not in r.headers
@@ -28,6 +28,128 @@ def test_encrypted_json_roundtrip():
     assert td.process_result_value(encoded, None) == payload
 
 
+def test_decrypt_cache_reuses_and_is_bounded(monkeypatch):
+    import crypto
+
+    calls = []
+    real = crypto.decrypt
+    monkeypatch.setattr(crypto, "decrypt", lambda t: calls.append(t) or real(t))
+    td = crypto.EncryptedJSON()
+    a, b, c = (td.process_bind_param({"n": i}, None) for i in range(3))
+
+    td.process_result_value(a, None)
+    td.process_result_value(a, None)
+    assert len(calls) == 2  # ohne aktiven Cache: jedes Mal entschluesseln
+
+    crypto.begin_decrypt_cache(maxsize=2)
+    try:
+        calls.clear()
+        first = td.process_result_value(a, None)
+        assert td.process_result_value(a, None) is first
+        td.process_result_value(b, None)
+        td.process_result_value(c, None)  # verdraengt a
+        assert td.process_result_value(a, None) == {"n": 0}
+        assert len(calls) == 4
+    finally:
+        crypto.end_decrypt_cache()
+
+
+def _blocked_write_behind(maxsize: int = 100, **kwargs):
+    """WriteBehind, dessen Worker am ersten Job haengt, bis ``gate`` gesetzt wird."""
+    import threading
+
+    from db import WriteBehind
+
+    wb = WriteBehind(maxsize=maxsize, linger=0, **kwargs)
+    gate = threading.Event()
+    started = threading.Event()
+    wb.submit(lambda s: started.set() or gate.wait(5))
+    assert started.wait(5)
+    return wb, gate
+
+
+def test_write_behind_commits_queued_jobs_in_one_batch():
+    from sqlalchemy import event
+
+    from db import SessionLocal, engine
+    from models_db import AccountRequest
+
+    commits = []
+
+    def count(conn):
+        commits.append(1)
+
+    wb, gate = _blocked_write_behind()
+    futures = [
+        wb.submit(lambda s, i=i: s.add(AccountRequest(email=f"wb{i}@example.org", display_name="WB"))) for i in range(5)
+    ]
+    event.listen(engine, "commit", count)
+    try:
+        gate.set()
+        wb.flush()
+    finally:
+        event.remove(engine, "commit", count)
+        wb.shutdown()
+    assert all(f.exception() is None for f in futures)
+    assert len(commits) == 1  # ein Batch fuer alle fuenf (der Gate-Job fasst die DB nicht an)
+    with SessionLocal() as s:
+        assert s.query(AccountRequest).filter(AccountRequest.email.like("wb%@example.org")).count() == 5
+
+
+def test_write_behind_isolates_failing_job():
+    from db import SessionLocal
+    from models_db import AccountRequest
+
+    wb, gate = _blocked_write_behind()
+    good = wb.submit(lambda s: s.add(AccountRequest(email="wb-ok@example.org", display_name="WB")))
+    broken = wb.submit(lambda s: 1 / 0)
+    gate.set()
+    wb.flush()
+    wb.shutdown()
+    assert good.exception() is None
+    assert isinstance(broken.exception(), ZeroDivisionError)
+    with SessionLocal() as s:
+        assert s.query(AccountRequest).filter_by(email="wb-ok@example.org").count() == 1
+
+
+def test_write_behind_disabled_and_back_pressure_write_synchronously():
+    import threading
+
+    from db import WriteBehind
+
+    callers = []
+    sync = WriteBehind(maxsize=0)
+    sync.submit(lambda s: callers.append(threading.current_thread().name))
+
+    full, gate = _blocked_write_behind(maxsize=1, put_timeout=0.05)
+    try:
+        full.submit(lambda s: None)  # fuellt die Queue
+        full.submit(lambda s: callers.append(threading.current_thread().name))  # Queue voll → synchron
+    finally:
+        gate.set()
+        full.shutdown()
+    assert callers == [threading.current_thread().name] * 2
+
+
+def test_write_behind_shutdown_does_not_hang_on_full_queue(monkeypatch):
+    import time
+
+    import db
+
+    logged = []
+    monkeypatch.setattr(db.logger, "error", lambda msg, *args: logged.append(msg % args))
+    wb, gate = _blocked_write_behind(maxsize=1, put_timeout=0.05)
+    try:
+        waiting = wb.submit(lambda s: None)  # fuellt die Queue, Worker haengt
+        started = time.monotonic()
+        wb.shutdown(timeout=0.1)
+        assert time.monotonic() - started < 2
+        assert isinstance(waiting.exception(timeout=1), RuntimeError)
+        assert logged == ["Write-Behind: 1 wartende Jobs beim Beenden verworfen"]
+    finally:
+        gate.set()
+
+
 def test_models_db_imports():
     """Wenn das Schema kaputt ist, scheitert der Import."""
     from models_db import AbrechnungStatus, AccountRequest, DienstreiseStatus, User, UserProfile  # noqa: F401
@@ -102,3 +224,35 @@ def test_profile_persistence(auth_client, auth_headers):
     for iban_raw, adr_raw in rows:
         assert iban_raw and not iban_raw.startswith("DE"), f"IBAN nicht verschluesselt: {iban_raw!r}"
         assert adr_raw and "Geheimstr" not in adr_raw, "Adresse nicht verschluesselt!"
+
+
+def test_profile_snapshot_shared_and_invalidated_on_save(auth_client, auth_headers, monkeypatch):
+    """Seiten, /profil/json und /extract teilen einen Snapshot; /profil POST invalidiert ihn."""
+    import profile_cache
+
+    loads = []
+    real_load = profile_cache._load
+    monkeypatch.setattr(profile_cache, "_load", lambda uid: loads.append(uid) or real_load(uid))
+
+    headers = {**auth_headers, "Remote-User": "snapshottest"}
+    auth_client.post("/profil", data={"vorname": "Alt", "deepseek_api_key": "sk-alt"}, headers=headers)
+    loads.clear()
+    for _ in range(3):
+        assert auth_client.get("/", headers=headers).status_code == 200
+    assert auth_client.get("/profil/json", headers=headers).get_json()["vorname"] == "Alt"
+    assert len(loads) == 1
+
+    auth_client.post("/profil", data={"vorname": "Neu"}, headers=headers)
+    assert auth_client.get("/profil/json", headers=headers).get_json()["vorname"] == "Neu"
+    assert len(loads) == 2
+
+
+def test_profile_snapshot_load_racing_invalidate_is_not_cached():
+    import profile_cache
+
+    cache = profile_cache._ProfileCache()
+    hit, _, generation = cache.get(1)
+    assert not hit
+    cache.invalidate(1)  # profil_save, waehrend der Request noch laedt
+    cache.put(1, profile_cache.ProfileSnapshot(vorname="Alt"), generation)
+    assert cache.get(1)[0] is False
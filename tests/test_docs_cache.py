@@ -0,0 +1,67 @@
+"""Tests fuer den Render-Cache der Doku (docs_cache.py, /docs/<slug>)."""
+
+from __future__ import annotations
+
+import os
+
+import pytest
+
+import docs_cache
+
+# Lang genug, dass docs_cache die Seite komprimiert (MIN_COMPRESS_BYTES).
+SEITE = "# Erste Schritte\n\n" + "Ein Absatz ueber Dienstreisen. " * 40
+
+
+@pytest.fixture
+def docs_dir(app_module, tmp_path, monkeypatch):
+    (tmp_path / "start.md").write_text(SEITE, encoding="utf-8")
+    monkeypatch.setattr(app_module, "DOCS_DIR", tmp_path)
+    docs_cache.clear()
+    yield tmp_path
+    docs_cache.clear()
+
+
+def test_matching_if_none_match_gives_304(client, docs_dir):
+    first = client.get("/docs/start")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    again = client.get("/docs/start", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+
+
+def test_gzip_and_identity_have_separate_etags(client, docs_dir):
+    plain = client.get("/docs/start")
+    gz = client.get("/docs/start", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in plain.headers
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert plain.headers["ETag"] != gz.headers["ETag"]
+    # Ein gzip-ETag darf keine 304 fuer die unkomprimierte Variante ausloesen.
+    r = client.get("/docs/start", headers={"If-None-Match": gz.headers["ETag"]})
+    assert r.status_code == 200
+
+
+def test_response_varies_on_accept_encoding(client, docs_dir):
+    r = client.get("/docs/start", headers={"Accept-Encoding": "gzip"})
+    assert "Accept-Encoding" in r.headers["Vary"]
+
+
+def test_edited_markdown_invalidates_cached_page(client, docs_dir):
+    before = client.get("/docs/start")
+    path = docs_dir / "start.md"
+    path.write_text(SEITE.replace("Erste Schritte", "Neue Fassung"), encoding="utf-8")
+    st = path.stat()
+    # mtime sicher weiterdrehen, auch wenn das Dateisystem grob aufloest.
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    after = client.get("/docs/start", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert "Neue Fassung" in after.get_data(as_text=True)
+    assert after.headers["ETag"] != before.headers["ETag"]
+
+
+def test_logged_in_users_bypass_page_cache(auth_client, auth_headers, docs_dir):
+    r = auth_client.get("/docs/start", headers={**auth_headers, "Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert "ETag" not in r.headers
+    assert "Content-Encoding" not in r.headers
+    assert docs_cache._pages == {}
@@ -0,0 +1,96 @@
+"""Tests fuer den Offline-Gazetteer (gazetteer.py)."""
+
+from __future__ import annotations
+
+import pytest
+
+import gazetteer
+
+PLACES = [
+    ("Aurich", 53.4714, 7.4836),
+    ("Schulweg, Aurich", 53.4701, 7.4792),
+    ("Hauptstraße, Göttingen", 51.5413, 9.9158),
+    ("Oldenburg (Oldb)", 53.1435, 8.2146),
+    ("Aurich", 0.0, 0.0),  # Duplikat: der erste gewinnt
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = tmp_path / "orte.gaz"
+    assert gazetteer.build(PLACES, str(path)) == 4
+    idx = gazetteer.Gazetteer(str(path))
+    yield idx
+    idx.close()
+
+
+def test_normalize_ignores_numbers_order_and_spelling():
+    assert gazetteer.normalize("Schulweg 1, Aurich") == gazetteer.normalize("aurich,  SCHULWEG")
+    assert gazetteer.normalize("Schulweg 1a, 26603 Aurich") == "26603 aurich schulweg"
+    assert gazetteer.normalize("Hauptstr. 5, Göttingen") == "goettingen hauptstrasse"
+    assert gazetteer.normalize("Lange Str. 3") == "lange strasse"
+
+
+def test_exact_lookup(index):
+    assert index.lookup("Aurich") == pytest.approx((53.4714, 7.4836))
+    assert index.lookup("Hauptstr. 12, 37073 Göttingen") == pytest.approx((51.5413, 9.9158))
+
+
+def test_fuzzy_lookup_tolerates_typos(index):
+    assert index.lookup("Oldenburg Oldb.") == pytest.approx((53.1435, 8.2146))
+    assert index.lookup("Schulwegg, Aurich") == pytest.approx((53.4701, 7.4792))
+
+
+def test_unknown_or_too_different_is_miss(index):
+    assert index.lookup("Marktplatz 2, Bremen") is None
+    assert index.lookup("Schulstraße, Aurich") is None  # Ort allein reicht nicht
+    assert index.lookup("12345") is None
+
+
+def test_fuzzy_lookup_needs_same_place(index):
+    # Ohne Ort kein Treffer auf "Hauptstrasse, Goettingen" — sonst landet jede Hauptstrasse dort.
+    assert index.lookup("Hauptstraße 5") is None
+    assert index.lookup("Hauptstrase, Göttingen") == pytest.approx((51.5413, 9.9158))
+    assert index.lookup("Hauptstraße, Göttingen-Weende") is None
+
+
+def test_postcode_disambiguates(tmp_path):
+    path = tmp_path / "plz.gaz"
+    gazetteer.build(
+        [("Bahnhofstraße, 26603 Aurich", 53.47, 7.48), ("Bahnhofstraße, 26607 Aurich", 53.48, 7.49)], str(path)
+    )
+    idx = gazetteer.Gazetteer(str(path))
+    try:
+        assert idx.lookup("Bahnhofstr. 3, 26607 Aurich") == pytest.approx((53.48, 7.49))
+        assert idx.lookup("Bahnhofstrase, 26607 Aurich") == pytest.approx((53.48, 7.49))
+        assert idx.lookup("Bahnhofstrase, Aurich") is None
+    finally:
+        idx.close()
+
+
+def test_cli_builds_from_csv(tmp_path):
+    src = tmp_path / "orte.csv"
+    src.write_text('name,lat,lon\n"Schulweg, Aurich",53.47,7.48\n', encoding="utf-8")
+    out = tmp_path / "orte.gaz"
+    assert gazetteer.main(["build", str(src), str(out)]) == 0
+    idx = gazetteer.Gazetteer(str(out))
+    try:
+        assert len(idx) == 1
+    finally:
+        idx.close()
+
+
+@pytest.mark.parametrize("size", [4, 30])
+def test_truncated_file_raises_value_error(tmp_path, size):
+    path = tmp_path / "orte.gaz"
+    gazetteer.build(PLACES, str(path))
+    path.write_bytes(path.read_bytes()[:size])
+    with pytest.raises(ValueError):
+        gazetteer.Gazetteer(str(path))
+
+
+def test_wrong_magic_raises_value_error(tmp_path):
+    path = tmp_path / "kaputt.gaz"
+    path.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError, match="Keine Gazetteer-Datei"):
+        gazetteer.Gazetteer(str(path))
@@ -0,0 +1,79 @@
+"""Tests fuer den optionalen PDF-Render-Pool (pdf_pool.py)."""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+
+import pytest
+
+import generator
+import pdf_pool
+
+ANTRAG_TEMPLATE = "forms/DR-Antrag_035_001Stand4-2025pdf.pdf"
+
+
+def _exit_outside(parent_pid: int) -> str:
+    if os.getpid() != parent_pid:
+        os._exit(1)
+    return "lokal"
+
+
+def _hang_outside(parent_pid: int) -> str:
+    if os.getpid() != parent_pid:
+        time.sleep(60)
+    return "lokal"
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(pdf_pool, "POOL_WORKERS", 1)
+    monkeypatch.setattr(pdf_pool, "_warm_paths", (ANTRAG_TEMPLATE,))
+    yield
+    pdf_pool.shutdown()
+
+
+def test_disabled_pool_runs_inline(monkeypatch):
+    monkeypatch.setattr(pdf_pool, "POOL_WORKERS", 0)
+    assert pdf_pool.run(os.getpid) == os.getpid()
+
+
+def test_pool_renders_in_worker_process(pool):
+    assert pdf_pool.run(os.getpid) != os.getpid()
+
+    with open("example_input.json") as f:
+        data = json.load(f)
+    filename, pdf = pdf_pool.run(generator.render_pdf, data, ANTRAG_TEMPLATE)
+    assert filename == generator.generate_output_filename(data)
+    assert pdf.startswith(b"%PDF")
+
+
+def test_broken_pool_falls_back_to_local_render(pool):
+    first = pdf_pool.get_pool()
+    assert pdf_pool.run(_exit_outside, os.getpid()) == "lokal"
+    # Defekter Pool wird verworfen, der naechste Job startet einen neuen.
+    assert pdf_pool.get_pool() is not first
+    assert pdf_pool.run(os.getpid) != os.getpid()
+
+
+def test_hung_job_is_terminated_and_pool_replaced(pool, monkeypatch):
+    first = pdf_pool.get_pool()
+    assert pdf_pool.run(os.getpid) != os.getpid()  # Pool warm, bevor das Timeout knapp wird
+    worker = next(iter(first._processes.values()))
+    monkeypatch.setattr(pdf_pool, "POOL_TIMEOUT", 0.5)
+    assert pdf_pool.run(_hang_outside, os.getpid()) == "lokal"
+    worker.join(timeout=5)
+    assert not worker.is_alive()
+    # Der naechste Job laeuft in einem frischen Pool statt hinter dem haengenden.
+    monkeypatch.setattr(pdf_pool, "POOL_TIMEOUT", 60)
+    assert pdf_pool.get_pool() is not first
+    assert pdf_pool.run(os.getpid) != os.getpid()
+
+
+def test_generate_route_uses_pool(pool, client):
+    with open("example_input.json") as f:
+        payload = f.read()
+    r = client.post("/generate", data={"json_data": payload})
+    assert r.status_code == 200
+    assert r.data.startswith(b"%PDF")
@@ -0,0 +1,119 @@
+"""Tests fuer die PDF-Template-Registry (pdf_templates.py)."""
+
+import json
+import os
+import shutil
+
+import pytest
+from pypdf import PdfReader
+
+import generator
+import pdf_templates
+
+ANTRAG_TEMPLATE = "forms/DR-Antrag_035_001Stand4-2025pdf.pdf"
+
+
+@pytest.fixture(autouse=True)
+def _fresh_registry():
+    pdf_templates.clear()
+    yield
+    pdf_templates.clear()
+
+
+def test_template_is_parsed_once():
+    first = pdf_templates.get_template(ANTRAG_TEMPLATE)
+    second = pdf_templates.get_template(ANTRAG_TEMPLATE)
+    assert first is second
+
+
+def test_clones_are_independent():
+    w1 = pdf_templates.clone_writer(ANTRAG_TEMPLATE)
+    w2 = pdf_templates.clone_writer(ANTRAG_TEMPLATE)
+    w1.update_page_form_field_values(w1.pages[0], {"Reiseziel": "Bremen"}, auto_regenerate=False)
+    assert w1.get_fields()["Reiseziel"].get("/V") == "Bremen"
+    assert w2.get_fields()["Reiseziel"].get("/V") != "Bremen"
+    # Das Template selbst bleibt unberuehrt
+    w3 = pdf_templates.clone_writer(ANTRAG_TEMPLATE)
+    assert w3.get_fields()["Reiseziel"].get("/V") != "Bremen"
+
+
+def test_reload_on_mtime_change(tmp_path):
+    path = tmp_path / "vordruck.pdf"
+    shutil.copy(ANTRAG_TEMPLATE, path)
+    first = pdf_templates.get_template(str(path))
+
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    second = pdf_templates.get_template(str(path))
+    assert second is not first
+
+
+def test_missing_template_raises():
+    with pytest.raises(FileNotFoundError):
+        pdf_templates.get_template("forms/gibt-es-nicht.pdf")
+
+
+def test_page_index_knows_fields_on_page_two():
+    tpl = pdf_templates.get_template(ANTRAG_TEMPLATE)
+    # Bemerkungen/Obj39 liegen auf Seite 2 — genau dafuer lief frueher die Schleife ueber alle Seiten
+    assert tpl.field_pages["Obj39"] == (1,)
+    assert tpl.field_pages["Person.Name1"]
+
+
+def test_fill_matches_pypdf_full_page_update():
+    """Widget-genaues Befuellen muss dieselben Werte setzen wie der pypdf-Weg ueber alle Seiten."""
+    with open("example_input.json") as f:
+        data = json.load(f)
+    fields = {**generator.build_text_fields(data), **generator.apply_checkbox_logic(data)}
+    tpl = pdf_templates.get_template(ANTRAG_TEMPLATE)
+
+    reference = tpl.clone()
+    for page in reference.pages:
+        reference.update_page_form_field_values(page, fields, auto_regenerate=False)
+    planned = tpl.clone()
+    tpl.fill(planned, fields)
+
+    def values(writer):
+        return {k: v.get("/V") for k, v in (writer.get_fields() or {}).items()}
+
+    assert values(planned) == values(reference)
+
+
+def test_build_text_fields_uses_compiled_plan():
+    data = {
+        "antragsteller": {"name": "Erika Muster", "adresse_privat": "Weg 1"},
+        "reise_details": {"zielort": "Bremen", "zweck": "Zeile 1\nZeile 2"},
+        "zusatz_infos": None,
+    }
+    fields = generator.build_text_fields(data)
+    assert fields["Person.Name1"] == "Erika Muster"
+    assert fields["Abfahrtsort"] == fields["RueckkehrNach"] == "Weg 1"
+    assert fields["Begruendung"] == "Zeile 1\rZeile 2"
+    assert fields["Genaue_Abfahrtsanschrift"] == ""
+    assert "Reiseweg" not in fields
+
+
+def test_stamp_text_lands_on_page_with_position(tmp_path):
+    writer = pdf_templates.clone_writer(ANTRAG_TEMPLATE)
+    pdf_templates.stamp_text(writer, 1, "Jürgen Weiß (Dr.), 01.02.2026", 70, 465)
+    out = tmp_path / "stamped.pdf"
+    with open(out, "wb") as f:
+        writer.write(f)
+
+    hits = []
+
+    def visitor(text, cm, tm, font_dict, font_size):
+        if "Jürgen" in text:
+            hits.append((text, tm[4], tm[5]))
+
+    PdfReader(str(out)).pages[1].extract_text(visitor_text=visitor)
+    assert hits == [("Jürgen Weiß (Dr.), 01.02.2026", 70, 465)]
+
+
+def test_signature_in_generated_antrag(tmp_path):
+    with open("example_input.json") as f:
+        data = json.load(f)
+    out = generator.fill_pdf(data, ANTRAG_TEMPLATE, str(tmp_path))
+
+    text = PdfReader(out).pages[1].extract_text()
+    assert data["antragsteller"]["name"] in text
@@ -12,6 +12,7 @@ from unittest.mock import patch
 import pytest
 
 import app
+import system_prompt
 from models import (
     apply_profile_authoritative,
     bahncards_to_konfig_flags,
@@ -176,11 +177,11 @@ def test_find_placeholder_detects_and_clears():
     assert find_placeholder({"antragsteller": {"name": "Malte"}}) is None
 
 
-# --- _load_system_prompt / strip -----------------------------------------
+# --- system_prompt.py -----------------------------------------
 
 
 def test_system_prompt_strips_profile_section():
-    p = app._load_system_prompt()
+    p = system_prompt.load_system_prompt()
     assert "PROFIL:" not in p
     assert '"antragsteller"' not in p
     assert '"befoerderung"' not in p
@@ -189,6 +190,30 @@ def test_system_prompt_strips_profile_section():
     assert "\n\n\n" not in p
 
 
+def test_system_prompt_cached_and_reloaded_on_change(tmp_path, monkeypatch):
+    main = tmp_path / "system_prompt.md"
+    local = tmp_path / "system_prompt.local.md"
+    main.write_text("Basis\n[[PROFIL:START]]\nraus\n[[PROFIL:END]]\nEnde\n", encoding="utf-8")
+    monkeypatch.setattr(system_prompt, "SYSTEM_PROMPT_FILE", str(main))
+    monkeypatch.setattr(system_prompt, "SYSTEM_PROMPT_LOCAL_FILE", str(local))
+    monkeypatch.setattr(system_prompt, "_cached", None)
+
+    first = system_prompt.snapshot()
+    assert first.text == "Basis\nEnde\n"
+    assert system_prompt.snapshot() is first  # unveraendert → kein erneutes Lesen
+    assert first.bytes == len("Basis\nEnde\n") and first.tokens_estimate == 3
+
+    local.write_text("Lokal personalisiert\n", encoding="utf-8")
+    assert system_prompt.load_system_prompt() == "Lokal personalisiert\n"
+    local.write_text("Lokal, geaendert und laenger\n", encoding="utf-8")
+    assert system_prompt.load_system_prompt() == "Lokal, geaendert und laenger\n"
+    local.unlink()
+    assert system_prompt.load_system_prompt() == "Basis\nEnde\n"
+
+    stats = system_prompt.system_prompt_stats()
+    assert stats == {"loaded": True, "file": str(main), "bytes": 11, "tokens_estimate": 3}
+
+
 # --- _format_reise_kontext -----------------------------------------------
 
 
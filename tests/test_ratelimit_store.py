@@ -0,0 +1,88 @@
+"""Tests fuer den DB-Rate-Limit-Storage (ratelimit_store.py)."""
+
+from __future__ import annotations
+
+import multiprocessing
+
+import pytest
+from flask import Flask
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from limits.storage import storage_from_string
+
+import ratelimit_store
+
+
+@pytest.fixture
+def storage():
+    s = storage_from_string("db://")
+    s.reset()
+    yield s
+    s.reset()
+
+
+def test_scheme_is_registered(storage):
+    assert isinstance(storage, ratelimit_store.DBStorage)
+    assert storage.check()
+
+
+def test_incr_counts_within_window(storage):
+    assert storage.get("k") == 0
+    assert storage.incr("k", 60) == 1
+    assert storage.incr("k", 60, amount=2) == 3
+    assert storage.get("k") == 3
+    assert storage.get_expiry("k") > 0
+
+
+def test_expired_window_starts_over(storage, monkeypatch):
+    storage.incr("k", 60)
+    storage.incr("k", 60)
+    now = ratelimit_store.time.time()
+    monkeypatch.setattr(ratelimit_store.time, "time", lambda: now + 61)
+    assert storage.get("k") == 0
+    assert storage.incr("k", 60) == 1
+
+
+def test_clear_and_purge(storage, monkeypatch):
+    storage.incr("a", 1)
+    storage.incr("b", 600)
+    storage.clear("b")
+    assert storage.get("b") == 0
+
+    now = ratelimit_store.time.time()
+    monkeypatch.setattr(ratelimit_store.time, "time", lambda: now + 5)
+    storage._next_purge = 0
+    storage.incr("c", 60)
+    with ratelimit_store.engine.connect() as conn:
+        keys = {row.key for row in conn.execute(ratelimit_store.RateLimitCounter.__table__.select())}
+    assert keys == {"c"}
+
+
+def _hammer(n: int) -> None:
+    s = storage_from_string("db://")
+    for _ in range(n):
+        s.incr("shared", 60)
+
+
+def test_counts_are_exact_across_processes(storage):
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_hammer, args=(25,)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=60)
+    assert [p.exitcode for p in procs] == [0, 0, 0]
+    assert storage.get("shared") == 75
+
+
+def test_limiter_enforces_limit_with_db_storage(storage):
+    app = Flask(__name__)
+    limiter = Limiter(key_func=get_remote_address, app=app, storage_uri="db://")
+
+    @app.route("/x")
+    @limiter.limit("2 per minute")
+    def x():
+        return "ok"
+
+    client = app.test_client()
+    assert [client.get("/x").status_code for _ in range(3)] == [200, 200, 429]
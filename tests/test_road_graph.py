@@ -0,0 +1,109 @@
+"""Tests fuer die lokale Routing-Engine (road_graph.py)."""
+
+from __future__ import annotations
+
+import heapq
+import math
+import random
+
+import pytest
+
+import road_graph
+
+
+def _grid(size: int, seed: int = 7):
+    """Gitter-Strassennetz mit zufaelligen Fahrzeiten und einigen Einbahnstrassen."""
+    rnd = random.Random(seed)
+    coords = [(52.0 + i * 0.01, 8.0 + j * 0.01) for i in range(size) for j in range(size)]
+    edges = []
+    for i in range(size):
+        for j in range(size):
+            x = i * size + j
+            for y in ((x + 1) if j + 1 < size else None, (x + size) if i + 1 < size else None):
+                if y is None:
+                    continue
+                secs, meters = rnd.uniform(30, 120), rnd.uniform(500, 1500)
+                edges.append((x, y, secs, meters))
+                if rnd.random() > 0.15:
+                    edges.append((y, x, secs, meters))
+    return coords, edges
+
+
+def _dijkstra(n, edges, s):
+    adj = [[] for _ in range(n)]
+    for u, v, w, _ in edges:
+        adj[u].append((v, w))
+    dist = {s: 0.0}
+    heap = [(0.0, s)]
+    while heap:
+        d, x = heapq.heappop(heap)
+        if d > dist[x]:
+            continue
+        for y, w in adj[x]:
+            if d + w < dist.get(y, math.inf):
+                dist[y] = d + w
+                heapq.heappush(heap, (d + w, y))
+    return dist
+
+
+@pytest.fixture
+def grid_graph(tmp_path):
+    coords, edges = _grid(8)
+    path = tmp_path / "grid.graph"
+    road_graph.build(coords, edges, str(path))
+    graph = road_graph.RoadGraph(str(path))
+    yield graph, coords, edges
+    graph.close()
+
+
+def test_ch_matches_plain_dijkstra(grid_graph):
+    graph, coords, edges = grid_graph
+    rnd = random.Random(1)
+    for _ in range(40):
+        s, t = rnd.randrange(len(coords)), rnd.randrange(len(coords))
+        expected = _dijkstra(len(coords), edges, s).get(t)
+        found = graph.shortest(s, t)
+        if expected is None:
+            assert found is None
+        else:
+            assert found[0] == pytest.approx(expected, rel=1e-5)
+
+
+def test_route_snaps_to_nearest_node(grid_graph):
+    graph, coords, _ = grid_graph
+    assert graph.nearest(52.0001, 8.0001)[0] == 0
+    result = graph.route(52.0, 8.0, 52.0, 8.0)
+    assert result == {"km": 0.0, "duration_min": 0.0}
+    result = graph.route(*coords[0], *coords[-1])
+    assert result["km"] > 0 and result["duration_min"] > 0
+
+
+def test_route_outside_graph_raises(grid_graph):
+    graph, _, _ = grid_graph
+    with pytest.raises(LookupError):
+        graph.route(48.1, 11.5, 52.0, 8.0)
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "kaputt.graph"
+    path.write_bytes(b"NOTAGRAPH" + bytes(32))
+    with pytest.raises(ValueError):
+        road_graph.RoadGraph(str(path))
+
+
+def test_cli_builds_from_csv(tmp_path):
+    csv_path = tmp_path / "kanten.csv"
+    csv_path.write_text(
+        "from_id,to_id,from_lat,from_lon,to_lat,to_lon,meters,seconds,oneway\n"
+        "a,b,52.00,8.00,52.00,8.01,1000,60,0\n"
+        "b,c,52.00,8.01,52.00,8.02,1000,60,1\n",
+        encoding="utf-8",
+    )
+    out = tmp_path / "mini.graph"
+    assert road_graph.main(["build", str(csv_path), str(out)]) == 0
+    graph = road_graph.RoadGraph(str(out))
+    try:
+        assert graph.shortest(0, 2) == (120.0, 2000.0)
+        assert graph.shortest(2, 0) is None  # Einbahnstrasse b → c
+    finally:
+        graph.close()
@@ -0,0 +1,142 @@
+"""Tests fuer die Fernet-Key-Rotation (rotate_keys.py)."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import String, select, type_coerce, update
+
+import crypto
+import rotate_keys
+from db import SessionLocal, engine
+from models_db import Abrechnung, Dienstreise, User, UserProfile
+
+
+@pytest.fixture
+def rows():
+    with SessionLocal() as s:
+        user = User(remote_user="rotation_test")
+        s.add(user)
+        s.flush()
+        s.add(UserProfile(user_id=user.id, iban="DE02120300000000202051", bahncards={"typ": "BC50"}))
+        reisen = [Dienstreise(user_id=user.id, titel=f"R{i}", antrag_json={"n": i}) for i in range(5)]
+        s.add_all(reisen)
+        s.flush()
+        s.add(Abrechnung(dienstreise_id=reisen[0].id, abrechnung_json={"km": 42}))
+        s.commit()
+        user_id = user.id
+    yield user_id
+    with SessionLocal() as s:
+        s.delete(s.get(User, user_id))
+        s.commit()
+
+
+def _use_keys(monkeypatch, primary: str, old: str) -> None:
+    monkeypatch.setenv("DR_AUTOMATE_ENCRYPTION_KEY", primary)
+    monkeypatch.setenv("DR_AUTOMATE_ENCRYPTION_KEY_OLD", old)
+    monkeypatch.setattr(crypto, "_fernet", None)
+
+
+def _raw_tokens(user_id: int) -> list[str]:
+    tbl = Dienstreise.__table__
+    with engine.connect() as conn:
+        return list(
+            conn.execute(select(type_coerce(tbl.c.antrag_json, String)).where(tbl.c.user_id == user_id)).scalars()
+        )
+
+
+def test_rotation_roundtrip_with_checkpoint(rows, monkeypatch, tmp_path):
+    old_key = crypto.os.environ["DR_AUTOMATE_ENCRYPTION_KEY"]
+    new_key = Fernet.generate_key().decode()
+    checkpoint = tmp_path / "rotation.json"
+
+    _use_keys(monkeypatch, new_key, old_key)
+    results = rotate_keys.run(workers=2, batch_size=2, checkpoint=str(checkpoint))
+    assert results["dienstreisen"].rotated >= 5
+    assert results["user_profiles"].rotated >= 1
+    assert not any(st.failed for st in results.values())
+    assert all(json.loads(Fernet(new_key.encode()).decrypt(t.encode())) for t in _raw_tokens(rows))
+
+    state = json.loads(checkpoint.read_text())
+    assert state["key"] == rotate_keys.key_fingerprint()
+    assert all(t["done"] for t in state["tables"].values())
+    # Fertiger Checkpoint: zweiter Lauf tut nichts.
+    assert rotate_keys.run(workers=1, checkpoint=str(checkpoint))["dienstreisen"].rows == 0
+
+    # Alter Key allein reicht nicht mehr; App liest nur mit dem neuen Key.
+    _use_keys(monkeypatch, new_key, "")
+    with SessionLocal() as s:
+        assert s.get(UserProfile, rows).iban == "DE02120300000000202051"
+        assert sorted(r.antrag_json["n"] for r in s.query(Dienstreise).filter_by(user_id=rows)) == list(range(5))
+
+    # Zurueckrotieren (ohne Pool), damit die restlichen Tests ihren Key behalten.
+    _use_keys(monkeypatch, old_key, new_key)
+    assert rotate_keys.run(workers=1, batch_size=3)["abrechnungen"].rotated >= 1
+    assert all(Fernet(old_key.encode()).decrypt(t.encode()) for t in _raw_tokens(rows))
+
+
+def test_concurrent_app_write_is_not_overwritten(rows):
+    table = Dienstreise.__table__
+    batch = next(rotate_keys._batches(table, "id", ["antrag_json"], None, 100))
+    rotated, failed = rotate_keys.rotate_rows(batch)
+    assert not failed
+
+    with SessionLocal() as s:
+        reise = s.query(Dienstreise).filter_by(user_id=rows).order_by(Dienstreise.id).first()
+        reise.antrag_json = {"n": "neu"}
+        s.commit()
+        changed_id = reise.id
+
+    written = rotate_keys._write_back(table, "id", ["antrag_json"], rotated)
+    assert written == len(rotated) - 1
+    with SessionLocal() as s:
+        assert s.get(Dienstreise, changed_id).antrag_json == {"n": "neu"}
+
+
+def test_unreadable_token_is_reported(rows):
+    bogus = Fernet(Fernet.generate_key()).encrypt(b"{}").decode()
+    rotated, failed = rotate_keys.rotate_rows([(1, (bogus,)), (2, (None,))])
+    assert failed == [1]
+    assert rotated == [(2, (None,), (None,))]
+
+
+def test_unreadable_rows_are_retried_from_checkpoint(rows, monkeypatch, tmp_path):
+    key = crypto.os.environ["DR_AUTOMATE_ENCRYPTION_KEY"]
+    stray_key = Fernet.generate_key().decode()
+    tbl = Dienstreise.__table__
+    with engine.begin() as conn:
+        reise_id = conn.execute(select(tbl.c.id).where(tbl.c.user_id == rows).limit(1)).scalar_one()
+        token = Fernet(stray_key.encode()).encrypt(b'{"n": "fremd"}').decode()
+        conn.execute(update(tbl).where(tbl.c.id == reise_id).values(antrag_json=type_coerce(token, String)))
+    checkpoint = tmp_path / "rotation.json"
+    argv = ["--tables", "dienstreisen", "--workers", "1", "--checkpoint", str(checkpoint)]
+
+    _use_keys(monkeypatch, key, "")
+    assert rotate_keys.main(argv) == 1
+    progress = json.loads(checkpoint.read_text())["tables"]["dienstreisen"]
+    assert progress["done"] and progress["failed"] == [reise_id]
+    # Ohne passenden Key bleibt die Zeile offen — auch beim zweiten Lauf.
+    assert rotate_keys.main(argv) == 1
+
+    # Mit dem fehlenden Key als altem Key holt der naechste Lauf nur sie nach.
+    _use_keys(monkeypatch, key, stray_key)
+    results = rotate_keys.run(["dienstreisen"], workers=1, checkpoint=str(checkpoint))
+    assert results["dienstreisen"].rows == 1
+    assert results["dienstreisen"].rotated == 1
+    assert json.loads(checkpoint.read_text())["tables"]["dienstreisen"]["failed"] == []
+    assert rotate_keys.main(argv) == 0
+    with SessionLocal() as s:
+        assert s.get(Dienstreise, reise_id).antrag_json == {"n": "fremd"}
+
+
+def test_caches_cleared_only_when_selected(rows):
+    import geo_cache
+
+    key = geo_cache.make_key("geo", "rotation")
+    geo_cache.put(key, {"lat": 1, "lon": 1})
+    rotate_keys.run(["dienstreisen"], workers=1)
+    assert geo_cache.get(key) is not None
+    rotate_keys.run(["dienstreisen", "geo_cache"], workers=1)
+    assert geo_cache.get(key) is None
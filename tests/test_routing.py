@@ -0,0 +1,282 @@
+"""Tests fuer routing.py und den persistenten Geo-Cache (geo_cache.py)."""
+
+from __future__ import annotations
+
+from unittest.mock import MagicMock
+
+import pytest
+
+import geo_cache
+import routing
+import ttl_cache
+from db import SessionLocal
+from models_db import GeoCacheEntry
+
+COORDS = {"schulweg 1, aurich": ("53.47", "7.48"), "marktplatz 2, bremen": ("53.07", "8.80")}
+
+
+class FakeHttp:
+    """Ersetzt requests.get: Nominatim liefert COORDS, OSRM eine feste Route."""
+
+    def __init__(self):
+        self.calls = []
+        self.queries = []
+        self.osrm = {"code": "Ok", "routes": [{"distance": 123456, "duration": 5400}]}
+
+    def __call__(self, url, params=None, **kwargs):
+        self.calls.append(url)
+        resp = MagicMock()
+        if url == routing.NOMINATIM_URL:
+            self.queries.append(params["q"])
+            hit = COORDS.get(" ".join(params["q"].split()).casefold())
+            resp.json.return_value = [{"lat": hit[0], "lon": hit[1]}] if hit else []
+        else:
+            resp.json.return_value = self.osrm
+        return resp
+
+
+@pytest.fixture
+def http(monkeypatch):
+    fake = FakeHttp()
+    monkeypatch.setattr(routing._session, "get", fake)
+    monkeypatch.setattr(routing, "_rate_limit_nominatim", lambda: None)
+    routing.set_backends([routing.OsrmBackend()])
+    routing.set_gazetteer(None)
+    _clear_memory()
+    with SessionLocal() as s:
+        s.query(GeoCacheEntry).delete()
+        s.commit()
+    geo_cache.reset_stats()
+    yield fake
+    routing.set_backends(None)
+    routing.set_gazetteer(None)
+    _clear_memory()
+
+
+def _clear_memory():
+    routing._geocode_cached.cache_clear()
+    routing._route_cached.cache_clear()
+
+
+def test_route_survives_restart_via_db_cache(http):
+    first = routing.route_km("Schulweg 1, Aurich", "Marktplatz 2, Bremen")
+    assert first == {"km": 123.5, "duration_min": 90.0}
+    assert len(http.calls) == 3  # 2x Nominatim, 1x OSRM
+
+    _clear_memory()  # simuliert Worker-Restart
+    assert routing.route_km("schulweg 1,  AURICH", "Marktplatz 2, Bremen") == first
+    assert len(http.calls) == 3
+    stats = geo_cache.stats()
+    assert stats["route_hit"] == 1
+    assert stats["route_miss"] == 1
+    assert stats["entries"] == 3
+
+
+def test_route_result_is_a_copy(http):
+    routing.route_km("Schulweg 1, Aurich", "Marktplatz 2, Bremen")["km"] = 0
+    assert routing.route_km("Schulweg 1, Aurich", "Marktplatz 2, Bremen")["km"] == 123.5
+
+
+def test_cache_stores_no_plaintext_address(http):
+    routing.geocode("Schulweg 1, Aurich")
+    with SessionLocal() as s:
+        raw = s.execute(GeoCacheEntry.__table__.select()).one()
+    assert "aurich" not in raw.key.lower()
+    assert "53.47" not in raw.value
+
+
+def test_expired_entry_is_refetched(http, monkeypatch):
+    routing.geocode("Schulweg 1, Aurich")
+    _clear_memory()
+    now = ttl_cache.time.time()
+    monkeypatch.setattr(ttl_cache.time, "time", lambda: now + geo_cache.TTL_SECONDS + 1)
+    routing.geocode("Schulweg 1, Aurich")
+    assert len(http.calls) == 2
+
+
+def test_unknown_address_is_not_cached(http):
+    with pytest.raises(routing.RoutingError):
+        routing.geocode("Nirgendwo 0")
+    assert geo_cache.stats()["entries"] == 0
+
+
+def test_nominatim_gets_the_address_as_typed(http):
+    with pytest.raises(routing.RoutingError, match="Keßlerstraße 52, Hildesheim"):
+        routing.geocode("  Keßlerstraße 52, Hildesheim")
+    assert http.queries == ["Keßlerstraße 52, Hildesheim"]
+
+
+def test_no_route_names_both_addresses(http):
+    http.osrm = {"code": "NoRoute", "routes": []}
+    with pytest.raises(routing.NoRouteError, match="'Schulweg 1, Aurich' und 'Marktplatz 2, Bremen'"):
+        routing.route_km("Schulweg 1, Aurich", "Marktplatz 2, Bremen")
+
+
+def test_purge_evicts_expired_and_overflow(http, monkeypatch):
+    now = ttl_cache.time.time()
+    geo_cache.put(geo_cache.make_key("geo", "a"), {"lat": 1, "lon": 1}, ttl=1)
+    for name, ttl in (("b", 100), ("c", 200), ("d", 300)):
+        geo_cache.put(geo_cache.make_key("geo", name), {"lat": 1, "lon": 1}, ttl=ttl)
+    monkeypatch.setattr(geo_cache, "MAX_ENTRIES", 2)
+    assert geo_cache.purge(now + 10) == 2
+    assert geo_cache.get(geo_cache.make_key("geo", "b")) is None
+    assert geo_cache.get(geo_cache.make_key("geo", "d")) is not None
+
+
+def test_hit_counter_goes_through_write_behind(http):
+    from sqlalchemy import select
+
+    from db import SessionLocal, write_behind
+    from models_db import GeoCacheEntry
+
+    key = geo_cache.make_key("geo", "zaehler")
+    geo_cache.put(key, {"lat": 1, "lon": 1})
+    geo_cache.get(key)
+    geo_cache.get(key)
+    write_behind.flush()
+    with SessionLocal() as s:
+        assert s.execute(select(GeoCacheEntry.hits).where(GeoCacheEntry.key == key)).scalar_one() == 2
+
+
+def test_concurrent_lookups_are_coalesced(http, monkeypatch):
+    import threading
+    import time
+
+    gate = threading.Event()
+    real = routing._geocode_nominatim
+
+    def slow(address):
+        gate.wait(5)
+        return real(address)
+
+    monkeypatch.setattr(routing, "_geocode_nominatim", slow)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(routing.geocode("Schulweg 1, Aurich"))) for _ in range(3)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)  # alle drei haengen jetzt am selben In-Flight-Call
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert results == [(53.47, 7.48)] * 3
+    assert len(http.calls) == 1
+
+
+def test_single_flight_propagates_errors_and_forgets_key():
+    flight = routing._SingleFlight()
+
+    def boom():
+        raise routing.RoutingError("kaputt")
+
+    with pytest.raises(routing.RoutingError):
+        flight.do("k", boom)
+    assert flight.do("k", lambda: 42) == 42
+
+
+def test_token_bucket_hands_out_spaced_slots_without_blocking():
+    bucket = routing._TokenBucket(interval=10.0)
+    waits = [bucket.reserve() for _ in range(3)]
+    # Erster Slot sofort, danach je ein Intervall spaeter — die Reservierung
+    # selbst kehrt sofort zurueck, statt unter der Sperre zu schlafen.
+    assert waits[0] == 0
+    assert waits[1] == pytest.approx(10.0, abs=0.1)
+    assert waits[2] == pytest.approx(20.0, abs=0.1)
+
+
+def test_token_bucket_file_is_shared_between_processes(tmp_path):
+    # Zwei Buckets auf derselben Datei stehen fuer zwei gunicorn-Worker.
+    path = str(tmp_path / "nominatim.bucket")
+    worker_a = routing._TokenBucket(interval=10.0, path=path)
+    worker_b = routing._TokenBucket(interval=10.0, path=path)
+    assert worker_a.reserve() == 0
+    assert worker_b.reserve() == pytest.approx(10.0, abs=0.1)
+    assert worker_a.reserve() == pytest.approx(20.0, abs=0.1)
+
+
+def test_token_bucket_falls_back_to_process_local(tmp_path):
+    bucket = routing._TokenBucket(interval=10.0, path=str(tmp_path / "fehlt" / "nominatim.bucket"))
+    assert bucket.reserve() == 0
+    assert bucket.path is None
+    assert bucket.reserve() == pytest.approx(10.0, abs=0.1)
+
+
+def test_route_many_keeps_order_and_reports_errors(http):
+    results = routing.route_many(
+        [
+            ("Schulweg 1, Aurich", "Marktplatz 2, Bremen"),
+            ("Marktplatz 2, Bremen", "Nirgendwo 0"),
+            ("Marktplatz 2, Bremen", "Schulweg 1, Aurich"),
+        ]
+    )
+    assert results[0] == results[2] == {"km": 123.5, "duration_min": 90.0}
+    assert "nicht gefunden" in results[1]["error"]
+
+
+def test_endpoints_are_geocoded_concurrently(http, monkeypatch):
+    import threading
+
+    both_running = threading.Barrier(2, timeout=5)
+    real = routing._geocode_nominatim
+
+    def rendezvous(address):
+        both_running.wait()  # laeuft nur durch, wenn Start und Ziel gleichzeitig aufgeloest werden
+        return real(address)
+
+    monkeypatch.setattr(routing, "_geocode_nominatim", rendezvous)
+    assert routing.route_km("Schulweg 1, Aurich", "Marktplatz 2, Bremen")["km"] == 123.5
+
+
+def test_api_route_accepts_routes_list(http, client):
+    import json
+
+    routes = [
+        {"from": "Schulweg 1, Aurich", "to": "Marktplatz 2, Bremen"},
+        {"from": "Marktplatz 2, Bremen", "to": "Schulweg 1, Aurich"},
+    ]
+    r = client.post("/api/route", data={"routes": json.dumps(routes)})
+    assert r.status_code == 200
+    assert [x["km"] for x in r.get_json()["routes"]] == [123.5, 123.5]
+
+    assert client.post("/api/route", data={"routes": "[]"}).status_code == 400
+    assert client.post("/api/route", data={"routes": '[{"from": "x"}]'}).status_code == 400
+
+
+def test_local_backend_first_osrm_as_fallback(http):
+    class Local:
+        name = "local"
+
+        def __init__(self, result):
+            self.result = result
+
+        def route(self, lat1, lon1, lat2, lon2):
+            if self.result is None:
+                raise routing.RoutingError("ausserhalb")
+            return self.result
+
+    routing.set_backends([Local({"km": 99.0, "duration_min": 60.0}), routing.OsrmBackend()])
+    assert routing.route_km("Schulweg 1, Aurich", "Marktplatz 2, Bremen")["km"] == 99.0
+    assert routing.OSRM_URL not in " ".join(http.calls)
+
+    _clear_memory()
+    with SessionLocal() as s:
+        s.query(GeoCacheEntry).delete()
+        s.commit()
+    routing.set_backends([Local(None), routing.OsrmBackend()])
+    assert routing.route_km("Schulweg 1, Aurich", "Marktplatz 2, Bremen")["km"] == 123.5
+
+
+def test_gazetteer_hit_skips_nominatim(http, tmp_path):
+    import gazetteer
+
+    gazetteer.build([("Schulweg, Aurich", 53.47, 7.48)], str(tmp_path / "orte.gaz"))
+    index = gazetteer.Gazetteer(str(tmp_path / "orte.gaz"))
+    routing.set_gazetteer(index)
+    try:
+        assert routing.geocode("Schulweg 1, 26603 Aurich") == pytest.approx((53.47, 7.48))
+        assert http.calls == []
+        assert geo_cache.stats()["gazetteer_hit"] == 1
+        routing.geocode("Marktplatz 2, Bremen")  # Miss → Nominatim
+        assert http.calls == [routing.NOMINATIM_URL]
+    finally:
+        routing.set_gazetteer(None)
+        index.close()
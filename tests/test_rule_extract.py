@@ -0,0 +1,137 @@
+"""Tests fuer den regelbasierten Schnellpfad der Extraktion (rule_extract.py)."""
+
+from __future__ import annotations
+
+import json
+from datetime import date, time
+from pathlib import Path
+
+import pytest
+
+import rule_extract
+from models import validate_reiseantrag
+
+EINLADUNG = """Liebe Kolleginnen und Kollegen,
+hiermit laden wir herzlich ein.
+
+Thema: Sensordaten im Unterricht
+Ort: NLQ, Keßlerstraße 52, 31134 Hildesheim
+Datum: Mittwoch, 12.03.2027
+Uhrzeit: 9:00 – 16:00 Uhr
+"""
+
+
+def test_template_is_confident_and_fills_reise_details():
+    result = rule_extract.extract(EINLADUNG, heimatort="Lingen (Ems)")
+    assert result.confident
+    # Reisezeiten nur geschaetzt → nie 1,0
+    assert result.confidence == rule_extract.GESCHAETZT_FAKTOR
+    assert result.data["_meta"]["reisezeiten_geschaetzt"]
+    details = result.data["reise_details"]
+    assert details["zielort"] == "NLQ, Keßlerstraße 52, 31134 Hildesheim"
+    assert details["zweck"] == "Sensordaten im Unterricht"
+    assert details["reiseweg"] == "Lingen (Ems) -> Hildesheim -> Lingen (Ems)"
+    assert details["dienstgeschaeft_beginn_datum"] == details["dienstgeschaeft_ende_datum"] == "12.03.2027"
+    assert (details["dienstgeschaeft_beginn_zeit"], details["dienstgeschaeft_ende_zeit"]) == ("09:00", "16:00")
+    # Reisezeiten: fester Puffer vor Beginn / nach Ende
+    assert (details["start_zeit"], details["ende_zeit"]) == ("08:00", "17:00")
+    assert result.data["_meta"]["version"] == "RULES"
+
+
+def test_multi_day_with_named_months_and_separate_begin_end():
+    text = (
+        "Titel: Nordsee-Tagung\nTermin: 2. Mai bis 5. Mai 2027\nBeginn: 13.30 Uhr\nEnde: 15 Uhr\nOrt: 26486 Wangerooge"
+    )
+    details = rule_extract.extract(text).data["reise_details"]
+    assert details["dienstgeschaeft_beginn_datum"] == "02.05.2027"
+    assert details["dienstgeschaeft_ende_datum"] == "05.05.2027"
+    assert (details["start_zeit"], details["ende_zeit"]) == ("12:30", "16:00")
+    assert details["reiseweg"] == "Wangerooge"
+
+
+@pytest.mark.parametrize(
+    ("termin", "beginn", "ende"),
+    [
+        ("2.-3. Mai 2027", "02.05.2027", "03.05.2027"),
+        ("02.-03.05.2027", "02.05.2027", "03.05.2027"),
+        ("02. bis 04.03.2027", "02.03.2027", "04.03.2027"),
+    ],
+)
+def test_day_range_without_month_on_first_day(termin, beginn, ende):
+    assert rule_extract.parse_date_range(termin)[1] is False
+    text = f"Titel: Nordsee-Tagung\nTermin: {termin}\nBeginn: 9 Uhr\nEnde: 15 Uhr\nOrt: 26486 Wangerooge"
+    details = rule_extract.extract(text).data["reise_details"]
+    assert (details["dienstgeschaeft_beginn_datum"], details["dienstgeschaeft_ende_datum"]) == (beginn, ende)
+
+
+@pytest.mark.parametrize("termin", ["2. oder 3. Mai 2027", "30.-2. Mai 2027"])
+def test_unresolved_bare_day_is_a_conflict(termin):
+    assert rule_extract.parse_date_range(termin)[1] is True
+    text = f"Titel: X\nTermin: {termin}\nBeginn: 9 Uhr\nEnde: 15 Uhr\nOrt: 26486 Wangerooge"
+    assert not rule_extract.extract(text).confident
+
+
+def test_unstructured_text_falls_back():
+    result = rule_extract.extract("Am Dienstag fahre ich zur Fortbildung nach Berlin.")
+    assert result.confidence == 0.0
+    assert not result.confident
+
+
+def test_missing_times_are_not_confident():
+    text = "Thema: X\nOrt: 31134 Hildesheim\nDatum: 12.03.2027"
+    assert not rule_extract.extract(text).confident
+
+
+def test_conflicting_locations_halve_confidence():
+    text = EINLADUNG + "Veranstaltungsort: 30159 Hannover\n"
+    result = rule_extract.extract(text)
+    assert result.confidence == 0.45
+    assert not result.confident
+
+
+def test_alternative_dates_are_a_conflict_not_a_range():
+    text = EINLADUNG.replace("Mittwoch, 12.03.2027", "12.03.2027 oder 19.03.2027 (Wiederholungstermin)")
+    assert not rule_extract.extract(text).confident
+    assert rule_extract.parse_date_range("Mittwoch, 12.03. bis Freitag, 14.03.2027")[1] is False
+    assert rule_extract.parse_date_range("12.03.2027, 19.03.2027")[1] is True
+
+
+def test_zeit_disagreeing_with_beginn_is_a_conflict():
+    text = "Thema: X\nOrt: 31134 Hildesheim\nDatum: 12.03.2027\nBeginn: 9:00 Uhr\nZeit: 10:00 - 16:00 Uhr"
+    assert not rule_extract.extract(text).confident
+    agreeing = text.replace("Beginn: 9:00", "Beginn: 10:00")
+    assert rule_extract.extract(agreeing).confident
+
+
+def test_end_before_begin_is_rejected():
+    text = EINLADUNG.replace("9:00 – 16:00", "16:00 – 9:00")
+    assert rule_extract.extract(text).confidence == 0.0
+
+
+def test_specific_zweck_label_beats_betreff():
+    text = "Betreff: Einladung\n" + EINLADUNG
+    assert rule_extract.extract(text).data["reise_details"]["zweck"] == "Sensordaten im Unterricht"
+
+
+def test_parse_dates_borrows_year_from_later_date():
+    assert rule_extract.parse_dates("02.05. – 05.05.2027") == [date(2027, 5, 2), date(2027, 5, 5)]
+    assert rule_extract.parse_dates("31.02.2027") == []
+
+
+def test_parse_times_ignores_dates():
+    assert rule_extract.parse_times("12.03.2027, 9 Uhr") == [time(9, 0)]
+    assert rule_extract.parse_times("9 - 16 Uhr") == [time(9, 0), time(16, 0)]
+
+
+def test_home_city():
+    assert rule_extract.home_city("Musterstr. 1, 49808 Lingen") == "Lingen"
+    assert rule_extract.home_city("") == ""
+
+
+def test_result_passes_schema_validation():
+    # Antragsteller/Befoerderung kommen wie beim LLM-Ergebnis aus Profil und Reise-Abfrage.
+    example = json.loads((Path(__file__).parent.parent / "example_input.json").read_text(encoding="utf-8"))
+    data = {**rule_extract.extract(EINLADUNG).data, "antragsteller": example["antragsteller"]}
+    data["befoerderung"] = example["befoerderung"]
+    is_valid, result = validate_reiseantrag(data)
+    assert is_valid, result
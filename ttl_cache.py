@@ -0,0 +1,134 @@
+"""Gemeinsamer Unterbau der DB-Caches (``geo_cache.py``, ``extract_cache.py``).
+
+Eine ``TtlCache``-Instanz kapselt eine Cache-Tabelle mit den Spalten
+``key``, ``value`` (``EncryptedJSON``), ``expires_at`` und ``hits``:
+
+- Eintraege mit abgelaufenem ``expires_at`` gelten als Miss und werden beim
+  Aufraeumen geloescht, das laeuft hoechstens alle ``PURGE_INTERVAL``
+  Sekunden nach einem ``put``.
+- Darueber hinaus kappt ``purge`` auf ``max_entries``: die am kuerzesten
+  gueltigen Eintraege fliegen zuerst.
+- Hit/Miss-Zaehler pro Prozess (``stats()``), Hits zusaetzlich pro Zeile
+  (asynchron ueber ``db.write_behind``). Schluessel der Form ``art:...``
+  zaehlen pro Art (``geo_hit``, ``route_miss``), sonst ``hit``/``miss``.
+
+TTL und Obergrenze kommen pro Aufruf vom jeweiligen Modul, damit dessen
+Konstanten (aus der Umgebung) massgeblich bleiben. Fehler der DB werden nur
+geloggt — ein kaputter Cache darf den eigentlichen Aufruf nicht blockieren.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+from cryptography.fernet import InvalidToken
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from db import SessionLocal, write_behind
+
+logger = logging.getLogger(__name__)
+
+# Aufraeumen (TTL + Obergrenze) hoechstens so oft pro Prozess (Sekunden).
+PURGE_INTERVAL = 300.0
+
+
+class TtlCache:
+    """TTL-Cache auf einer Tabelle ``model``; ``name`` erscheint in den Logs."""
+
+    def __init__(self, model, name: str):
+        self.model = model
+        self.name = name
+        self._stats: Counter[str] = Counter()
+        self._stats_lock = threading.Lock()
+        self._next_purge = 0.0
+
+    def count(self, event: str, n: int = 1) -> None:
+        """Zaehler fuer ``stats()`` erhoehen (auch fuer Treffer ausserhalb der DB)."""
+        with self._stats_lock:
+            self._stats[event] += n
+
+    def get(self, key: str) -> dict | None:
+        """Gueltiger Eintrag oder None (Miss, abgelaufen, DB-Fehler)."""
+        m = self.model
+        try:
+            with SessionLocal() as s:
+                value = s.execute(select(m.value).where(m.key == key, m.expires_at > time.time())).scalar_one_or_none()
+        except (SQLAlchemyError, InvalidToken):
+            logger.warning("%s: Lesen fehlgeschlagen", self.name, exc_info=True)
+            value = None
+        kind, sep, _ = key.partition(":")
+        prefix = f"{kind}_" if sep else ""
+        self.count(f"{prefix}hit" if value is not None else f"{prefix}miss")
+        if value is not None:
+            # Treffer-Zaehler ohne Schreibsperre im Lesepfad: ueber db.write_behind.
+            stmt = update(m).where(m.key == key).values(hits=m.hits + 1)
+            write_behind.submit(lambda s: s.execute(stmt))
+        return value
+
+    def put(self, key: str, value: dict, ttl: float, max_entries: int, max_value_bytes: int | None = None) -> bool:
+        """Legt ``value`` fuer ``ttl`` Sekunden ab. False, wenn nichts gespeichert wurde.
+
+        Mit ``max_value_bytes`` werden Werte, deren JSON groesser ist, nicht
+        gespeichert (``too_large`` in ``stats()``).
+        """
+        if max_value_bytes is not None:
+            size = len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+            if size > max_value_bytes:
+                self.count("too_large")
+                logger.info("%s: Wert mit %d Bytes nicht gespeichert (max %d)", self.name, size, max_value_bytes)
+                return False
+        now = time.time()
+        try:
+            with SessionLocal() as s:
+                s.merge(self.model(key=key, value=value, expires_at=now + ttl, hits=0))
+                s.commit()
+        except SQLAlchemyError:
+            logger.warning("%s: Schreiben fehlgeschlagen", self.name, exc_info=True)
+            return False
+        with self._stats_lock:
+            due = now >= self._next_purge
+            if due:
+                self._next_purge = now + PURGE_INTERVAL
+        if due:
+            self.purge(max_entries, now)
+        return True
+
+    def purge(self, max_entries: int, now: float | None = None) -> int:
+        """Loescht abgelaufene Eintraege und kappt auf ``max_entries``. Gibt die Anzahl zurueck."""
+        m = self.model
+        now = time.time() if now is None else now
+        try:
+            with SessionLocal() as s:
+                removed = s.execute(delete(m).where(m.expires_at <= now)).rowcount
+                overflow = s.execute(select(func.count()).select_from(m)).scalar_one() - max_entries
+                if overflow > 0:
+                    oldest = select(m.key).order_by(m.expires_at).limit(overflow)
+                    removed += s.execute(delete(m).where(m.key.in_(oldest))).rowcount
+                s.commit()
+        except SQLAlchemyError:
+            logger.warning("%s: Aufraeumen fehlgeschlagen", self.name, exc_info=True)
+            return 0
+        if removed:
+            self.count("evicted", removed)
+            logger.info("%s: %d Eintraege entfernt", self.name, removed)
+        return removed
+
+    def stats(self) -> dict:
+        """Hit/Miss-Zaehler dieses Prozesses plus Anzahl Eintraege in der DB."""
+        with self._stats_lock:
+            out = dict(self._stats)
+        try:
+            with SessionLocal() as s:
+                out["entries"] = s.execute(select(func.count()).select_from(self.model)).scalar_one()
+        except SQLAlchemyError:
+            out["entries"] = None
+        return out
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._stats.clear()